@@ -3,5 +3,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
 
+# WARMUP=1 : charge caches, connexion et vues différées avant la première
+# requête (dans le master avec gunicorn --preload, cf. authapp.startup)
+from django.conf import settings  # noqa: E402
+
+if settings.WARMUP:
+    from authapp.startup import warm_up
+
+    warm_up()
+
+# après django.setup() : /api/events (SSE) et /ws/events (websocket) sont
+# servis par le canal push, le reste par Django
+from authapp.push import PushApp  # noqa: E402
+
+application = PushApp(django_application)
@@ -0,0 +1,161 @@
+"""
+Dernière activité des coureurs ("actifs récemment").
+
+Écrire `last_active_at` à chaque requête authentifiée doublerait les
+écritures SQLite. `ActivityMiddleware` se contente de noter l'utilisateur
+dans un dict en mémoire du process (`touch()`), à la minute près
+(`ACTIVITY_RESOLUTION`). `flush()` écrit ce tampon en quelques UPDATE
+groupés (un par minute distincte, par paquets d'ids) :
+- toutes les `ACTIVITY_FLUSH_INTERVAL` secondes, dans un thread du process ;
+- à l'arrêt du process (atexit), pour ne rien perdre.
+
+La colonne indexée `Profile.last_active_at` sert aux filtres "actif depuis
+moins de X" (`Profile.objects.active_within(seconds)`, `?active_within=` du
+flux et des profils publics). Elle ne bouge jamais vers le passé : plusieurs
+workers peuvent flusher dans le désordre. L'UPDATE ne touche ni
+`updated_at` (ETag) ni les signaux.
+"""
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils.functional import SimpleLazyObject, empty
+
+logger = logging.getLogger(__name__)
+
+UPDATE_CHUNK = 500  # ids par UPDATE (limite de variables SQLite)
+
+_lock = threading.Lock()
+_pending = {}  # user_id -> epoch (s) arrondi à ACTIVITY_RESOLUTION
+_flusher = None
+_stop = threading.Event()
+
+
+def _resolution():
+    return getattr(settings, "ACTIVITY_RESOLUTION", 60)
+
+
+def _interval():
+    return getattr(settings, "ACTIVITY_FLUSH_INTERVAL", 30)
+
+
+def touch(user_id, now=None):
+    """Note l'activité de `user_id` ; ne touche pas la base."""
+    res = _resolution()
+    ts = int((now if now is not None else datetime.now(dt_timezone.utc).timestamp()) // res * res)
+    with _lock:
+        if _pending.get(user_id, 0) < ts:
+            _pending[user_id] = ts
+    if _flusher is None and _interval():
+        _start_flusher()
+
+
+def pending_count():
+    with _lock:
+        return len(_pending)
+
+
+def flush():
+    """Écrit le tampon en base. Renvoie le nombre d'utilisateurs traités."""
+    from .models import Profile
+
+    global _pending
+    with _lock:
+        batch, _pending = _pending, {}
+    if not batch:
+        return 0
+    by_ts = {}
+    for uid, ts in batch.items():
+        by_ts.setdefault(ts, []).append(uid)
+    try:
+        for ts, ids in by_ts.items():
+            at = datetime.fromtimestamp(ts, dt_timezone.utc)
+            for i in range(0, len(ids), UPDATE_CHUNK):
+                Profile.objects.filter(
+                    Q(last_active_at__lt=at) | Q(last_active_at__isnull=True), user_id__in=ids[i:i + UPDATE_CHUNK]
+                ).update(last_active_at=at)
+    except Exception:
+        # base indisponible : le tampon est remis pour le prochain flush
+        with _lock:
+            for uid, ts in batch.items():
+                if _pending.get(uid, 0) < ts:
+                    _pending[uid] = ts
+        raise
+    return len(batch)
+
+
+def _run_flusher():
+    while True:
+        _stop.wait(_interval())
+        try:
+            flush()
+        except Exception:
+            logger.exception("activité : échec du flush")
+        finally:
+            close_old_connections()
+        if _stop.is_set():
+            return
+
+
+def _start_flusher():
+    global _flusher
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_run_flusher, name="activity-flush", daemon=True)
+            _flusher.start()
+
+
+@atexit.register
+def shutdown():
+    """Arrêt du process : dernier flush, le tampon ne doit pas être perdu."""
+    _stop.set()
+    flusher = _flusher
+    if flusher is not None and flusher is not threading.current_thread():
+        # thread daemon : s'il a pris le tampon, il doit finir d'écrire avant la sortie
+        flusher.join(timeout=10)
+    try:
+        flush()
+    except Exception:
+        logger.exception("activité : échec du flush d'arrêt")
+
+
+class ActivityMiddleware:
+    """
+    Après la vue : note l'utilisateur authentifié (session ou JWT, que DRF
+    recopie sur la requête Django). Une session jamais lue n'est pas chargée
+    pour autant. Sync et async : `touch()` n'écrit qu'en mémoire, le chemin
+    async l'appelle directement.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self._note(request)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        self._note(request)
+        return response
+
+    def _note(self, request):
+        user = getattr(request, "user", None)
+        if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+            return
+        if user is not None and user.is_authenticated:
+            touch(user.id)
@@ -0,0 +1,121 @@
+"""
+Variantes async des endpoints d'authentification (servies par asgi.py).
+
+Le hachage PBKDF2 (plusieurs centaines de ms de CPU) part dans un pool de
+threads borné `PASSWORD_HASH_WORKERS` ; hashlib relâche le GIL pendant le
+calcul, donc la boucle ASGI continue de servir les autres requêtes. Sous
+WSGI, les vues sync de views.py restent utilisées.
+"""
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model, login
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.tokens import default_token_generator
+from django.http import JsonResponse
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from . import ratelimit
+from .views import _set_jwt_cookies, _split_name
+
+User = get_user_model()
+LOGIN_BACKEND = "authapp.auth.ProfileModelBackend"
+
+_hash_pool = ThreadPoolExecutor(
+    max_workers=getattr(settings, "PASSWORD_HASH_WORKERS", 4), thread_name_prefix="pwhash"
+)
+
+
+async def _in_hash_pool(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, fn, *args)
+
+
+def _too_many(retry_after):
+    resp = JsonResponse(ratelimit.limited_payload(retry_after), status=429)
+    resp["Retry-After"] = str(retry_after)
+    return resp
+
+
+def _json(request):
+    try:
+        return json.loads(request.body or b"{}")
+    except ValueError:
+        return {}
+
+
+@csrf_exempt
+@require_POST
+async def register_email_async(request):
+    data = _json(request)
+    email = (data.get("email") or "").strip().lower()
+    password = data.get("password") or ""
+    if not email or not password:
+        return JsonResponse({"error": "email et mot de passe requis"}, status=400)
+    retry = await ratelimit.acheck("register", request)
+    if retry:
+        return _too_many(retry)
+    if await User.objects.filter(email=email).aexists():
+        return JsonResponse({"error": "email déjà utilisé"}, status=400)
+    hashed = await _in_hash_pool(make_password, password)
+    first_name, last_name = _split_name((data.get("name") or "").strip())
+    try:
+        user = await User.objects.acreate(
+            username=email, email=email, password=hashed, first_name=first_name, last_name=last_name
+        )
+    except Exception:
+        return JsonResponse({"error": "création utilisateur impossible"}, status=500)
+    await sync_to_async(login)(request, user, backend=LOGIN_BACKEND)
+    return _set_jwt_cookies(JsonResponse({"ok": True, "email": user.email}), user)
+
+
+@csrf_exempt
+@require_POST
+async def login_email_async(request):
+    data = _json(request)
+    identifier = (data.get("email") or "").strip()  # peut être email OU username
+    password = data.get("password") or ""
+    retry = await ratelimit.acheck("login", request, identifier)
+    if retry:
+        return _too_many(retry)
+    # un seul lookup (username ou email) puis un seul hachage
+    user = await User.objects.filter(username=identifier).afirst()
+    if user is None:
+        user = await User.objects.filter(email=identifier.lower()).afirst()
+    if user is None:
+        # même coût CPU qu'un mauvais mot de passe (cf. ModelBackend.authenticate)
+        await _in_hash_pool(make_password, password)
+        return JsonResponse({"error": "identifiants invalides"}, status=400)
+    ok = await _in_hash_pool(user.check_password, password)
+    if not ok or not user.is_active:
+        return JsonResponse({"error": "identifiants invalides"}, status=400)
+    await sync_to_async(login)(request, user, backend=LOGIN_BACKEND)
+    return _set_jwt_cookies(JsonResponse({"ok": True}), user)
+
+
+@csrf_exempt
+@require_POST
+async def reset_password_confirm_async(request):
+    data = _json(request)
+    uidb64 = data.get("uid") or ""
+    token = data.get("token") or ""
+    new_password = data.get("password") or ""
+    if not (uidb64 and token and new_password):
+        return JsonResponse({"error": "données incomplètes"}, status=400)
+    retry = await ratelimit.acheck("password_reset_confirm", request)
+    if retry:
+        return _too_many(retry)
+    try:
+        user = await User.objects.aget(pk=force_str(urlsafe_base64_decode(uidb64)))
+    except Exception:
+        return JsonResponse({"error": "lien invalide"}, status=400)
+    if not default_token_generator.check_token(user, token):
+        return JsonResponse({"error": "token invalide ou expiré"}, status=400)
+    user.password = await _in_hash_pool(make_password, new_password)
+    await user.asave(update_fields=["password"])
+    return JsonResponse({"ok": True})
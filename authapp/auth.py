@@ -1,4 +1,12 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.utils.functional import cached_property
 from rest_framework.authentication import SessionAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 
 
 class CsrfExemptSessionAuthentication(SessionAuthentication):
@@ -6,3 +14,71 @@ class CsrfExemptSessionAuthentication(SessionAuthentication):
         # Désactive la vérification CSRF pour les endpoints API spécifiques
         return None
 
+
+class ProfileModelBackend(ModelBackend):
+    """
+    ModelBackend qui charge le profil avec l'utilisateur de la session
+    (JOIN), pour que `request.user.profile` ne coûte pas de requête en plus.
+    """
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related("profile").get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+class RunnrTokenUser(TokenUser):
+    """Utilisateur reconstruit depuis les claims du JWT, sans requête."""
+
+    @cached_property
+    def id(self):
+        return int(self.token[jwt_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def email(self):
+        return self.token.get("email", "")
+
+    def get_full_name(self):
+        return self.token.get("name", "")
+
+
+def issue_tokens(user):
+    """RefreshToken (et access dérivé) avec les claims lus par RunnrTokenUser."""
+    refresh = RefreshToken.for_user(user)
+    refresh["email"] = user.email
+    refresh["name"] = user.get_full_name() or user.username
+    return refresh
+
+
+class _CookieTokenMixin:
+    """
+    Lit le JWT dans `Authorization: Bearer` puis, à défaut, dans le cookie
+    httpOnly `access_token` posé au login. Un cookie invalide ou expiré est
+    ignoré (la session prend le relais) au lieu de renvoyer 401.
+    """
+
+    cookie_name = "access_token"
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            return result
+        raw = request.COOKIES.get(self.cookie_name)
+        if not raw:
+            return None
+        try:
+            validated = self.get_validated_token(raw.encode())
+        except InvalidToken:
+            return None
+        return self.get_user(validated), validated
+
+
+class StatelessJWTAuthentication(_CookieTokenMixin, JWTStatelessUserAuthentication):
+    """Chemin rapide : valide le JWT et renvoie un RunnrTokenUser, zéro requête."""
+
+
+class CookieJWTAuthentication(_CookieTokenMixin, JWTAuthentication):
+    """Même lecture du JWT, mais charge le vrai User (vues qui écrivent en base)."""
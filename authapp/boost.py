@@ -0,0 +1,218 @@
+"""
+Mise en avant des profils Premium dans le flux de swipe.
+
+Un boost dure `BOOST_DURATION` secondes ; son poids décroît de moitié toutes
+les `BOOST_HALF_LIFE` secondes. Ce poids est précalculé dans
+`ProfileBoost.score` par `refresh()` (`manage.py refresh_boosts --loop`) :
+aucune requête du flux ne trie par score en SQL.
+
+Chaque worker garde un instantané des boosts actifs (`table`, relu toutes
+les `BOOST_TABLE_TTL` secondes) sous forme de table d'alias de Vose : un
+tirage pondéré coûte O(1) quel que soit le nombre de boosts. `merge()`
+insère jusqu'à `BOOST_SLOTS` profils tirés ainsi dans une page organique du
+flux. Le générateur est initialisé par (lecteur, curseur) : recharger une
+page redonne les mêmes profils aux mêmes places, la pagination reste
+stable. Le curseur du flux porte aussi les boostés déjà montrés
+(`encode_cursor`, au plus `SEEN_MAX`) : un même profil ne revient pas de
+page en page.
+"""
+import hashlib
+import random
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+SEEN_MAX = 50  # boostés déjà montrés gardés dans le curseur du flux
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def duration():
+    return _setting("BOOST_DURATION", 1800)
+
+
+def half_life():
+    return _setting("BOOST_HALF_LIFE", 600)
+
+
+def slots():
+    return _setting("BOOST_SLOTS", 2)
+
+
+class AlreadyBoosted(Exception):
+    def __init__(self, expires_at):
+        super().__init__(expires_at)
+        self.expires_at = expires_at
+
+
+def decayed(started_at, now):
+    """Poids à `now` d'un boost de poids 1 à `started_at` : divisé par deux à chaque demi-vie."""
+    age = max(0.0, (now - started_at).total_seconds())
+    return 0.5 ** (age / half_life())
+
+
+def initial(started_at):
+    """
+    (refreshed_at, score) d'un boost qui démarre : le poids 1 à `started_at`
+    est exprimé au début de la minute (`BOOST_RESOLUTION`). Les boosts
+    démarrés dans la même minute partagent donc leur `refreshed_at` et
+    `refresh()` les recalcule d'un seul UPDATE.
+    """
+    res = _setting("BOOST_RESOLUTION", 60)
+    at = started_at - timedelta(seconds=started_at.timestamp() % res)
+    return at, 1 / decayed(at, started_at)
+
+
+def activate(user_id):
+    """Démarre un boost (poids 1, visible sans attendre le job). AlreadyBoosted si un boost est en cours."""
+    from .models import ProfileBoost
+
+    now = timezone.now()
+    with transaction.atomic():
+        current = ProfileBoost.objects.filter(user_id=user_id, expires_at__gt=now).first()
+        if current is not None:
+            raise AlreadyBoosted(current.expires_at)
+        at, score = initial(now)
+        b, _ = ProfileBoost.objects.update_or_create(user_id=user_id, defaults={
+            "started_at": now, "expires_at": now + timedelta(seconds=duration()), "score": score, "refreshed_at": at,
+        })
+        transaction.on_commit(table.invalidate)
+    return b
+
+
+def refresh(now=None):
+    """
+    Fait décroître les poids jusqu'à `now` et supprime les boosts expirés.
+    Tous les poids décroissent au même rythme : un UPDATE `score * facteur`
+    par date de dernier recalcul, soit la date du passage précédent plus une
+    par minute où des boosts ont démarré. Renvoie (recalculés, supprimés).
+    """
+    from .models import ProfileBoost
+
+    now = now or timezone.now()
+    expired, _ = ProfileBoost.objects.filter(expires_at__lte=now).delete()
+    updated = 0
+    stale = ProfileBoost.objects.filter(refreshed_at__lt=now)
+    for at in stale.order_by().values_list("refreshed_at", flat=True).distinct():
+        updated += ProfileBoost.objects.filter(refreshed_at=at).update(
+            score=F("score") * decayed(at, now), refreshed_at=now
+        )
+    table.invalidate()
+    return updated, expired
+
+
+# ---- Tirage pondéré ----
+def build_alias(weights):
+    """Table d'alias de Vose : (prob, alias), O(n)."""
+    n = len(weights)
+    total = sum(weights)
+    scaled = [w * n / total for w in weights]
+    prob, alias = [1.0] * n, list(range(n))
+    small = [i for i, w in enumerate(scaled) if w < 1.0]
+    large = [i for i, w in enumerate(scaled) if w >= 1.0]
+    while small and large:
+        s, big = small.pop(), large.pop()
+        prob[s], alias[s] = scaled[s], big
+        scaled[big] += scaled[s] - 1.0
+        (small if scaled[big] < 1.0 else large).append(big)
+    return prob, alias  # restes : prob 1.0 (erreurs d'arrondi)
+
+
+class BoostTable:
+    """Instantané (ids, poids) des boosts actifs et sa table d'alias."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = ([], [], [])  # ids, prob, alias
+        self._loaded_at = None
+
+    def _ttl(self):
+        return _setting("BOOST_TABLE_TTL", 60)
+
+    def _ensure(self):
+        loaded_at = self._loaded_at
+        if loaded_at is not None and time.monotonic() - loaded_at < self._ttl():
+            return
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= self._ttl():
+                self.load()
+
+    def load(self):
+        from .models import ProfileBoost
+
+        rows = list(
+            ProfileBoost.objects.filter(expires_at__gt=timezone.now(), score__gt=0, user__profile__paused=False)
+            .order_by("user_id").values_list("user_id", "score")
+        )
+        ids = [uid for uid, _ in rows]
+        prob, alias = build_alias([s for _, s in rows]) if rows else ([], [])
+        self._snapshot = (ids, prob, alias)
+        self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def __len__(self):
+        self._ensure()
+        return len(self._snapshot[0])
+
+    def sample(self, rng, k, accept, tries_per_pick=16):
+        """Jusqu'à `k` ids distincts acceptés par `accept`, tirés proportionnellement au poids."""
+        self._ensure()
+        ids, prob, alias = self._snapshot
+        n = len(ids)
+        picks = []
+        if not n:
+            return picks
+        for _ in range(k * tries_per_pick):
+            i = int(rng.random() * n)
+            if rng.random() >= prob[i]:
+                i = alias[i]
+            uid = ids[i]
+            if uid not in picks and accept(uid):
+                picks.append(uid)
+                if len(picks) == k:
+                    break
+        return picks
+
+
+table = BoostTable()
+
+
+def encode_cursor(after, seen):
+    """Curseur du flux : "<dernier id>" ou "<dernier id>_<boosté>.<boosté>..."."""
+    seen = list(seen)[-SEEN_MAX:]
+    return f"{after}_{'.'.join(map(str, seen))}" if seen else str(after)
+
+
+def decode_cursor(raw):
+    """(after, boostés déjà montrés) ; ValueError si le curseur est invalide."""
+    after, _, seen = raw.partition("_")
+    return int(after), [int(uid) for uid in seen.split(".")] if seen else []
+
+
+def merge(ids, viewer_id, cursor, accept, seen=()):
+    """
+    Insère jusqu'à `BOOST_SLOTS` profils boostés dans la page organique `ids`,
+    à intervalles réguliers. `accept(uid)` écarte ceux qui ne correspondent
+    pas aux filtres du lecteur, `seen` ceux des pages précédentes. Renvoie
+    (ids, boostés insérés dans l'ordre).
+    """
+    if not ids or not slots():
+        return ids, []
+    seed = hashlib.blake2b(f"{viewer_id}:{cursor}".encode(), digest_size=8).digest()
+    rng = random.Random(int.from_bytes(seed, "big"))
+    skip = set(ids).union(seen)
+    picks = table.sample(rng, slots(), lambda uid: uid not in skip and accept(uid))
+    out = list(ids)
+    for j, uid in enumerate(picks):
+        out.insert((j + 1) * len(ids) // (len(picks) + 1) + j, uid)
+    return out, picks
@@ -0,0 +1,219 @@
+"""
+Import / export en masse des coureurs (clubs partenaires), en streaming.
+
+Import (`manage.py import_runners`) : les lignes CSV ou JSONL sont lues au
+fil de l'eau et insérées par lots, en deux `bulk_create` par lot (User puis
+Profile). Il n'y a ni signal post_save par ligne, ni get_or_create. Les
+profils sont dénormalisés comme le ferait le signal pre_save. Les mots de
+passe en clair sont hachés dans un pool de processus ; les hashs Django
+déjà calculés (`password_hash`) sont repris tels quels, et une ligne sans
+mot de passe donne un compte sans mot de passe utilisable (reset par
+e-mail).
+
+Export (`manage.py export_runners`) : un itérateur côté serveur, par
+blocs, écrit ligne à ligne, en mémoire constante.
+"""
+import csv
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from .models import Profile
+from .signals import denormalize_profile
+
+USER_FIELDS = ("email", "first_name", "last_name")
+PROFILE_FIELDS = (
+    "level", "location_city", "goals", "availability_week", "availability_weekend",
+    "distances", "speed_kmh", "is_premium",
+)
+EXPORT_FIELDS = ("id",) + USER_FIELDS + PROFILE_FIELDS + ("date_joined",)
+_BOOL_FIELDS = {"availability_week", "availability_weekend", "is_premium"}
+_LEVELS = {c[0] for c in Profile.LEVEL_CHOICES}
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+# ---- Lecture / écriture ----
+@contextmanager
+def _open(path, mode):
+    if path == "-":
+        yield sys.stdin if "r" in mode else sys.stdout
+    else:
+        with open(path, mode, encoding="utf-8", newline="") as f:
+            yield f
+
+
+def read_rows(f, fmt):
+    """Générateur de dicts depuis un flux CSV (en-têtes) ou JSONL."""
+    if fmt == "csv":
+        yield from csv.DictReader(f)
+    else:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _chunks(iterable, size):
+    it = iter(iterable)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or "").strip().lower() in ("1", "true", "yes", "oui", "on")
+
+
+def _parse(row):
+    """Ligne brute -> (champs User, champs Profile, mot de passe, hash). InvalidRow si inexploitable."""
+    email = (row.get("email") or "").strip().lower()
+    if "@" not in email:
+        raise InvalidRow("email invalide")
+    first, last = (row.get("first_name") or "").strip(), (row.get("last_name") or "").strip()
+    if not (first or last) and row.get("name"):
+        first, _, last = row["name"].strip().partition(" ")
+    profile = {}
+    for f in PROFILE_FIELDS:
+        value = row.get(f)
+        if f in _BOOL_FIELDS:
+            profile[f] = _bool(value)
+        elif f == "speed_kmh":
+            try:
+                profile[f] = float(value) if value not in (None, "") else None
+            except (TypeError, ValueError):
+                raise InvalidRow("speed_kmh invalide") from None
+        else:
+            profile[f] = str(value or "").strip()
+    if profile["level"] and profile["level"] not in _LEVELS:
+        raise InvalidRow("level invalide")
+    hashed = (row.get("password_hash") or "").strip()
+    if hashed:
+        try:
+            identify_hasher(hashed)
+        except ValueError:
+            raise InvalidRow("password_hash non reconnu") from None
+    user = {"email": email, "first_name": first[:150], "last_name": last[:150]}
+    return user, profile, row.get("password") or "", hashed
+
+
+# ---- Import ----
+def _init_hash_worker():
+    import django
+
+    django.setup()
+
+
+def import_rows(rows, batch_size=2000, workers=None, on_batch=None):
+    """
+    Importe un itérable de lignes. Les emails déjà présents (en base ou plus
+    haut dans le fichier) sont ignorés. Renvoie {"created", "skipped", "invalid"}.
+    """
+    User = get_user_model()
+    stats = {"created": 0, "skipped": 0, "invalid": 0}
+    seen = set()
+    pool = None
+    try:
+        for chunk in _chunks(rows, batch_size):
+            parsed = []
+            for row in chunk:
+                try:
+                    parsed.append(_parse(row))
+                except InvalidRow:
+                    stats["invalid"] += 1
+            emails = [u["email"] for u, *_ in parsed]
+            # comparaison insensible à la casse : comptes OAuth enregistrés en "Foo@Gmail.com"
+            existing = set()
+            for email, username in (
+                User.objects.annotate(e=Lower("email"))
+                .filter(Q(e__in=emails) | Q(username__in=emails))
+                .values_list("e", "username")
+            ):
+                existing.update((email, username))
+            fresh = []
+            for item in parsed:
+                email = item[0]["email"]
+                if email in existing or email in seen:
+                    stats["skipped"] += 1
+                    continue
+                seen.add(email)
+                fresh.append(item)
+
+            plain = [pw for _, _, pw, hashed in fresh if pw and not hashed]
+            if plain and pool is None:
+                pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_hash_worker)
+            hashes = iter(pool.map(make_password, plain, chunksize=max(1, len(plain) // 64)) if plain else ())
+            users, profiles = [], []
+            for user, profile, pw, hashed in fresh:
+                if hashed:
+                    password = hashed
+                elif pw:
+                    password = next(hashes)
+                else:
+                    password = make_password(None)  # inutilisable : reset par e-mail
+                users.append(User(username=user["email"], password=password, **user))
+                profiles.append(profile)
+
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+                batch = []
+                for u, fields in zip(users, profiles):
+                    p = Profile(user_id=u.pk, **fields)
+                    denormalize_profile(Profile, p)
+                    batch.append(p)
+                Profile.objects.bulk_create(batch)
+            stats["created"] += len(users)
+            if on_batch:
+                on_batch(stats)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return stats
+
+
+def import_file(path, fmt, **kwargs):
+    with _open(path, "r") as f:
+        return import_rows(read_rows(f, fmt), **kwargs)
+
+
+# ---- Export ----
+def export_rows(chunk_size=2000, with_password_hashes=False):
+    """Générateur de dicts, un par coureur, sans charger la table."""
+    User = get_user_model()
+    fields = ["id", "email", "first_name", "last_name", "date_joined"]
+    fields += [f"profile__{f}" for f in PROFILE_FIELDS]
+    if with_password_hashes:
+        fields.append("password")
+    for values in User.objects.order_by("pk").values_list(*fields).iterator(chunk_size=chunk_size):
+        row = dict(zip(fields, values))
+        out = {f: row.get(f, row.get(f"profile__{f}")) for f in EXPORT_FIELDS}
+        out["date_joined"] = out["date_joined"].isoformat()
+        if with_password_hashes:
+            out["password_hash"] = row["password"]
+        yield out
+
+
+def export_file(path, fmt, **kwargs):
+    n = 0
+    with _open(path, "w") as f:
+        writer = None
+        for row in export_rows(**kwargs):
+            if fmt == "csv":
+                if writer is None:
+                    writer = csv.DictWriter(f, fieldnames=list(row))
+                    writer.writeheader()
+                writer.writerow(row)
+            else:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            n += 1
+    return n
@@ -0,0 +1,118 @@
+"""
+Messagerie 1-to-1 entre coureurs qui ont matché.
+
+Conversation porte des champs dénormalisés (date et aperçu du dernier
+message, non-lus de chaque côté), mis à jour dans la transaction qui insère
+le Message. La liste des matchs triée par dernier message est donc une
+lecture d'index, sans GROUP BY sur les messages.
+
+L'historique et la liste se paginent par curseur (keyset) : une page coûte
+le même prix en tête ou au fond d'une longue conversation, là où un OFFSET
+relit toutes les lignes sautées.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import notify, push
+from .models import Conversation, Message
+
+PAGE_MAX = 50
+PREVIEW_LEN = 140
+BODY_MAX = 2000
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _pair(a, b):
+    return (a, b) if a < b else (b, a)
+
+
+def open_conversations(user_id, other_ids):
+    """Ouvre les conversations de `user_id` avec `other_ids` (au match) ; idempotent."""
+    now = timezone.now()
+    Conversation.objects.bulk_create(
+        [Conversation(user_a_id=a, user_b_id=b, last_message_at=now) for a, b in (_pair(user_id, o) for o in other_ids)],
+        ignore_conflicts=True,
+    )
+
+
+def get_for(conversation_id, user_id):
+    """La conversation si `user_id` y participe, sinon None."""
+    return Conversation.objects.filter(Q(user_a_id=user_id) | Q(user_b_id=user_id), pk=conversation_id).first()
+
+
+def get_for_pair(user_id, other_id):
+    a, b = _pair(user_id, other_id)
+    return Conversation.objects.filter(user_a_id=a, user_b_id=b).first()
+
+
+def message_data(m):
+    return {"id": m["id"], "sender_id": m["sender_id"], "body": m["body"], "created_at": m["created_at"].isoformat()}
+
+
+def send(conv, sender_id, body):
+    """Insère le message et met à jour la conversation dans la même transaction."""
+    unread = "unread_b" if sender_id == conv.user_a_id else "unread_a"
+    with transaction.atomic():
+        msg = Message.objects.create(conversation=conv, sender_id=sender_id, body=body)
+        Conversation.objects.filter(pk=conv.pk).update(
+            last_message_at=msg.created_at,
+            last_message_preview=body[:PREVIEW_LEN],
+            last_sender_id=sender_id,
+            **{unread: F(unread) + 1},
+        )
+        data = message_data({"id": msg.id, "sender_id": sender_id, "body": body, "created_at": msg.created_at})
+        push.notify(conv.other_id(sender_id), "message", conversation_id=conv.pk, message=data)
+        notify.enqueue(
+            conv.other_id(sender_id), "message", f"message:{conv.pk}",
+            conversation_id=conv.pk, sender_id=sender_id, preview=body[:PREVIEW_LEN],
+        )
+    return data
+
+
+def mark_read(conv, user_id):
+    field = "unread_a" if user_id == conv.user_a_id else "unread_b"
+    Conversation.objects.filter(pk=conv.pk).update(**{field: 0})
+
+
+def history(conversation_id, before=None, limit=30):
+    """Messages du plus récent au plus ancien, strictement avant l'id `before`. Renvoie (messages, next_cursor)."""
+    qs = Message.objects.filter(conversation_id=conversation_id)
+    if before is not None:
+        qs = qs.filter(id__lt=before)
+    rows = list(qs.order_by("-id").values("id", "sender_id", "body", "created_at")[: limit + 1])
+    next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+    return [message_data(m) for m in rows[:limit]], next_cursor
+
+
+def encode_cursor(conv):
+    delta = conv.last_message_at - _EPOCH
+    return f"{(delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds}_{conv.id}"
+
+
+def decode_cursor(raw):
+    """(last_message_at, id) ; ValueError si le curseur est invalide."""
+    micros, conv_id = raw.split("_")
+    return _EPOCH + timedelta(microseconds=int(micros)), int(conv_id)
+
+
+def inbox(user_id, cursor=None, limit=20):
+    """
+    Conversations de `user_id` triées par dernier message décroissant.
+    Un parcours d'index par côté (user_a / user_b), fusionnés ici : un OR
+    dans une seule requête empêcherait SQLite de suivre l'ordre de l'index.
+    Renvoie (conversations, next_cursor).
+    """
+    rows = []
+    for side in ("user_a_id", "user_b_id"):
+        qs = Conversation.objects.filter(**{side: user_id})
+        if cursor is not None:
+            at, conv_id = cursor
+            qs = qs.filter(Q(last_message_at__lt=at) | Q(last_message_at=at, id__lt=conv_id))
+        rows += qs.order_by("-last_message_at", "-id")[: limit + 1]
+    rows.sort(key=lambda c: (c.last_message_at, c.id), reverse=True)
+    page = rows[:limit]
+    return page, encode_cursor(page[-1]) if len(rows) > limit else None
@@ -0,0 +1,67 @@
+"""
+Complétion du profil stockée en base.
+
+`Profile.completion_percent` et `Profile.completion_missing` (masque de bits
+sur FIELDS, bit à 1 = champ manquant) sont recalculés par le signal pre_save,
+si bien que la complétion se filtre et se trie en SQL (relances en masse,
+classement des flux) sans charger les profils :
+
+    Profile.objects.incomplete(below=75).in_city("Lyon").missing("goals")
+
+`backfill()` recalcule les colonnes par lots, après un import en bulk_create
+(qui ne déclenche pas les signaux) ou un changement des règles.
+"""
+FIELDS = ("level", "location_city", "goals", "availability")
+BITS = {name: 1 << i for i, name in enumerate(FIELDS)}
+
+
+def compute(p):
+    """(pourcentage, masque des manquants). Marche aussi avec les modèles historiques des migrations."""
+    present = {
+        "level": bool(p.level),
+        "location_city": bool(p.location_city),
+        "goals": bool(p.goals),
+        "availability": bool(p.availability_week or p.availability_weekend),
+    }
+    missing = sum(BITS[f] for f, ok in present.items() if not ok)
+    return int(sum(present.values()) * 100 / len(FIELDS)), missing
+
+
+def decode(mask):
+    return [f for f in FIELDS if mask & BITS[f]]
+
+
+def mask_of(fields):
+    try:
+        return sum(BITS[f] for f in set(fields))
+    except KeyError as e:
+        raise ValueError(f"champ de complétion inconnu : {e.args[0]}") from None
+
+
+def backfill(model, batch_size=1000, on_update=None):
+    """
+    Recalcule les colonnes de complétion de `model` (Profile ou modèle
+    historique) par lots de `batch_size`, en parcourant la clé primaire.
+    `on_update(user_ids)` est appelé après chaque lot corrigé.
+    Renvoie (profils lus, profils corrigés).
+    """
+    fields = ("id", "user_id", "level", "location_city", "goals", "availability_week", "availability_weekend",
+              "completion_percent", "completion_missing")
+    scanned = updated = 0
+    last = 0
+    while True:
+        batch = list(model.objects.filter(pk__gt=last).order_by("pk").only(*fields)[:batch_size])
+        if not batch:
+            return scanned, updated
+        changed = []
+        for p in batch:
+            values = compute(p)
+            if values != (p.completion_percent, p.completion_missing):
+                p.completion_percent, p.completion_missing = values
+                changed.append(p)
+        model.objects.bulk_update(changed, ["completion_percent", "completion_missing"])
+        if changed and on_update:
+            on_update([p.user_id for p in changed])
+        scanned += len(batch)
+        updated += len(changed)
+        last = batch[-1].pk
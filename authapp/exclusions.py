@@ -0,0 +1,245 @@
+"""
+Coureurs à ne jamais montrer à un utilisateur : ceux qu'il a bloqués et
+ceux qui l'ont bloqué.
+
+Un `NOT IN (SELECT ...)` sur la table Block à chaque requête coûte
+proportionnellement au nombre de blocages, à chaque page de flux. Ici, les
+ids sont chargés une fois par utilisateur (deux parcours d'index) dans un
+tableau trié `array('q')` — 8 octets par id, contre ~70 pour un set de
+int Python — puis :
+- testés un par un par bisect (`uid in excl`, flux paginé) ;
+- filtrés en bloc par un searchsorted numpy (`excl.filter(ids)`, lots de
+  profils, similarité, messagerie).
+
+Les ensembles vivent dans un LRU du process, borné en utilisateurs
+(`EXCLUSION_CACHE_MAX`) et en ids gardés au total (`EXCLUSION_CACHE_IDS`,
+8 octets chacun, tableaux des swipés compris) : un ensemble plus gros que
+ce budget n'est pas gardé et se relit à chaque appel. Ils sont invalidés après commit par `block()`/`unblock()` pour les
+deux coureurs concernés. Comme l'index du flux, chaque worker rattrape les
+blocages faits ailleurs au plus tard après `EXCLUSION_TTL` secondes ; la
+messagerie, elle, vérifie en base (`is_blocked`).
+
+Le flux et la recherche par rayon excluent aussi les profils déjà swipés :
+`for_feed()` ajoute un second tableau trié, les cibles swipées (un parcours
+de l'index unique (swiper, target)), gardé dans un LRU à part et complété
+après commit par `add_swiped()` au lieu d'être relu à chaque page.
+
+Les profils en pause (`Profile.paused`) ne passent pas par ici : ils sont
+retirés de l'index du flux, du cache de similarité et des requêtes de
+proximité, et `public_profile` les traite comme absents.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+_lock = threading.Lock()
+_sets = OrderedDict()  # user_id -> (chargé à, ExclusionSet), ordre LRU
+_swiped = OrderedDict()  # user_id -> (chargé à, array('q') trié des cibles swipées), ordre LRU
+_generation = 0  # incrémenté à chaque invalidation : un chargement concurrent n'écrase pas
+_stored = 0  # ids gardés dans les deux LRU
+
+
+def _in(ids, uid):
+    i = bisect_left(ids, uid)
+    return i < len(ids) and ids[i] == uid
+
+
+def _keep(ids, sorted_ids):
+    """`ids` privés de ceux présents dans `sorted_ids` (array('q') trié), en une passe vectorisée."""
+    if not sorted_ids or not ids:
+        return ids
+    excluded = np.frombuffer(sorted_ids, dtype=np.int64)
+    cand = np.asarray(ids, dtype=np.int64)
+    pos = np.minimum(np.searchsorted(excluded, cand), len(excluded) - 1)
+    return [ids[j] for j in np.flatnonzero(excluded[pos] != cand)]
+
+
+class ExclusionSet:
+    """Ensemble trié d'user_id, en lecture seule."""
+
+    __slots__ = ("_ids", "extra", "_swiped")
+
+    def __init__(self, ids, extra=frozenset(), swiped=None):
+        self._ids = ids  # array('q') trié, sans doublon
+        self.extra = extra  # petit set en plus (soi-même...)
+        self._swiped = swiped if swiped is not None else array("q")  # cibles déjà swipées (cf. for_feed)
+
+    def __contains__(self, uid):
+        if uid in self.extra:
+            return True
+        return _in(self._ids, uid) or _in(self._swiped, uid)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        # ids en double possibles entre les ensembles : pour un NOT IN, sans importance
+        yield from self.extra
+        yield from self._ids
+        yield from self._swiped
+
+    def with_extra(self, extra):
+        """Mêmes tableaux (non copiés) + `extra`."""
+        return ExclusionSet(self._ids, frozenset(extra), self._swiped)
+
+    def filter(self, ids):
+        """`ids` privés des exclus, ordre conservé ; une passe vectorisée quel que soit le nombre de blocages."""
+        ids = [i for i in ids if i not in self.extra] if self.extra else list(ids)
+        return _keep(_keep(ids, self._ids), self._swiped)
+
+
+EMPTY = ExclusionSet(array("q"))
+
+
+def _ttl():
+    return getattr(settings, "EXCLUSION_TTL", 60)
+
+
+def _max_entries():
+    return getattr(settings, "EXCLUSION_CACHE_MAX", 10_000)
+
+
+def _max_ids():
+    return getattr(settings, "EXCLUSION_CACHE_IDS", 5_000_000)
+
+
+def _size(value):
+    return len(value._ids) if isinstance(value, ExclusionSet) else len(value)
+
+
+def _drop(table, user_id):
+    """Retire l'entrée de `user_id` ; sous _lock."""
+    global _stored
+    hit = table.pop(user_id, None)
+    if hit is not None:
+        _stored -= _size(hit[1])
+
+
+def _put(table, user_id, entry):
+    """Range `entry` = (chargé à, valeur) puis évince les plus anciennes au-delà des deux bornes ; sous _lock."""
+    global _stored
+    _drop(table, user_id)
+    if _size(entry[1]) > _max_ids():
+        return  # trop gros pour le budget : pas gardé
+    table[user_id] = entry
+    _stored += _size(entry[1])
+    while len(table) > _max_entries():
+        _drop(table, next(iter(table)))
+    other = _swiped if table is _sets else _sets
+    while _stored > _max_ids():
+        # les plus anciennes de cette table, jamais l'entrée qu'on vient de ranger, puis l'autre table
+        victims = table if len(table) > 1 else other
+        _drop(victims, next(iter(victims)))
+
+
+def load(user_id):
+    """Lit les blocages de `user_id` dans les deux sens (index uniq_block_pair et block_blocked_idx)."""
+    from .models import Block
+
+    ids = array("q", Block.objects.filter(blocker_id=user_id).values_list("blocked_id", flat=True).iterator(10_000))
+    ids.extend(Block.objects.filter(blocked_id=user_id).values_list("blocker_id", flat=True).iterator(10_000))
+    if not ids:
+        return EMPTY
+    return ExclusionSet(array("q", sorted(set(ids))))
+
+
+def load_swiped(user_id):
+    """Cibles déjà swipées par `user_id`, triées (parcours de l'index unique (swiper, target))."""
+    from .models import Swipe
+
+    rows = Swipe.objects.filter(swiper_id=user_id).order_by("target_id").values_list("target_id", flat=True)
+    return array("q", rows.iterator(10_000))
+
+
+def _cached(table, user_id, loader):
+    """Valeur de `table` pour `user_id` (LRU, TTL) ; chargée par `loader` au besoin."""
+    now = time.monotonic()
+    with _lock:
+        hit = table.get(user_id)
+        if hit is not None and now - hit[0] < _ttl():
+            table.move_to_end(user_id)
+            return hit[1]
+        generation = _generation
+    value = loader(user_id)
+    with _lock:
+        if generation == _generation:
+            _put(table, user_id, (now, value))
+    return value
+
+
+def for_user(user_id):
+    """ExclusionSet de `user_id`, depuis le LRU du process (chargé au besoin)."""
+    return _cached(_sets, user_id, load)
+
+
+def for_feed(user_id):
+    """Exclusions du flux et de la recherche par rayon : bloqués, déjà swipés et soi-même."""
+    blocked = for_user(user_id)
+    return ExclusionSet(blocked._ids, frozenset((user_id,)), _cached(_swiped, user_id, load_swiped))
+
+
+def add_swiped(user_id, target_ids):
+    """Après commit de nouveaux swipes : ajoutés au tableau en cache (copié, les lecteurs en cours gardent l'ancien)."""
+    if not target_ids:
+        return
+    with _lock:
+        hit = _swiped.get(user_id)
+        if hit is None:
+            return
+        loaded_at, ids = hit
+        merged = array("q", ids)
+        for t in sorted(set(target_ids)):
+            i = bisect_left(merged, t)
+            if i == len(merged) or merged[i] != t:
+                merged.insert(i, t)
+        _put(_swiped, user_id, (loaded_at, merged))
+
+
+def invalidate(*user_ids):
+    global _generation
+    with _lock:
+        _generation += 1
+        for uid in user_ids:
+            _drop(_sets, uid)
+
+
+def clear():
+    global _generation, _stored
+    with _lock:
+        _generation += 1
+        _sets.clear()
+        _swiped.clear()
+        _stored = 0
+
+
+def block(blocker_id, blocked_id):
+    """Idempotent. Renvoie True si le blocage est nouveau."""
+    from .models import Block
+
+    with transaction.atomic():
+        _, created = Block.objects.get_or_create(blocker_id=blocker_id, blocked_id=blocked_id)
+        transaction.on_commit(lambda: invalidate(blocker_id, blocked_id))
+    return created
+
+
+def unblock(blocker_id, blocked_id):
+    from .models import Block
+
+    with transaction.atomic():
+        deleted, _ = Block.objects.filter(blocker_id=blocker_id, blocked_id=blocked_id).delete()
+        transaction.on_commit(lambda: invalidate(blocker_id, blocked_id))
+    return bool(deleted)
+
+
+def is_blocked(a, b):
+    """Blocage dans un sens ou l'autre, lu en base (messagerie : pas de fenêtre TTL)."""
+    from .models import Block
+
+    return Block.objects.filter(Q(blocker_id=a, blocked_id=b) | Q(blocker_id=b, blocked_id=a)).exists()
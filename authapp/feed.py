@@ -0,0 +1,191 @@
+"""
+Index de candidats pour le flux de swipe.
+
+Les profils sont rangés en mémoire par "bucket" (niveau, dispo semaine,
+dispo week-end, ville normalisée). Chaque bucket est un tableau trié d'ids
+utilisateur : une page du flux = quelques bisect + un merge, sans scan de
+la table `authapp_profile`. Les profils en pause n'y figurent pas.
+
+L'index est construit paresseusement (une seule requête `values_list`) puis
+maintenu par les signaux `post_save`/`post_delete` de Profile. Comme chaque
+worker a sa propre copie, il est reconstruit au plus tard toutes les
+`FEED_INDEX_TTL` secondes pour rattraper les écritures faites ailleurs.
+"""
+import heapq
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import islice
+
+from django.conf import settings
+
+
+def city_key(city: str) -> str:
+    """Normalise une ville saisie librement : "  Saint-Étienne " -> "saint-etienne"."""
+    s = unicodedata.normalize("NFKD", city or "")
+    s = "".join(c for c in s if not unicodedata.combining(c))
+    return " ".join(s.lower().split())
+
+
+def bucket_key(profile):
+    return (
+        profile.level or "",
+        bool(profile.availability_week),
+        bool(profile.availability_weekend),
+        city_key(profile.location_city),
+    )
+
+
+def key_matches(key, level=None, week=None, weekend=None, ck=None):
+    """`ck` est une ville déjà passée par city_key (None = pas de filtre)."""
+    return (
+        (level is None or key[0] == level)
+        and (week is None or key[1] == week)
+        and (weekend is None or key[2] == weekend)
+        and (ck is None or key[3] == ck)
+    )
+
+
+class CandidateIndex:
+    def __init__(self, ttl=None):
+        self._lock = threading.RLock()
+        self._buckets = {}  # key -> array('q') trié d'user_id
+        self._where = {}  # user_id -> key
+        self._built_at = None
+        self._rebuilding = False
+        self.ttl = ttl
+
+    # ---- construction / maintenance ----
+    def _ttl(self):
+        if self.ttl is not None:
+            return self.ttl
+        return getattr(settings, "FEED_INDEX_TTL", 300)
+
+    def _ensure(self):
+        built_at = self._built_at
+        if built_at is not None and time.monotonic() - built_at < self._ttl():
+            return
+        if built_at is None:
+            # premier build : synchrone, la requête n'a rien d'autre à servir
+            with self._lock:
+                if self._built_at is None:
+                    self.rebuild()
+            return
+        # index périmé : on sert l'ancien pendant la reconstruction
+        if not self._rebuilding:
+            self._rebuilding = True
+            threading.Thread(target=self._background_rebuild, daemon=True).start()
+
+    def _background_rebuild(self):
+        from django.db import connection
+
+        try:
+            self.rebuild()
+        finally:
+            self._rebuilding = False
+            connection.close()
+
+    def rebuild(self):
+        from .models import Profile
+
+        buckets, where = {}, {}
+        rows = (
+            Profile.objects.filter(paused=False).order_by("user_id")
+            .values_list("user_id", "level", "availability_week", "availability_weekend", "location_city")
+            .iterator(chunk_size=10000)
+        )
+        for uid, level, week, weekend, city in rows:
+            key = (level or "", bool(week), bool(weekend), city_key(city))
+            # parcours par user_id croissant -> append suffit pour garder le tri
+            buckets.setdefault(key, array("q")).append(uid)
+            where[uid] = key
+        with self._lock:
+            self._buckets, self._where = buckets, where
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def update(self, profile):
+        with self._lock:
+            if self._built_at is None:
+                return  # sera pris en compte au prochain build
+            uid, key = profile.user_id, bucket_key(profile)
+            if profile.paused:
+                self.remove(uid)
+                return
+            old = self._where.get(uid)
+            if old == key:
+                return
+            if old is not None:
+                self._discard(old, uid)
+            arr = self._buckets.setdefault(key, array("q"))
+            arr.insert(bisect_left(arr, uid), uid)
+            self._where[uid] = key
+
+    def remove(self, user_id):
+        with self._lock:
+            old = self._where.pop(user_id, None)
+            if old is not None:
+                self._discard(old, user_id)
+
+    def _discard(self, key, uid):
+        arr = self._buckets.get(key)
+        if arr is None:
+            return
+        i = bisect_left(arr, uid)
+        if i < len(arr) and arr[i] == uid:
+            del arr[i]
+        if not arr:
+            del self._buckets[key]
+
+    # ---- lecture ----
+    def _matching(self, level=None, week=None, weekend=None, city=None):
+        ck = city_key(city) if city is not None else None
+        for key, arr in self._buckets.items():
+            if key_matches(key, level, week, weekend, ck):
+                yield arr
+
+    def matches(self, uid, level=None, week=None, weekend=None, ck=None):
+        """`uid` est dans l'index (donc pas en pause) et passe les filtres ; `ck` déjà normalisée."""
+        self._ensure()
+        key = self._where.get(uid)
+        return key is not None and key_matches(key, level, week, weekend, ck)
+
+    def page(self, *, level=None, week=None, weekend=None, city=None, after=0, limit=20, exclude=(), only=None):
+        """
+        Renvoie (ids, next_cursor) : au plus `limit` user_id > `after`, triés,
+        hors `exclude`. `only` (ensemble d'ids, ex. les actifs récents)
+        restreint le flux : on parcourt alors `only` plutôt que les buckets.
+        `next_cursor` vaut None quand le flux est épuisé.
+        """
+        self._ensure()
+        ids = []
+        with self._lock:
+            if only is not None:
+                ck = city_key(city) if city is not None else None
+                candidates = (
+                    uid for uid in sorted(only)
+                    if uid > after and uid in self._where and key_matches(self._where[uid], level, week, weekend, ck)
+                )
+            else:
+                iters = []
+                for arr in self._matching(level, week, weekend, city):
+                    start = bisect_right(arr, after)
+                    iters.append(islice(arr, start, None))
+                candidates = heapq.merge(*iters)
+            for uid in candidates:
+                if uid in exclude:
+                    continue
+                ids.append(uid)
+                if len(ids) > limit:
+                    break
+        if len(ids) > limit:
+            return ids[:limit], ids[limit - 1]
+        return ids, None
+
+
+index = CandidateIndex()
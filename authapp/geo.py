@@ -0,0 +1,161 @@
+"""
+Géolocalisation hors-ligne et recherche par rayon.
+
+- `geocode(city)` : coordonnées d'une commune depuis le gazetteer embarqué
+  `data/communes.csv` (aucun appel réseau).
+- `cell_id(lat, lon)` : maille de grille de GEO_CELL_DEG degrés, stockée et
+  indexée sur Profile.geo_cell. Une recherche dans un rayon ne lit que les
+  mailles qui intersectent le cercle, point par point (cf. `nearby`).
+"""
+import csv
+import math
+from itertools import islice
+from pathlib import Path
+
+from .feed import city_key
+
+EARTH_RADIUS_KM = 6371.0088
+GEO_CELL_DEG = 0.1  # ~11 km en latitude, ~7.5 km en longitude en France
+_LON_CELLS = int(round(360 / GEO_CELL_DEG))
+NEARBY_SQL_EXCLUDE_MAX = 500  # au-delà, exclus filtrés en mémoire (limite de paramètres SQLite)
+NEARBY_CHUNK = 200  # marge par tranche quand les exclus sont filtrés en mémoire
+
+GAZETTEER_PATH = Path(__file__).resolve().parent / "data" / "communes.csv"
+_gazetteer = None
+_cell_points = None
+
+
+def _lookup_key(city):
+    # "Saint-Étienne", "saint etienne", "ST ETIENNE " -> même clé
+    return " ".join(city_key(city).replace("-", " ").replace("'", " ").split())
+
+
+def _load():
+    global _gazetteer
+    if _gazetteer is None:
+        table = {}
+        with open(GAZETTEER_PATH, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                table[_lookup_key(row["name"])] = (float(row["lat"]), float(row["lon"]))
+        _gazetteer = table
+    return _gazetteer
+
+
+def _points_by_cell():
+    """{cell_id: [(lat, lon)]} des communes du gazetteer : les seules coordonnées possibles d'un profil."""
+    global _cell_points
+    if _cell_points is None:
+        table = {}
+        for coords in set(_load().values()):
+            table.setdefault(cell_id(*coords), []).append(coords)
+        _cell_points = table
+    return _cell_points
+
+
+def geocode(city):
+    """(lat, lon) de la commune, ou None si inconnue."""
+    if not city:
+        return None
+    return _load().get(_lookup_key(city))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def approx_km(d):
+    """Distance affichée : arrondie au km, jamais 0 (ex: "1 km")."""
+    return max(1, int(round(d)))
+
+
+def _cell_xy(lat, lon):
+    return math.floor((lat + 90) / GEO_CELL_DEG), math.floor((lon + 180) / GEO_CELL_DEG) % _LON_CELLS
+
+
+def cell_id(lat, lon):
+    y, x = _cell_xy(lat, lon)
+    return y * _LON_CELLS + x
+
+
+def _cell_min_km(lat, lon, y, x):
+    """Distance minimale du point au rectangle de la maille (y, x)."""
+    lat0 = y * GEO_CELL_DEG - 90
+    lon0 = x * GEO_CELL_DEG - 180
+    clat = min(max(lat, lat0), lat0 + GEO_CELL_DEG)
+    clon = min(max(lon, lon0), lon0 + GEO_CELL_DEG)
+    return haversine_km(lat, lon, clat, clon)
+
+
+def covering_cells(lat, lon, radius_km):
+    """Mailles intersectant le cercle, triées par distance minimale croissante."""
+    dlat = radius_km / 111.0
+    coslat = max(math.cos(math.radians(min(89.0, abs(lat) + dlat))), 0.01)
+    dlon = min(180.0, radius_km / (111.0 * coslat))
+    y0, _ = _cell_xy(max(-90.0, lat - dlat), lon)
+    y1, _ = _cell_xy(min(89.999, lat + dlat), lon)
+    nx = min(_LON_CELLS, int(math.ceil(2 * dlon / GEO_CELL_DEG)) + 1)
+    _, x0 = _cell_xy(lat, lon - dlon)
+    cells = []
+    for y in range(y0, y1 + 1):
+        for i in range(nx):
+            x = (x0 + i) % _LON_CELLS
+            m = _cell_min_km(lat, lon, y, x)
+            if m <= radius_km:
+                cells.append((m, y * _LON_CELLS + x))
+    cells.sort()
+    return cells
+
+
+def _point_ids(rows, need, exclude, exclude_in_sql):
+    """`need` user_id d'un point, par user_id croissant, hors `exclude`."""
+    if exclude_in_sql:
+        return list(rows.values_list("user_id", flat=True)[:need])
+    # grand ensemble d'exclusion : lu par tranches sur l'index, exclus sautés au passage
+    out, after = [], 0
+    while len(out) < need:
+        chunk = list(rows.filter(user_id__gt=after).values_list("user_id", flat=True)[:need - len(out) + NEARBY_CHUNK])
+        out.extend(uid for uid in chunk if uid not in exclude)
+        if len(chunk) < need - len(out) + NEARBY_CHUNK:
+            break
+        after = chunk[-1]
+    return out[:need]
+
+
+def nearby(lat, lon, radius_km, limit=50, exclude=()):
+    """
+    Les `limit` profils les plus proches dans `radius_km` : liste de
+    (user_id, distance_km) triée par distance.
+
+    Les profils sont géolocalisés sur le centre de leur commune (cf.
+    `set_location_from_city`) : une maille dense (Paris) ne contient que
+    quelques points distincts, connus d'avance par le gazetteer. Les points
+    des mailles couvertes sont classés par distance, puis on ne lit que les
+    `limit` premiers user_id de chacun (LIMIT sur l'index
+    profile_cell_point_idx), jusqu'à ce que le point suivant ne puisse plus
+    battre le k-ième hit. `exclude` est passé dans la requête tant qu'il
+    reste court (`NEARBY_SQL_EXCLUDE_MAX`).
+    """
+    from .models import Profile
+
+    head = list(islice(iter(exclude), NEARBY_SQL_EXCLUDE_MAX + 1))
+    exclude_in_sql = len(head) <= NEARBY_SQL_EXCLUDE_MAX
+    by_cell = _points_by_cell()
+    points = sorted(
+        (haversine_km(lat, lon, plat, plon), plat, plon, cell)
+        for _, cell in covering_cells(lat, lon, radius_km)
+        for plat, plon in by_cell.get(cell, ())
+    )
+    hits = []
+    for d, plat, plon, cell in points:
+        if d > radius_km or (len(hits) >= limit and d > hits[limit - 1][1]):
+            break
+        rows = Profile.objects.filter(geo_cell=cell, latitude=plat, longitude=plon, paused=False).order_by("user_id")
+        if exclude_in_sql and head:
+            rows = rows.exclude(user_id__in=head)
+        hits.extend((uid, d) for uid in _point_ids(rows, limit, exclude, exclude_in_sql))
+        hits.sort(key=lambda h: (h[1], h[0]))
+        del hits[limit:]
+    return hits
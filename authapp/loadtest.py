@@ -0,0 +1,454 @@
+"""
+Outils du banc de charge (`manage.py loadtest`).
+
+- `seed()` : crée N utilisateurs + profils en bulk_create (un seul hachage de
+  mot de passe partagé), sans passer par les signaux.
+- `StandInOAuthBackend` : remplace les backends social_core (Google,
+  Facebook, Apple) par un fournisseur local, pour exercer les callbacks
+  OAuth sans réseau.
+- `SCENARIOS` : une requête type par nom d'URL de urls.py.
+- `run()` / `compare()` : exécution concurrente et comparaison à une
+  baseline JSON.
+- `throwaway_db()` et `percentile()` : partagés avec les commandes bench_*.
+"""
+import csv
+import hashlib
+import io
+import logging
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.tokens import default_token_generator
+from django.core.management import call_command
+from django.db import close_old_connections, connections
+from django.test import Client, override_settings
+from django.urls import get_resolver
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from . import activity, chat, metrics, photos, runs
+from .geo import GAZETTEER_PATH
+from .models import Profile
+from .signals import denormalize_profile
+from .similarity import DISTANCE_BITS
+
+User = get_user_model()
+
+PASSWORD = "bench-pass"
+EMAIL_DOMAIN = "bench.runnr.local"
+LEVELS = [c[0] for c in Profile.LEVEL_CHOICES]
+
+
+# ---- Données ----
+def seed(n, batch_size=5000, stdout=None):
+    """Crée `n` coureurs bench<i>@bench.runnr.local. Renvoie la liste de leurs ids."""
+    rng = random.Random(42)
+    password = make_password(PASSWORD)
+    with open(GAZETTEER_PATH, encoding="utf-8", newline="") as f:
+        cities = [row["name"] for row in csv.DictReader(f)]
+    distances = list(DISTANCE_BITS)
+    start = User.objects.filter(email__endswith="@" + EMAIL_DOMAIN).count()
+    ids = []
+    for offset in range(start, start + n, batch_size):
+        size = min(batch_size, start + n - offset)
+        users = User.objects.bulk_create([
+            User(username=f"bench{i}@{EMAIL_DOMAIN}", email=f"bench{i}@{EMAIL_DOMAIN}",
+                 first_name=f"Bench{i}", password=password)
+            for i in range(offset, offset + size)
+        ])
+        profiles = []
+        for u in users:
+            p = Profile(
+                user_id=u.pk,
+                level=rng.choice(LEVELS),
+                location_city=rng.choice(cities),
+                goals="Préparer un 10k",
+                availability_week=rng.random() < 0.6,
+                availability_weekend=rng.random() < 0.8,
+                distances=",".join(rng.sample(distances, rng.randint(1, 3))),
+                speed_kmh=round(rng.uniform(8, 16), 1),
+                is_premium=rng.random() < 0.1,
+            )
+            # bulk_create ne déclenche pas pre_save : dénormalisation à la main
+            denormalize_profile(Profile, p)
+            profiles.append(p)
+        Profile.objects.bulk_create(profiles)
+        ids.extend(u.pk for u in users)
+        if stdout:
+            stdout.write(f"  {offset + size - start}/{n} utilisateurs")
+    return ids
+
+
+def bench_user_ids():
+    return list(User.objects.filter(email__endswith="@" + EMAIL_DOMAIN).values_list("id", flat=True))
+
+
+# ---- OAuth local ----
+class StandInOAuthBackend:
+    """Fournisseur OAuth factice : auth_url() local, complete() renvoie un coureur seedé."""
+
+    def __init__(self, name, redirect_uri, pick_user):
+        self.name = name
+        self.redirect_uri = redirect_uri
+        self._pick_user = pick_user
+
+    def auth_url(self):
+        return f"{self.redirect_uri}?code=stand-in&state={self.name}"
+
+    def complete(self, *args, **kwargs):
+        return self._pick_user()
+
+
+@contextmanager
+def stand_in_oauth(user_ids):
+    rng = random.Random(7)
+    lock = threading.Lock()
+
+    def pick_user():
+        with lock:
+            uid = rng.choice(user_ids)
+        user = User.objects.get(pk=uid)
+        user.backend = "authapp.auth.ProfileModelBackend"
+        return user
+
+    def fake_load_backend(strategy, name, redirect_uri):
+        return StandInOAuthBackend(name, redirect_uri, pick_user)
+
+    with mock.patch("authapp.oauth_views.load_backend", fake_load_backend):
+        yield
+
+
+# ---- Scénarios : une requête type par route ----
+class Ctx:
+    """
+    État par thread : un client connecté, un générateur aléatoire, et deux
+    utilisateurs réservés au thread. Le second sert au reset de mot de passe,
+    qui invalide les sessions et les jetons de reset de son titulaire.
+    """
+
+    def __init__(self, user_ids, worker, workers, seed_):
+        self.rng = random.Random(seed_)
+        self.user_ids = user_ids
+        self.user = User.objects.get(pk=user_ids[worker])
+        self.reset_user = User.objects.get(pk=user_ids[workers + worker])
+        self.client = Client(HTTP_HOST="localhost")
+        self.client.force_login(self.user)
+        chat.open_conversations(self.user.id, [self.reset_user.id])
+        self.conversation_id = chat.get_for_pair(self.user.id, self.reset_user.id).id
+        self.serial = 0
+        self.worker = worker
+        self.photo_url = None
+        self._session_id = None
+
+    @property
+    def session_id(self):
+        # sortie du thread, organisée par reset_user : ctx.user peut s'y inscrire et la quitter
+        if self._session_id is None:
+            self._session_id = runs.create(
+                self.reset_user, title="Sortie du bench", starts_at=timezone.now() + timedelta(days=7),
+                capacity=200, location_city="Lyon",
+            ).id
+        return self._session_id
+
+    def other_id(self):
+        return self.rng.choice(self.user_ids)
+
+    def unique(self):
+        self.serial += 1
+        return f"{threading.get_ident()}-{self.serial}-{time.monotonic_ns()}"
+
+
+def _json_post(client, path, data):
+    return client.post(path, data, content_type="application/json")
+
+
+def _anon():
+    return Client(HTTP_HOST="localhost")
+
+
+def _reset_params(ctx):
+    user = ctx.reset_user
+    return {
+        "uid": urlsafe_base64_encode(force_bytes(user.pk)),
+        "token": default_token_generator.make_token(user),
+        "password": PASSWORD,
+    }
+
+
+def _logout(ctx):
+    c = _anon()
+    c.force_login(ctx.user)
+    return c.post("/api/logout")
+
+
+def _photo_bytes(shade):
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new("RGB", (1200, 900), (shade, 120, 90)).save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+
+def _photo_upload(ctx):
+    # contenu propre au thread : premier envoi traité, les suivants dédupliqués
+    f = io.BytesIO(_photo_bytes(ctx.worker))
+    f.name = "photo.jpg"
+    return ctx.client.post("/api/profile/photo", {"photo": f})
+
+
+def _photo_file(ctx):
+    if ctx.photo_url is None:
+        # variante prête d'avance, sans passer par le pool
+        data = _photo_bytes(255 - ctx.worker)
+        sha = hashlib.sha256(data).hexdigest()
+        os.makedirs(os.path.dirname(photos.original_path(sha)), exist_ok=True)
+        with open(photos.original_path(sha), "wb") as f:
+            f.write(data)
+        photos.render(sha)
+        ctx.photo_url = photos.urls(sha)["480"]["webp"]
+    return ctx.client.get(ctx.photo_url)
+
+
+def _account_delete(ctx):
+    # compte jetable : la suppression ne doit pas toucher les utilisateurs du bench
+    email = f"del-{ctx.unique()}@{EMAIL_DOMAIN}"
+    c = _anon()
+    c.force_login(User.objects.create(username=email, email=email))
+    return c.post("/api/account/delete")
+
+
+def _profile_boost(ctx):
+    # coureur pris au hasard : 201 si Premium, 409 si déjà boosté, 403 sinon ; le flux mêle ensuite les boostés
+    c = _anon()
+    c.force_login(User.objects.get(pk=ctx.other_id()))
+    return c.post("/api/profile/boost")
+
+
+def _calendar_feed(ctx):
+    return _anon().get(f"/api/calendar/{runs.calendar_token(ctx.user.id)}.ics")
+
+
+SCENARIOS = {
+    "metrics": (1, lambda ctx: ctx.client.get("/metrics")),
+    "google_login": (1, lambda ctx: _anon().get("/auth/google/login")),
+    "google_callback": (1, lambda ctx: _anon().get("/auth/google/callback?code=stand-in")),
+    "facebook_login": (1, lambda ctx: _anon().get("/auth/facebook/login")),
+    "facebook_callback": (1, lambda ctx: _anon().get("/auth/facebook/callback?code=stand-in")),
+    "apple_login": (1, lambda ctx: _anon().get("/auth/apple/login")),
+    "apple_callback": (1, lambda ctx: _anon().get("/auth/apple/callback?code=stand-in")),
+    "register_email": (1, lambda ctx: _json_post(_anon(), "/api/register", {
+        "email": f"new-{ctx.unique()}@{EMAIL_DOMAIN}", "password": PASSWORD, "name": "Nouveau Coureur"})),
+    "login_email": (1, lambda ctx: _json_post(_anon(), "/api/login", {"email": ctx.user.email, "password": PASSWORD})),
+    "register_email_async": (1, lambda ctx: _json_post(_anon(), "/api/async/register", {
+        "email": f"new-{ctx.unique()}@{EMAIL_DOMAIN}", "password": PASSWORD})),
+    "login_email_async": (1, lambda ctx: _json_post(
+        _anon(), "/api/async/login", {"email": ctx.user.email, "password": PASSWORD})),
+    "me": (20, lambda ctx: ctx.client.get("/api/me")),
+    "logout": (1, _logout),
+    "request_password_reset": (1, lambda ctx: _json_post(
+        ctx.client, "/api/request-password-reset", {"email": ctx.user.email})),
+    "reset_password_confirm": (1, lambda ctx: _json_post(
+        _anon(), "/api/reset-password-confirm", _reset_params(ctx))),
+    "reset_password_confirm_async": (1, lambda ctx: _json_post(
+        _anon(), "/api/async/reset-password-confirm", _reset_params(ctx))),
+    "profile_get": (10, lambda ctx: ctx.client.get("/api/profile")),
+    "profile_boost": (1, _profile_boost),
+    "profile_photo_upload": (1, _photo_upload),
+    "photo_file": (3, _photo_file),
+    "account_delete": (1, _account_delete),
+    "profile_update": (3, lambda ctx: _json_post(ctx.client, "/api/profile/update", {
+        "goals": f"Objectif {ctx.rng.randint(1, 100)}", "speed_kmh": round(ctx.rng.uniform(8, 16), 1)})),
+    # blocage puis déblocage d'un coureur pris au hasard : l'ensemble d'exclusion est rechargé
+    "block_user": (1, lambda ctx: ctx.client.post(f"/api/users/{ctx.other_id()}/block")),
+    "unblock_user": (1, lambda ctx: ctx.client.post(f"/api/users/{ctx.other_id()}/unblock")),
+    "blocks_list": (1, lambda ctx: ctx.client.get("/api/blocks")),
+    "notification_preferences": (1, lambda ctx: ctx.client.get("/api/notifications/preferences")),
+    "notification_preferences_update": (1, lambda ctx: _json_post(
+        ctx.client, "/api/notifications/preferences/update", {"message": random.random() < 0.8})),
+    "public_profile": (20, lambda ctx: ctx.client.get(f"/api/users/{ctx.other_id()}/profile")),
+    "public_profiles_batch": (5, lambda ctx: ctx.client.get(
+        "/api/users/profiles?ids=" + ",".join(str(ctx.other_id()) for _ in range(20)))),
+    "profile_cache_stats": (1, lambda ctx: ctx.client.get("/api/cache/stats")),
+    "incomplete_profiles": (1, lambda ctx: ctx.client.get("/api/profiles/incomplete?below=75&city=Lyon")),
+    "feed": (15, lambda ctx: ctx.client.get("/api/feed?limit=20")),
+    "nearby": (5, lambda ctx: ctx.client.get("/api/nearby?radius_km=20")),
+    "similarity_rank": (3, lambda ctx: _json_post(ctx.client, "/api/similarity", {
+        "ids": [ctx.other_id() for _ in range(500)], "limit": 20})),
+    "swipe": (10, lambda ctx: _json_post(ctx.client, "/api/swipe", {"target_id": ctx.other_id(), "like": True})),
+    "swipe_bulk": (3, lambda ctx: _json_post(ctx.client, "/api/swipes/bulk", {
+        "swipes": [{"target_id": ctx.other_id(), "like": ctx.rng.random() < 0.5} for _ in range(20)]})),
+    "conversations_list": (5, lambda ctx: ctx.client.get("/api/conversations")),
+    "conversation_messages": (5, lambda ctx: ctx.client.get(f"/api/conversations/{ctx.conversation_id}/messages")),
+    "message_send": (3, lambda ctx: _json_post(
+        ctx.client, f"/api/conversations/{ctx.conversation_id}/send", {"body": "On court demain matin ?"})),
+    "conversation_read": (2, lambda ctx: ctx.client.post(f"/api/conversations/{ctx.conversation_id}/read")),
+    "sessions_list": (3, lambda ctx: ctx.client.get("/api/sessions?city=Lyon")),
+    "session_create": (1, lambda ctx: _json_post(ctx.client, "/api/sessions/create", {
+        "title": "Fractionné au parc", "starts_at": (timezone.now() + timedelta(days=3)).isoformat(),
+        "capacity": 12, "location_city": "Lyon"})),
+    "session_detail": (2, lambda ctx: ctx.client.get(f"/api/sessions/{ctx.session_id}")),
+    "session_join": (2, lambda ctx: ctx.client.post(f"/api/sessions/{ctx.session_id}/join")),
+    "session_leave": (1, lambda ctx: ctx.client.post(f"/api/sessions/{ctx.session_id}/leave")),
+    "calendar_link": (1, lambda ctx: ctx.client.get("/api/calendar")),
+    "calendar_feed": (2, _calendar_feed),
+}
+
+SKIPPED_ROUTES = {"admin"}
+
+
+def uncovered_routes():
+    names = {p.name for p in get_resolver().url_patterns if getattr(p, "name", None)}
+    return sorted(names - set(SCENARIOS) - SKIPPED_ROUTES)
+
+
+# ---- Exécution ----
+@contextmanager
+def throwaway_db(prefix="runnr-bench-"):
+    """
+    Bascule l'alias default sur une base SQLite fichier neuve (migrée),
+    supprimée à la sortie ; renvoie son chemin. Les données sont commitées
+    (threads, reprises) sans jamais toucher ni verrouiller la vraie base.
+    L'alias n'est pas rebasculé : les écritures différées du process
+    (activité...) ne doivent pas partir vers la vraie base avec des ids du bench.
+    """
+    tmp = tempfile.mkdtemp(prefix=prefix)
+    conn = connections["default"]
+    conn.close()
+    conn.settings_dict["NAME"] = os.path.join(tmp, "bench.sqlite3")
+    try:
+        call_command("migrate", verbosity=0, interactive=False)
+        yield conn.settings_dict["NAME"]
+        activity.flush()  # avant la suppression du fichier, sinon le flush d'arrêt échoue
+    finally:
+        connections.close_all()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def run(user_ids, requests=2000, workers=8, only=None, seed_=1):
+    """Joue `requests` requêtes réparties sur `workers` threads. Renvoie le rapport (dict JSON)."""
+    names = [n for n in SCENARIOS if not only or n in only]
+    weights = [SCENARIOS[n][0] for n in names]
+    samples = {n: [] for n in names}
+    errors = {n: 0 for n in names}  # 5xx et exceptions
+    lock = threading.Lock()
+    per_worker = [requests // workers + (1 if i < requests % workers else 0) for i in range(workers)]
+
+    def worker(i):
+        try:
+            ctx = Ctx(user_ids, i, workers, seed_ * 1000 + i)
+            picks = ctx.rng.choices(names, weights=weights, k=per_worker[i])
+            local = []
+            for name in picks:
+                t0 = time.perf_counter()
+                try:
+                    resp = SCENARIOS[name][1](ctx)
+                    ok = resp.status_code < 500
+                except Exception:
+                    ok = False
+                local.append((name, (time.perf_counter() - t0) * 1000, ok))
+            with lock:
+                for name, ms, ok in local:
+                    samples[name].append(ms)
+                    errors[name] += 0 if ok else 1
+        finally:
+            close_old_connections()
+
+    if len(user_ids) < 2 * workers:
+        raise ValueError(f"au moins {2 * workers} utilisateurs requis pour {workers} workers")
+    metrics.registry.reset()
+    # les 4xx attendus (quota, 401 après logout...) ne polluent pas la sortie
+    request_logger = logging.getLogger("django.request")
+    level = request_logger.level
+    request_logger.setLevel(logging.ERROR)
+    try:
+        # toutes les requêtes viennent de 127.0.0.1 : sans ça, login/register finiraient en 429
+        # photos et notifications dans des fichiers jetables, pas dans MEDIA_ROOT ni sur la console
+        with stand_in_oauth(user_ids), override_settings(
+            RATE_LIMITS={}, PHOTO_ROOT=tempfile.mkdtemp(prefix="runnr-photos-"),
+            NOTIFICATION_CHANNELS=["authapp.notify.FileChannel"],
+            NOTIFICATION_FILE_PATH=tempfile.mktemp(prefix="runnr-notifications-", suffix=".jsonl"),
+        ):
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(worker, range(workers)))
+            elapsed = time.perf_counter() - t0
+    finally:
+        request_logger.setLevel(level)
+
+    per_view = metrics.registry.snapshot()
+    routes = {}
+    for name in names:
+        s = samples[name]
+        if not s:
+            continue
+        view = per_view.get(name, {})
+        routes[name] = {
+            "requests": len(s),
+            "errors": errors[name],
+            "rps": round(len(s) / elapsed, 2),
+            "p50_ms": round(percentile(s, 50), 3),
+            "p95_ms": round(percentile(s, 95), 3),
+            "p99_ms": round(percentile(s, 99), 3),
+            "mean_ms": round(statistics.fmean(s), 3),
+            "queries_per_request": round(view["queries"] / view["count"], 2) if view.get("count") else None,
+        }
+    all_samples = [ms for s in samples.values() for ms in s]
+    return {
+        "meta": {"users": len(user_ids), "requests": requests, "workers": workers, "elapsed_s": round(elapsed, 3)},
+        "total": {
+            "requests": len(all_samples),
+            "errors": sum(errors.values()),
+            "rps": round(len(all_samples) / elapsed, 2),
+            "p50_ms": round(percentile(all_samples, 50), 3),
+            "p95_ms": round(percentile(all_samples, 95), 3),
+            "p99_ms": round(percentile(all_samples, 99), 3),
+        },
+        "routes": routes,
+    }
+
+
+def compare(current, baseline, tolerance=0.2):
+    """
+    Lignes de diff par route et liste des régressions : p95 au-delà de
+    (1 + tolerance) x baseline, plus de requêtes SQL, ou nouvelles erreurs.
+    """
+    lines, regressions = [], []
+    for name, cur in sorted(current["routes"].items()):
+        base = baseline.get("routes", {}).get(name)
+        if base is None:
+            lines.append(f"{name:<30} nouveau")
+            continue
+        dp95 = (cur["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100 if base["p95_ms"] else 0.0
+        dq = (cur["queries_per_request"] or 0) - (base["queries_per_request"] or 0)
+        flags = []
+        if cur["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            flags.append("p95")
+        if dq > 0.5:
+            flags.append("queries")
+        if cur["errors"] > base["errors"]:
+            flags.append("errors")
+        if flags:
+            regressions.append((name, flags))
+        lines.append(
+            f"{name:<30} p95 {base['p95_ms']:8.2f} -> {cur['p95_ms']:8.2f} ms ({dp95:+6.1f} %)"
+            f"  sql/req {base['queries_per_request']} -> {cur['queries_per_request']}"
+            + (f"  REGRESSION: {', '.join(flags)}" if flags else "")
+        )
+    return lines, regressions
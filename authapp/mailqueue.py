@@ -0,0 +1,100 @@
+"""
+Envoi d'e-mails hors du thread de requête.
+
+Les vues appellent `enqueue()` : un simple INSERT dans OutboundEmail, commité
+avec la transaction de la requête. `drain()` envoie les messages en attente
+par lots sur une seule connexion SMTP ; il tourne dans
+`manage.py drain_outbox --loop` en prod, et dans un thread local après
+chaque commit si `MAIL_OUTBOX_EAGER` est activé (dev).
+
+Chaque lot est "réclamé" par un UPDATE conditionnel, si bien que plusieurs
+drains peuvent tourner en parallèle sans double envoi ; un lot réclamé par
+un worker mort, ou en échec d'envoi, est repris après `CLAIM_TIMEOUT`.
+"""
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CLAIM_TIMEOUT = timedelta(minutes=5)
+MAX_ATTEMPTS = 5
+
+_eager_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox")
+
+
+def enqueue(subject, body, recipients, from_email=None):
+    from .models import OutboundEmail
+
+    msg = OutboundEmail.objects.create(
+        subject=subject, body=body, to=",".join(recipients), from_email=from_email or ""
+    )
+    if getattr(settings, "MAIL_OUTBOX_EAGER", False):
+        transaction.on_commit(lambda: _eager_pool.submit(_drain_in_thread))
+    return msg
+
+
+def _drain_in_thread():
+    try:
+        drain()
+    except Exception:
+        logger.exception("outbox: échec du drain")
+    finally:
+        close_old_connections()
+
+
+def _claim(batch_size):
+    from .models import OutboundEmail
+
+    now = timezone.now()
+    pending = OutboundEmail.objects.filter(
+        Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - CLAIM_TIMEOUT),
+        sent_at__isnull=True,
+        attempts__lt=MAX_ATTEMPTS,
+    )
+    ids = list(pending.order_by("id").values_list("id", flat=True)[:batch_size])
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    # seul le premier worker à passer l'UPDATE obtient chaque ligne
+    pending.filter(id__in=ids).update(claimed_at=now, claim=token)
+    return list(OutboundEmail.objects.filter(claim=token, sent_at__isnull=True))
+
+
+def drain(batch_size=100, max_batches=None):
+    """Envoie les e-mails en attente. Renvoie le nombre d'envois réussis."""
+    from .models import OutboundEmail
+
+    sent = batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = _claim(batch_size)
+        if not rows:
+            break
+        batches += 1
+        done, failed = [], []
+        with get_connection() as conn:
+            for row in rows:
+                message = EmailMessage(
+                    row.subject, row.body, row.from_email or None, row.to.split(","), connection=conn
+                )
+                row.attempts += 1
+                try:
+                    message.send()
+                except Exception as exc:
+                    # reste réclamé : nouvelle tentative après CLAIM_TIMEOUT
+                    row.last_error = str(exc)[:1000]
+                    failed.append(row)
+                else:
+                    row.sent_at = timezone.now()
+                    done.append(row)
+        OutboundEmail.objects.bulk_update(done, ["sent_at", "attempts"])
+        OutboundEmail.objects.bulk_update(failed, ["attempts", "last_error"])
+        sent += len(done)
+    return sent
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from authapp import completion, profile_cache
+from authapp.models import Profile
+
+
+class Command(BaseCommand):
+    help = "Recalcule par lots completion_percent / completion_missing (après un import en bulk_create, par ex.)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **opts):
+        # les enregistrements en cache portent l'ancienne complétion
+        scanned, updated = completion.backfill(
+            Profile, batch_size=opts["batch_size"], on_update=profile_cache.invalidate_many
+        )
+        self.stdout.write(f"{scanned} profil(s) lu(s), {updated} corrigé(s)")
@@ -0,0 +1,133 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from authapp import activity
+from authapp.loadtest import throwaway_db
+from authapp.models import Profile
+
+# processus enfant : base SQLite jetable, activité notée puis sortie normale
+# sans flush explicite -> seul le hook atexit peut écrire last_active_at
+_CHILD = textwrap.dedent("""
+    import os, sys
+    sys.path.insert(0, {base!r})
+    os.environ["DJANGO_SETTINGS_MODULE"] = "settings"
+    os.environ["ACTIVITY_FLUSH_INTERVAL"] = "0"
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.db import connections
+    connections["default"].settings_dict["NAME"] = {path!r}
+    call_command("migrate", verbosity=0, interactive=False)
+    from django.contrib.auth import get_user_model
+    from authapp import activity
+    from authapp.models import Profile
+    User = get_user_model()
+    users = [User.objects.create(username=f"u{{i}}") for i in range({n})]
+    for u in users:
+        activity.touch(u.id)
+    assert activity.pending_count() == {n}
+    assert not Profile.objects.filter(last_active_at__isnull=False).exists()
+""")
+
+
+class Command(BaseCommand):
+    help = (
+        "Dernière activité : coût de touch(), coalescence des écritures (UPDATE par flush), "
+        "non-régression de last_active_at, flush à l'arrêt du process et index du filtre active_within. "
+        "Bases SQLite jetables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=5000)
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--touches", type=int, default=200_000)
+
+    def handle(self, *args, **opts):
+        failures = []
+        with override_settings(ACTIVITY_FLUSH_INTERVAL=0), throwaway_db(prefix="runnr-activity-db-"):
+            self._in_process(opts, failures)
+        self._shutdown(failures)
+        if failures:
+            raise CommandError("; ".join(failures))
+        self.stdout.write("OK")
+
+    def _in_process(self, opts, failures):
+        User = get_user_model()
+        activity.flush()  # tampon de ce process vidé avant de mesurer
+        users = User.objects.bulk_create([User(username=f"bench-activity-{i}") for i in range(opts["users"])])
+        Profile.objects.bulk_create([Profile(user_id=u.id) for u in users])
+        ids = [u.id for u in users]
+
+        # 1) coût du chemin de requête
+        n = opts["touches"]
+        t0 = time.perf_counter()
+        for i in range(n):
+            activity.touch(ids[i % len(ids)])
+        self.stdout.write(f"touch() : {(time.perf_counter() - t0) / n * 1e6:.2f} µs par appel")
+
+        # 2) N threads, touches concurrentes : un flush = quelques UPDATE
+        per_thread = n // opts["threads"]
+
+        def worker(k):
+            for i in range(per_thread):
+                activity.touch(ids[(k * per_thread + i) % len(ids)])
+
+        pool = [threading.Thread(target=worker, args=(k,)) for k in range(opts["threads"])]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        with CaptureQueriesContext(connection) as ctx:
+            flushed = activity.flush()
+        self.stdout.write(
+            f"flush : {flushed} utilisateurs pour {n + per_thread * opts['threads']} requêtes, "
+            f"{len(ctx.captured_queries)} UPDATE"
+        )
+        written = Profile.objects.filter(user_id__in=ids[:500], last_active_at__isnull=False).count()
+        if flushed != len(ids) or written != min(500, len(ids)):
+            failures.append(f"flush incomplet ({flushed}/{len(ids)})")
+
+        # 3) un flush plus ancien (autre worker en retard) ne recule pas la date
+        latest = Profile.objects.get(user_id=ids[0]).last_active_at
+        activity.touch(ids[0], now=(latest - timedelta(hours=1)).timestamp())
+        activity.flush()
+        if Profile.objects.get(user_id=ids[0]).last_active_at != latest:
+            failures.append("last_active_at a reculé")
+
+        # 4) le filtre passe par l'index
+        qs = Profile.objects.active_within(900).values_list("user_id", flat=True)
+        plan = qs.explain()
+        self.stdout.write(f"active_within(900) : {qs.count()} profils, plan : {' '.join(plan.split())}")
+        if connection.vendor == "sqlite" and "last_active_at" not in plan:
+            failures.append("active_within n'utilise pas l'index last_active_at")
+
+    def _shutdown(self, failures):
+        n = 200
+        with tempfile.TemporaryDirectory(prefix="runnr-activity-") as tmp:
+            path = os.path.join(tmp, "db.sqlite3")
+            code = _CHILD.format(base=str(settings.BASE_DIR), path=path, n=n)
+            started = datetime.now(dt_timezone.utc) - timedelta(minutes=2)
+            proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+            if proc.returncode:
+                failures.append(f"processus enfant en échec : {proc.stderr.strip()[-500:]}")
+                return
+            with sqlite3.connect(path) as db:
+                rows = db.execute("SELECT last_active_at FROM authapp_profile").fetchall()
+        flushed = [r for r, in rows if r is not None and datetime.fromisoformat(r).replace(tzinfo=dt_timezone.utc) >= started]
+        self.stdout.write(f"arrêt du process : {len(flushed)}/{n} last_active_at écrits par le flush atexit")
+        if len(flushed) != n:
+            failures.append("flush à l'arrêt incomplet")
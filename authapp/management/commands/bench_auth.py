@@ -0,0 +1,51 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+
+from authapp.auth import issue_tokens
+from authapp.loadtest import percentile, throwaway_db
+
+
+class Command(BaseCommand):
+    help = "Compare la latence de /api/me en session Django et en JWT sans DB (p50/p99, requêtes SQL). Base SQLite jetable."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--warmup", type=int, default=100)
+        parser.add_argument("--path", default="/api/me")
+
+    def handle(self, *args, **opts):
+        User = get_user_model()
+        with throwaway_db(prefix="runnr-auth-"):
+            user = User.objects.create_user(username="bench-auth@runnr.local", email="bench-auth@runnr.local")
+            session = Client(HTTP_HOST="localhost")
+            session.force_login(user)
+            jwt = Client(HTTP_HOST="localhost")
+            jwt.cookies["access_token"] = str(issue_tokens(user).access_token)
+
+            rows = [self._run(name, client, opts) for name, client in (("session", session), ("jwt", jwt))]
+
+        self.stdout.write(f"{'auth':<8} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8} {'queries':>8}")
+        for name, p50, p99, mean, queries in rows:
+            self.stdout.write(f"{name:<8} {p50:8.3f} {p99:8.3f} {mean:8.3f} {queries:8d}")
+
+    def _run(self, name, client, opts):
+        path = opts["path"]
+        for _ in range(opts["warmup"]):
+            client.get(path)
+        # compteur via execute_wrapper : queries_log est remis à zéro à chaque requête
+        queries = []
+        with connection.execute_wrapper(lambda execute, sql, *a: queries.append(sql) or execute(sql, *a)):
+            resp = client.get(path)
+        if resp.status_code != 200:
+            raise SystemExit(f"{name}: {path} -> HTTP {resp.status_code}")
+        samples = []
+        for _ in range(opts["requests"]):
+            t0 = time.perf_counter()
+            client.get(path)
+            samples.append((time.perf_counter() - t0) * 1000)
+        return name, percentile(samples, 50), percentile(samples, 99), statistics.fmean(samples), len(queries)
@@ -0,0 +1,144 @@
+import random
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import FloatField, Value
+from django.db.models.functions import Coalesce
+from django.test import override_settings
+from django.utils import timezone
+
+from authapp import boost, feed
+from authapp.loadtest import throwaway_db
+from authapp.models import Profile, ProfileBoost
+
+
+class Command(BaseCommand):
+    help = (
+        "Mise en avant : recalcul des poids, débit du flux avec insertion des boostés (table d'alias) "
+        "vs ORDER BY score en SQL, stabilité par (lecteur, curseur) et fidélité du tirage aux poids. Base SQLite jetable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100_000)
+        parser.add_argument("--boosted", type=int, default=5000)
+        parser.add_argument("--pages", type=int, default=2000)
+        parser.add_argument("--draws", type=int, default=200_000)
+
+    def handle(self, *args, **opts):
+        with override_settings(BOOST_TABLE_TTL=3600), throwaway_db(prefix="runnr-boost-"):
+            failures = self._run(opts)
+        if failures:
+            raise CommandError("; ".join(failures))
+        self.stdout.write("OK")
+
+    def _run(self, opts):
+        User = get_user_model()
+        rng = random.Random(5)
+        levels = [c[0] for c in Profile.LEVEL_CHOICES]
+        users = User.objects.bulk_create([User(username=f"bench-boost-{i}") for i in range(opts["users"])], batch_size=5000)
+        Profile.objects.bulk_create(
+            [Profile(user_id=u.id, level=rng.choice(levels), is_premium=i < opts["boosted"]) for i, u in enumerate(users)],
+            batch_size=5000,
+        )
+        ids = [u.id for u in users]
+        now = timezone.now()
+        starts = {uid: now - timedelta(seconds=rng.uniform(0, 900)) for uid in ids[:opts["boosted"]]}
+        # boosts démarrés pendant le dernier quart d'heure, comme par boost.activate
+        rows = []
+        for uid, at in starts.items():
+            refreshed_at, score = boost.initial(at)
+            rows.append(ProfileBoost(user_id=uid, started_at=at, expires_at=at + timedelta(seconds=boost.duration()),
+                                     score=score, refreshed_at=refreshed_at))
+        ProfileBoost.objects.bulk_create(rows, batch_size=5000)
+        feed.index.invalidate()
+        failures = []
+
+        # 1) job périodique : premier passage (un UPDATE par minute de démarrage), puis régime établi
+        t0 = time.perf_counter()
+        first, _ = boost.refresh(now)
+        first_ms = (time.perf_counter() - t0) * 1000
+        minutes = len({boost.initial(at)[0] for at in starts.values()})
+        later = now + timedelta(seconds=60)
+        t0 = time.perf_counter()
+        steady, _ = boost.refresh(later)
+        steady_ms = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        boost.table.load()
+        load_ms = (time.perf_counter() - t0) * 1000
+        self.stdout.write(
+            f"refresh : {first} poids en {first_ms:.0f} ms ({minutes} UPDATE), puis {steady} en "
+            f"{steady_ms:.1f} ms (une seule) ; table d'alias chargée en {load_ms:.1f} ms"
+        )
+        drift = max(abs(score - boost.decayed(starts[uid], later))
+                    for uid, score in ProfileBoost.objects.values_list("user_id", "score"))
+        if drift > 1e-9:
+            failures.append(f"poids inexacts (écart {drift:.2e})")
+
+        # 2) une page de 20 : ORDER BY score en SQL vs index du flux + insertion pondérée
+        level = levels[0]
+        viewers = rng.sample(ids[opts["boosted"]:], 50)
+
+        def sql_page(viewer):
+            return list(
+                Profile.objects.filter(level=level).exclude(user_id=viewer)
+                .annotate(b=Coalesce("user__boost__score", Value(0.0), output_field=FloatField()))
+                .order_by("-b", "user_id").values_list("user_id", flat=True)[:20]
+            )
+
+        def ranked_page(viewer, cursor):
+            page, _ = feed.index.page(level=level, after=cursor, limit=20, exclude={viewer})
+            return boost.merge(page, viewer, cursor, lambda uid: uid != viewer and feed.index.matches(uid, level))
+
+        ranked_page(viewers[0], 0)  # index chaud
+        n_sql = max(1, opts["pages"] // 20)
+        t0 = time.perf_counter()
+        for k in range(n_sql):
+            sql_page(viewers[k % len(viewers)])
+        sql_ms = (time.perf_counter() - t0) / n_sql * 1000
+        cursors = [rng.choice(ids) for _ in range(opts["pages"])]
+        t0 = time.perf_counter()
+        boosted_per_page = 0
+        for k, cursor in enumerate(cursors):
+            boosted_per_page += len(ranked_page(viewers[k % len(viewers)], cursor)[1])
+        ranked_ms = (time.perf_counter() - t0) / len(cursors) * 1000
+        self.stdout.write(
+            f"page de flux : ORDER BY score {sql_ms:.2f} ms ({1000 / sql_ms:.0f} pages/s) ; index + alias "
+            f"{ranked_ms:.3f} ms ({1000 / ranked_ms:.0f} pages/s), {boosted_per_page / len(cursors):.2f} boostés par page"
+        )
+
+        # 3) stabilité : même (lecteur, curseur) -> même page, curseurs voisins -> tirages différents
+        first = [ranked_page(v, c) for v, c in zip(viewers, cursors)]
+        again = [ranked_page(v, c) for v, c in zip(viewers, cursors)]
+        varied = len({tuple(sorted(ranked_page(viewers[0], c)[1])) for c in cursors[:50]})
+        self.stdout.write(f"stabilité : {sum(a == b for a, b in zip(first, again))}/{len(first)} pages identiques, "
+                          f"{varied} tirages distincts sur 50 curseurs")
+        if first != again:
+            failures.append("pagination instable")
+
+        # 4) fidélité : masse tirée par décile de poids vs masse attendue
+        snapshot_ids = boost.table._snapshot[0]
+        scores = dict(ProfileBoost.objects.values_list("user_id", "score"))
+        by_weight = sorted(snapshot_ids, key=scores.__getitem__)
+        decile = {uid: i * 10 // len(by_weight) for i, uid in enumerate(by_weight)}
+        total = sum(scores.values())
+        expected = Counter()
+        for uid in by_weight:
+            expected[decile[uid]] += scores[uid] / total
+        r = random.Random(11)
+        drawn = Counter()
+        t0 = time.perf_counter()
+        for _ in range(opts["draws"]):
+            for uid in boost.table.sample(r, 1, lambda uid: True):
+                drawn[decile[uid]] += 1
+        draw_us = (time.perf_counter() - t0) / opts["draws"] * 1e6
+        tv = 0.5 * sum(abs(drawn[d] / opts["draws"] - expected[d]) for d in range(10))
+        self.stdout.write(
+            f"tirage : {draw_us:.2f} µs ; décile le plus lourd {drawn[9] / opts['draws']:.3f} tiré pour "
+            f"{expected[9]:.3f} attendu ; écart total {tv:.4f}"
+        )
+        if tv > 0.01:
+            failures.append(f"tirage biaisé (écart {tv:.4f})")
+        return failures
@@ -0,0 +1,103 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from authapp import chat
+from authapp.loadtest import throwaway_db
+from authapp.models import Conversation, Message
+
+
+def _timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+class Command(BaseCommand):
+    help = (
+        "Messagerie : temps d'une page d'historique selon sa profondeur (curseur vs OFFSET) et de la liste "
+        "des matchs (champs dénormalisés vs GROUP BY). Base SQLite jetable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=200_000)
+        parser.add_argument("--conversations", type=int, default=2_000)
+        parser.add_argument("--page", type=int, default=30)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **opts):
+        with throwaway_db(prefix="runnr-chat-"):
+            self._run(opts)
+
+    def _run(self, opts):
+        User = get_user_model()
+        page, repeat = opts["page"], opts["repeat"]
+        users = User.objects.bulk_create(
+            [User(username=f"bench-chat-{i}@runnr.local") for i in range(opts["conversations"] + 1)]
+        )
+        me, others = users[0], users[1:]
+        now = timezone.now()
+        Conversation.objects.bulk_create(
+            [Conversation(user_a_id=me.id, user_b_id=o.id, last_message_at=now) for o in others]
+        )
+        convs = list(Conversation.objects.filter(user_a_id=me.id).order_by("id"))
+        long_conv = convs[0]
+
+        # une longue conversation + un message par autre conversation
+        batch = []
+        for i in range(opts["messages"]):
+            batch.append(Message(conversation=long_conv, sender_id=me.id, body=f"message {i}"))
+            if len(batch) == 10_000:
+                Message.objects.bulk_create(batch)
+                batch = []
+        for i, c in enumerate(convs[1:]):
+            batch.append(Message(conversation=c, sender_id=c.user_b_id, body="salut"))
+            c.last_message_at = now - timedelta(seconds=i)
+            c.last_message_preview = "salut"
+        Message.objects.bulk_create(batch)
+        Conversation.objects.bulk_update(convs[1:], ["last_message_at", "last_message_preview"])
+        ids = list(Message.objects.filter(conversation=long_conv).order_by("-id").values_list("id", flat=True))
+        self.stdout.write(f"{len(ids)} messages dans une conversation, {len(convs)} conversations\n")
+
+        self.stdout.write(f"{'profondeur':>10} {'curseur ms':>11} {'OFFSET ms':>10}")
+        for depth in (0, 1_000, 10_000, 100_000, len(ids) - page):
+            if depth > len(ids) - page:
+                continue
+            before = ids[depth - 1] if depth else None
+            keyset = _timed(lambda: chat.history(long_conv.id, before, page), repeat)
+            offset = _timed(lambda: list(
+                Message.objects.filter(conversation=long_conv).order_by("-id")
+                .values("id", "sender_id", "body", "created_at")[depth:depth + page]
+            ), repeat)
+            self.stdout.write(f"{depth:>10} {keyset:11.3f} {offset:10.3f}")
+
+        qs = Message.objects.filter(conversation_id=long_conv.id, id__lt=ids[len(ids) // 2]).order_by("-id")[:page]
+        sql, params = qs.query.sql_with_params()
+        with connection.cursor() as cur:
+            cur.execute("EXPLAIN QUERY PLAN " + sql, params)
+            plan = " | ".join(str(row[-1]) for row in cur.fetchall())
+        self.stdout.write(f"\nplan (curseur) : {plan}\n")
+
+        cursor = chat.decode_cursor(chat.inbox(me.id, None, 20)[1])
+        deep = chat.decode_cursor(chat.encode_cursor(convs[len(convs) // 2]))
+        denormalized = _timed(lambda: chat.inbox(me.id, None, 20), repeat)
+        denormalized_next = _timed(lambda: chat.inbox(me.id, cursor, 20), repeat)
+        denormalized_deep = _timed(lambda: chat.inbox(me.id, deep, 20), repeat)
+        group_by = _timed(lambda: list(
+            Conversation.objects.filter(Q(user_a_id=me.id) | Q(user_b_id=me.id))
+            .annotate(last=Max("messages__created_at")).order_by("-last")[:20]
+        ), max(1, repeat // 4))
+        self.stdout.write(
+            f"liste des matchs (20) : dénormalisée {denormalized:.3f} ms "
+            f"(page 2 : {denormalized_next:.3f} ms, milieu : {denormalized_deep:.3f} ms), "
+            f"GROUP BY sur Message {group_by:.3f} ms"
+        )
@@ -0,0 +1,124 @@
+import random
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from authapp import exclusions, feed
+from authapp.loadtest import throwaway_db
+from authapp.models import Block, Profile
+
+
+def _per_call_us(fn, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1e6
+
+
+class Command(BaseCommand):
+    help = (
+        "Blocages : pour un coureur qui en a --blocks, coût par requête du NOT IN (sous-requête) SQL, "
+        "d'un set rechargé à chaque requête et de l'ensemble trié en cache ; mémoire des deux structures. Base SQLite jetable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--blocks", type=int, default=100_000)
+        parser.add_argument("--others", type=int, default=20_000, help="Coureurs non bloqués.")
+        parser.add_argument("--candidates", type=int, default=5000, help="Taille d'un lot filtré en bloc.")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **opts):
+        with throwaway_db(prefix="runnr-exclusions-"):
+            failures = self._run(opts)
+        if failures:
+            raise CommandError("; ".join(failures))
+        self.stdout.write("OK")
+
+    def _run(self, opts):
+        User = get_user_model()
+        n = opts["blocks"] + opts["others"] + 1
+        users = User.objects.bulk_create([User(username=f"bench-excl-{i}") for i in range(n)], batch_size=5000)
+        Profile.objects.bulk_create([Profile(user_id=u.id) for u in users], batch_size=5000)
+        me, rest = users[0].id, [u.id for u in users[1:]]
+        rng = random.Random(3)
+        blocked = rng.sample(rest, opts["blocks"])
+        # la moitié bloqués par moi, l'autre moitié m'ont bloqué
+        half = len(blocked) // 2
+        Block.objects.bulk_create(
+            [Block(blocker_id=me, blocked_id=b) for b in blocked[:half]]
+            + [Block(blocker_id=b, blocked_id=me) for b in blocked[half:]],
+            batch_size=5000,
+        )
+        blocked_set = set(blocked)
+        feed.index.invalidate()
+        exclusions.clear()
+        repeat = opts["repeat"]
+        failures = []
+
+        # 1) chargement et mémoire
+        t0 = time.perf_counter()
+        excl = exclusions.load(me)
+        load_ms = (time.perf_counter() - t0) * 1000
+        as_set = set(excl._ids)
+        set_bytes = sys.getsizeof(as_set) + sum(sys.getsizeof(i) for i in as_set)
+        arr_bytes = excl._ids.buffer_info()[1] * excl._ids.itemsize
+        self.stdout.write(
+            f"{len(excl)} exclus : chargement {load_ms:.1f} ms ; tableau trié {arr_bytes / 1024:.0f} Kio "
+            f"vs set Python {set_bytes / 1024:.0f} Kio"
+        )
+        if len(excl) != len(blocked_set):
+            failures.append(f"ensemble incomplet ({len(excl)}/{len(blocked_set)})")
+
+        # 2) une page de flux (20 candidats) par requête
+        def sql_page():
+            sub = Block.objects.filter(blocker_id=me).values("blocked_id")
+            sub2 = Block.objects.filter(blocked_id=me).values("blocker_id")
+            return list(
+                Profile.objects.exclude(user_id__in=sub).exclude(user_id__in=sub2).exclude(user_id=me)
+                .order_by("user_id").values_list("user_id", flat=True)[:20]
+            )
+
+        def reload_page():
+            ids = set(Block.objects.filter(blocker_id=me).values_list("blocked_id", flat=True))
+            ids.update(Block.objects.filter(blocked_id=me).values_list("blocker_id", flat=True))
+            ids.add(me)
+            return feed.index.page(limit=20, exclude=ids)[0]
+
+        def cached_page():
+            return feed.index.page(limit=20, exclude=exclusions.for_user(me).with_extra({me}))[0]
+
+        expected = sql_page()
+        cached_page()  # index et LRU chauds
+        for label, fn in (("NOT IN (sous-requête)", sql_page), ("set rechargé", reload_page), ("ensemble en cache", cached_page)):
+            got = fn()
+            self.stdout.write(f"page de flux, {label:<22}: {_per_call_us(fn, repeat) / 1000:8.2f} ms")
+            if got != expected:
+                failures.append(f"{label} : page différente")
+
+        # 3) filtrage en bloc d'un lot de candidats (similarité, lots de profils)
+        cand = rng.sample(rest, min(opts["candidates"], len(rest)))
+        wanted = [c for c in cand if c not in blocked_set]
+
+        def sql_filter():
+            sub = Block.objects.filter(blocker_id=me).values("blocked_id")
+            sub2 = Block.objects.filter(blocked_id=me).values("blocker_id")
+            keep = set(
+                Profile.objects.filter(user_id__in=cand).exclude(user_id__in=sub).exclude(user_id__in=sub2)
+                .values_list("user_id", flat=True)
+            )
+            return [c for c in cand if c in keep]
+
+        def bisect_filter():
+            return [c for c in cand if c not in excl]
+
+        def numpy_filter():
+            return exclusions.for_user(me).filter(cand)
+
+        for label, fn in (("SQL", sql_filter), ("bisect par id", bisect_filter), ("searchsorted", numpy_filter)):
+            got = fn()
+            self.stdout.write(f"lot de {len(cand)} ids, {label:<14}: {_per_call_us(fn, repeat) / 1000:8.2f} ms")
+            if got != wanted:
+                failures.append(f"filtrage {label} incorrect")
+        return failures
@@ -0,0 +1,173 @@
+import json
+import os
+import random
+import threading
+import time
+from contextlib import nullcontext
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections, transaction
+from django.test import override_settings
+
+from authapp import chat, notify
+from authapp.loadtest import percentile, throwaway_db
+from authapp.models import Conversation, Notification, NotificationPreference
+
+
+class ProviderStandIn(notify.Channel):
+    """Fournisseur push simulé : `latency_ms` par appel, quel que soit le nombre de livraisons."""
+
+    def __init__(self, latency_ms):
+        self.latency = latency_ms / 1000
+        self.calls = 0
+
+    def send(self, deliveries):
+        self.calls += 1
+        time.sleep(self.latency)
+
+
+class Command(BaseCommand):
+    help = (
+        "Notifications : coût dans la requête (envoi direct vs file), débit du drain, taux de regroupement, "
+        "préférences respectées et latence création -> envoi sous flux continu. Base SQLite jetable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=400)
+        parser.add_argument("--messages", type=int, default=5000, help="Messages de la rafale (débit du drain).")
+        parser.add_argument("--burst", type=int, default=5, help="Messages d'affilée dans une même conversation.")
+        parser.add_argument("--rate", type=int, default=100, help="Messages/s du flux continu (latence).")
+        parser.add_argument("--seconds", type=float, default=4.0, help="Durée du flux continu.")
+        parser.add_argument("--provider-ms", type=float, default=20.0, help="Latence simulée d'un appel fournisseur.")
+        parser.add_argument("--muted", type=float, default=0.1, help="Part des coureurs sans notifications de message.")
+
+    def handle(self, *args, **opts):
+        # drain et envoi dans des threads distincts : il faut une vraie base fichier, données commitées
+        with throwaway_db(prefix="runnr-notify-") as db:
+            provider = ProviderStandIn(opts["provider_ms"])
+            out = notify.FileChannel(os.path.join(os.path.dirname(db), "deliveries.jsonl"))
+            with override_settings(NOTIFICATION_EAGER=False, NOTIFICATION_DELAY=0), \
+                    mock.patch.object(notify, "channels", lambda: [provider, out]):
+                self._run(opts, provider, out)
+
+    def _run(self, opts, provider, out):
+        failures = []
+        User = get_user_model()
+        users = [u.id for u in User.objects.bulk_create([User(username=f"bench-notify-{i}") for i in range(opts["users"])])]
+        rng = random.Random(0)
+        for a, b in zip(users[::2], users[1::2]):
+            chat.open_conversations(a, [b])
+        convs = list(Conversation.objects.all())
+        muted = set(rng.sample(users, int(len(users) * opts["muted"])))
+        NotificationPreference.objects.bulk_create([NotificationPreference(user_id=u, message=False) for u in muted])
+
+        # 1) coût dans la requête : envoi direct (préférences + fournisseur) vs INSERT dans la file
+        def inline(user_id, kind, group_key, **data):
+            if (user_id, kind) not in notify._muted({user_id}):
+                provider.send([{"user_id": user_id, "kind": kind, "title": "", "body": data.get("preview", "")}])
+
+        timings = {}
+        for label, patch in (("file", None), ("direct", inline)):
+            samples = []
+            with mock.patch.object(notify, "enqueue", patch) if patch else nullcontext():
+                for i in range(100):
+                    conv = convs[i % len(convs)]
+                    t0 = time.perf_counter()
+                    chat.send(conv, conv.user_a_id, f"message {i}")
+                    samples.append((time.perf_counter() - t0) * 1000)
+            timings[label] = samples
+        self.stdout.write(
+            f"envoi de message : p50 {percentile(timings['file'], 50):.2f} ms p99 {percentile(timings['file'], 99):.2f} ms "
+            f"(file) vs p50 {percentile(timings['direct'], 50):.2f} ms p99 {percentile(timings['direct'], 99):.2f} ms "
+            f"(envoi direct, fournisseur à {opts['provider_ms']:.0f} ms)"
+        )
+        notify.drain()
+        Notification.objects.all().delete()
+        open(out.path, "w").close()
+        provider.calls = 0
+
+        # 2) débit du drain sur une rafale : rafales de `burst` messages par conversation
+        items, conv_cycle = [], 0
+        while len(items) < opts["messages"]:
+            conv = convs[conv_cycle % len(convs)]
+            conv_cycle += 1
+            for _ in range(opts["burst"]):
+                items.append((conv.user_b_id, "message", f"message:{conv.id}", {"conversation_id": conv.id, "preview": "salut"}))
+        with transaction.atomic():
+            notify.enqueue_many(items[: opts["messages"]])
+        t0 = time.perf_counter()
+        delivered, handled = notify.drain()
+        elapsed = time.perf_counter() - t0
+        sent = Notification.objects.filter(outcome__in=("sent", "merged")).count()
+        self.stdout.write(
+            f"drain : {handled} notifications en {elapsed * 1000:.0f} ms ({handled / elapsed:.0f}/s), "
+            f"{delivered} envois en {provider.calls} appel(s) fournisseur ; regroupement {sent / max(delivered, 1):.1f}:1"
+        )
+        if handled != opts["messages"]:
+            failures.append(f"{handled} notifications traitées sur {opts['messages']}")
+
+        # 3) préférences : aucun envoi de message vers un coureur qui les a coupées
+        lines = [json.loads(line) for line in open(out.path, encoding="utf-8")]
+        leaked = sum(1 for d in lines if d["user_id"] in muted and d["kind"] == "message")
+        silenced = Notification.objects.filter(outcome="muted").count()
+        self.stdout.write(f"préférences : {silenced} notifications coupées, {leaked} envoyée(s) à tort")
+        if leaked:
+            failures.append(f"{leaked} notification(s) envoyée(s) malgré les préférences")
+        if len(lines) != delivered:
+            failures.append(f"{len(lines)} lignes écrites pour {delivered} envois")
+
+        # 4) latence de bout en bout sous flux continu : un thread écrit, un worker draine
+        latencies, achieved = self._stream(convs, opts)
+        self.stdout.write(
+            f"flux {achieved:.0f} msg/s (visé {opts['rate']}) pendant {opts['seconds']:.0f} s : {len(latencies)} notifications, "
+            f"création -> envoi p50 {percentile(latencies, 50):.0f} ms p99 {percentile(latencies, 99):.0f} ms"
+        )
+        pending = Notification.objects.filter(sent_at__isnull=True).count()
+        if pending:
+            failures.append(f"{pending} notification(s) restée(s) en file")
+        if failures:
+            raise CommandError("; ".join(failures))
+        self.stdout.write("OK")
+
+    def _stream(self, convs, opts):
+        """
+        Messages à `rate`/s pendant `seconds` s, drainés en parallèle.
+        Renvoie (latences en ms, débit d'écriture obtenu). Sur SQLite, l'écrivain
+        et le worker se disputent le verrou de la base : au-delà de quelques
+        centaines de messages/s, c'est lui qui fait monter la latence.
+        """
+        Notification.objects.all().delete()
+        stop = threading.Event()
+
+        def worker():
+            try:
+                while True:
+                    _, handled = notify.drain()
+                    if not handled:
+                        if stop.is_set():
+                            return
+                        time.sleep(0.05)
+            finally:
+                close_old_connections()
+                connections.close_all()
+
+        drainer = threading.Thread(target=worker)
+        drainer.start()
+        total = int(opts["rate"] * opts["seconds"])
+        t0 = time.perf_counter()
+        for i in range(total):
+            conv = convs[(i // opts["burst"]) % len(convs)]
+            chat.send(conv, conv.user_a_id, f"flux {i}")
+            delay = t0 + (i + 1) / opts["rate"] - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        achieved = total / (time.perf_counter() - t0)
+        stop.set()
+        drainer.join()
+        latencies = [
+            (sent_at - created_at).total_seconds() * 1000
+            for created_at, sent_at in Notification.objects.filter(sent_at__isnull=False).values_list("created_at", "sent_at")
+        ]
+        return latencies, achieved
@@ -0,0 +1,125 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import wait
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.http.multipartparser import MultiPartParser
+from django.test import Client, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+
+from authapp import photos
+from authapp.loadtest import throwaway_db
+
+
+def _jpeg(seed, width, height):
+    from PIL import Image
+
+    # bruit : un JPEG peu compressible, plus proche d'une photo qu'un aplat
+    im = Image.effect_noise((width, height), 32 + seed % 32).convert("RGB")
+    buf = io.BytesIO()
+    im.save(buf, "JPEG", quality=92)
+    return buf.getvalue()
+
+
+def _peak_parse(body_path, size, handlers):
+    """Pic mémoire (octets) du parsing multipart côté serveur, corps lu depuis un fichier comme un socket."""
+    meta = {"CONTENT_TYPE": MULTIPART_CONTENT, "CONTENT_LENGTH": str(size)}
+    with open(body_path, "rb") as stream:
+        tracemalloc.start()
+        _, files = MultiPartParser(meta, stream, handlers).parse()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    for f in files.values():
+        if hasattr(f, "sha256"):
+            photos.discard(f)
+        else:
+            f.close()
+    return peak
+
+
+class Command(BaseCommand):
+    help = (
+        "Photos : mémoire par upload (handlers Django par défaut vs upload streamé), débit de l'endpoint "
+        "d'upload et du pool de variantes. PHOTO_ROOT et base jetables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--uploads", type=int, default=20)
+        parser.add_argument("--width", type=int, default=2400)
+        parser.add_argument("--height", type=int, default=1600)
+
+    def handle(self, *args, **opts):
+        root = tempfile.mkdtemp(prefix="runnr-photos-")
+        try:
+            with override_settings(PHOTO_ROOT=root, RATE_LIMITS={}), throwaway_db(prefix="runnr-photos-db-"):
+                self._run(root, opts)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+    def _run(self, root, opts):
+        failures = []
+        # 1) mémoire du parsing, pour un fichier sous et au-dessus du seuil mémoire de Django (2,5 Mo)
+        for mb in (2, 8):
+            data = os.urandom(mb * 1024 * 1024)
+            body = encode_multipart(BOUNDARY, {"photo": _named(data)})
+            with tempfile.NamedTemporaryFile(delete=False) as f:
+                f.write(body)
+            try:
+                default = _peak_parse(f.name, len(body), [MemoryFileUploadHandler(), TemporaryFileUploadHandler()])
+                streamed = _peak_parse(f.name, len(body), [photos.HashingUploadHandler()])
+            finally:
+                os.unlink(f.name)
+            self.stdout.write(
+                f"upload {mb} Mo : pic mémoire {default / 1024:.0f} Kio (handlers par défaut) "
+                f"vs {streamed / 1024:.0f} Kio (streamé + SHA-256)"
+            )
+            if streamed > 1024 * 1024:
+                failures.append(f"upload streamé de {mb} Mo : {streamed} octets en mémoire")
+
+        # 2) débit de l'endpoint : validation + rangement, variantes hors requête
+        User = get_user_model()
+        user = User.objects.create(username="bench-photos@runnr.local")
+        client = Client(HTTP_HOST="localhost")
+        client.force_login(user)
+        images = [_jpeg(i, opts["width"], opts["height"]) for i in range(opts["uploads"])]
+        self.stdout.write(
+            f"{len(images)} JPEG {opts['width']}x{opts['height']}, {sum(map(len, images)) / len(images) / 1024:.0f} Kio en moyenne"
+        )
+        futures = []
+        submit = photos.submit
+        with mock.patch.object(photos, "submit", lambda *a: futures.append(submit(*a))):
+            t0 = time.perf_counter()
+            statuses = [client.post("/api/profile/photo", {"photo": _named(b)}).status_code for b in images]
+            upload_s = time.perf_counter() - t0
+            wait(futures)
+            render_s = time.perf_counter() - t0
+        self.stdout.write(
+            f"endpoint : {len(images) / upload_s:.1f} uploads/s ({upload_s / len(images) * 1000:.1f} ms par requête) ; "
+            f"variantes : {len(images) / render_s:.1f} photos/s avec {photos._executor()._max_workers} worker(s)"
+        )
+        if any(s != 202 for s in statuses):
+            failures.append(f"statuts inattendus : {sorted(set(statuses))}")
+
+        # 3) déduplication : même contenu -> prêt tout de suite, aucun nouveau fichier
+        before = sum(len(files) for _, _, files in os.walk(root))
+        resp = client.post("/api/profile/photo", {"photo": _named(images[0])})
+        after = sum(len(files) for _, _, files in os.walk(root))
+        self.stdout.write(f"doublon : {resp.status_code} {resp.json()['status']}, {after - before} fichier(s) ajouté(s)")
+        if resp.status_code != 200 or after != before:
+            failures.append("le doublon a été retraité")
+        if failures:
+            raise CommandError("; ".join(failures))
+        self.stdout.write("OK")
+
+
+def _named(data):
+    f = io.BytesIO(data)
+    f.name = "photo.jpg"
+    return f
@@ -0,0 +1,149 @@
+import asyncio
+import gc
+import json
+import resource
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from authapp import push
+from authapp.loadtest import percentile
+
+
+async def _not_found(scope, receive, send):
+    await send({"type": "http.response.start", "status": 404, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def _scope(token):
+    return {
+        "type": "http",
+        "method": "GET",
+        "path": push.SSE_PATH,
+        "headers": [(b"cookie", f"access_token={token}".encode())],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Canal push en process (sans serveur ASGI) : N connexions SSE inactives, mémoire par connexion, "
+        "latence de diffusion et bornage de la file d'un client lent."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=10_000)
+        parser.add_argument("--users", type=int, default=2_000)
+        parser.add_argument("--events", type=int, default=2_000)
+
+    def handle(self, *args, **opts):
+        per_user = -(-opts["connections"] // opts["users"])
+        if per_user > getattr(settings, "PUSH_MAX_CONNECTIONS_PER_USER", 5):
+            raise CommandError("trop de connexions par utilisateur : augmenter --users")
+        asyncio.run(self._run(opts))
+
+    async def _run(self, opts):
+        n, users = opts["connections"], opts["users"]
+        app = push.PushApp(_not_found)
+        loop = asyncio.get_running_loop()
+        tokens = {}
+        for uid in range(1, users + 2):
+            t = AccessToken()
+            t["user_id"] = uid
+            tokens[uid] = str(t)
+
+        latencies = []
+        disconnected = loop.create_future()
+
+        async def receive():
+            await disconnected
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            body = message.get("body", b"")
+            if body.startswith(b"event: "):
+                data = json.loads(body.split(b"data: ", 1)[1])
+                latencies.append(time.perf_counter() - data["sent"])
+
+        gc.collect()
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        tasks = [asyncio.ensure_future(app(_scope(tokens[i % users + 1]), receive, send)) for i in range(n)]
+        while push.broker().connections() < n:
+            await asyncio.sleep(0.01)
+        open_s = time.perf_counter() - t0
+        gc.collect()
+        per_conn = (tracemalloc.get_traced_memory()[0] - base) / n
+        tracemalloc.stop()
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.stdout.write(
+            f"{n} connexions ouvertes en {open_s:.2f} s ; {per_conn / 1024:.1f} Kio Python par connexion, "
+            f"RSS max +{(rss_after - rss_before) / 1024:.0f} Mio"
+        )
+
+        # diffusion depuis un autre thread, comme une vue WSGI
+        def publish_all():
+            for i in range(opts["events"]):
+                payload = json.dumps({"type": "match", "user_id": 0, "sent": time.perf_counter()})
+                push.broker().publish(i % users + 1, ("match", payload))
+
+        expected = sum(
+            len(push.broker()._subs.get(i % users + 1, ())) for i in range(opts["events"])
+        ) if isinstance(push.broker(), push.LocalBroker) else opts["events"]
+        t0 = time.perf_counter()
+        await loop.run_in_executor(None, publish_all)
+        while len(latencies) < expected and time.perf_counter() - t0 < 30:
+            await asyncio.sleep(0.01)
+        ms = [x * 1000 for x in latencies]
+        self.stdout.write(
+            f"{len(ms)}/{expected} événements livrés en {time.perf_counter() - t0:.2f} s ; "
+            f"latence p50 {percentile(ms, 50):.2f} ms, p99 {percentile(ms, 99):.2f} ms, "
+            f"moyenne {statistics.fmean(ms):.2f} ms"
+        )
+
+        await self._slow_client(app, tokens[users + 1], users + 1)
+
+        disconnected.set_result(None)
+        await asyncio.gather(*tasks)
+        self.stdout.write(f"après déconnexion : {push.broker().connections()} connexion(s) enregistrée(s)")
+
+    async def _slow_client(self, app, token, uid):
+        """Un client qui ne lit plus : sa file reste bornée, puis il reçoit un resync."""
+        maxlen = getattr(settings, "PUSH_QUEUE_MAX", 64)
+        release = asyncio.Event()
+        frames = []
+        gone = asyncio.get_running_loop().create_future()
+
+        async def receive():
+            await gone
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            body = message.get("body", b"")
+            if body.startswith(b"event: "):
+                await release.wait()  # socket saturée
+                frames.append(body.split(b"\n", 1)[0].decode())
+
+        task = asyncio.ensure_future(app(_scope(token), receive, send))
+        while uid not in push.broker()._subs:
+            await asyncio.sleep(0.01)
+        (sub,) = push.broker()._subs[uid]
+        for _ in range(10 * maxlen):
+            push.broker().publish(uid, ("match", json.dumps({"type": "match", "sent": 0})))
+        await asyncio.sleep(0.1)
+        queued = len(sub.queue)
+        release.set()
+        while sub.queue:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.01)
+        gone.set_result(None)
+        await task
+        self.stdout.write(
+            f"client lent : {10 * maxlen} publiés, file max {queued}/{maxlen}, "
+            f"{len(frames)} livrés dont {frames.count('event: resync')} resync"
+        )
@@ -0,0 +1,52 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+
+from authapp import ratelimit
+
+
+class Command(BaseCommand):
+    help = (
+        "Limiteur de débit : surcoût du chemin autorisé et borne mémoire du store local. Exactitude sous "
+        "accès concurrents et rafale de logins : authapp.tests.RateLimitConcurrencyTests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--calls", type=int, default=100_000)
+        parser.add_argument("--keys", type=int, default=1_000_000)
+
+    def handle(self, *args, **opts):
+        failures = []
+
+        # 1) surcoût du chemin autorisé
+        request = RequestFactory().post("/api/login", REMOTE_ADDR="203.0.113.7")
+        rules = {"bench": (("ip", 10**9, 60), ("ident", 10**9, 60))}
+        with override_settings(RATE_LIMITS=rules):
+            n = opts["calls"]
+            t0 = time.perf_counter()
+            for _ in range(n):
+                ratelimit.check("bench", request, "runner@runnr.local")
+            per_call = (time.perf_counter() - t0) / n * 1e6
+        self.stdout.write(f"chemin autorisé : {per_call:.2f} µs par check() (2 règles)")
+
+        # 2) borne mémoire du store local
+        max_keys = 100_000
+        store = ratelimit.LocalStore(max_keys)
+        tracemalloc.start()
+        now = time.time()
+        for i in range(opts["keys"]):
+            store.hit(f"k{i}", 5, 60, now)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        self.stdout.write(
+            f"mémoire : {opts['keys']} clés distinctes -> {len(store)} conservées "
+            f"(max {max_keys}), {size / len(store):.0f} o par clé"
+        )
+        if len(store) > max_keys:
+            failures.append("store local non borné")
+
+        if failures:
+            raise CommandError("; ".join(failures))
+        self.stdout.write("OK")
@@ -0,0 +1,102 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connections
+from django.utils import timezone
+
+from authapp import runs
+from authapp.loadtest import percentile, throwaway_db
+from authapp.models import Participation, RunSession
+
+
+class Command(BaseCommand):
+    help = (
+        "Sorties : N threads s'inscrivent en même temps à une sortie de capacité C (base SQLite "
+        "jetable). Vérifie l'absence de surréservation et de 'database is locked', rapporte p50/p99."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=32)
+        parser.add_argument("--attempts", type=int, default=2000, help="Inscriptions tentées (coureurs distincts).")
+        parser.add_argument("--capacity", type=int, default=50)
+
+    def handle(self, *args, **opts):
+        # threads = connexions distinctes : il faut une vraie base fichier, données commitées
+        with throwaway_db(prefix="runnr-sessions-"):
+            self._run(opts)
+
+    def _run(self, opts):
+        User = get_user_model()
+        users = User.objects.bulk_create([User(username=f"bench-session-{i}") for i in range(opts["attempts"] + 1)])
+        organizer, runners = users[0], [u.id for u in users[1:]]
+        session = runs.create(
+            organizer, title="Bench", starts_at=timezone.now() + timedelta(days=1), capacity=opts["capacity"] + 1
+        )
+        failures = []
+        results = self._hammer(session.id, runners, opts["threads"])
+        accepted = [ms for outcome, ms in results if outcome == "joined"]
+        full = [ms for outcome, ms in results if outcome == "full"]
+        locked = sum(1 for outcome, _ in results if outcome == "locked")
+        taken = RunSession.objects.get(pk=session.id).taken
+        rows = Participation.objects.filter(session_id=session.id).count()
+        self.stdout.write(
+            f"{len(results)} inscriptions sur {opts['threads']} threads : {len(accepted)} acceptées, "
+            f"{len(full)} refusées (complet), {locked} 'database is locked' ; taken={taken}, participations={rows}"
+        )
+        self.stdout.write(
+            f"acceptées p50 {percentile(accepted, 50):.2f} ms p99 {percentile(accepted, 99):.2f} ms ; "
+            f"refus p50 {percentile(full, 50):.2f} ms p99 {percentile(full, 99):.2f} ms"
+        )
+        if len(accepted) != opts["capacity"] or taken != opts["capacity"] + 1 or rows != taken:
+            failures.append("surréservation ou compteur incohérent")
+        if locked:
+            failures.append(f"{locked} erreur(s) 'database is locked'")
+
+        # même coureur, même instant, depuis tous les threads : une seule place prise ;
+        # une place libérée par un inscrit (l'ordre d'arrivée des threads est libre)
+        runner = Participation.objects.filter(session_id=session.id).exclude(user_id=organizer.id).values_list("user_id", flat=True)[0]
+        runs.leave(session.id, runner)
+        dup = self._hammer(session.id, [runner] * opts["threads"], opts["threads"])
+        outcomes = sorted(o for o, _ in dup)
+        taken = RunSession.objects.get(pk=session.id).taken
+        self.stdout.write(f"double inscription concurrente : {outcomes.count('joined')} acceptée(s), taken={taken}")
+        if outcomes.count("joined") != 1 or taken != opts["capacity"] + 1:
+            failures.append("double inscription comptée deux fois")
+        if failures:
+            raise CommandError("; ".join(failures))
+        self.stdout.write("OK")
+
+    def _hammer(self, session_id, user_ids, threads):
+        """Inscriptions simultanées (barrière), réparties sur `threads`. Renvoie [(issue, ms)]."""
+        results, lock = [], threading.Lock()
+        barrier = threading.Barrier(threads)
+
+        def worker(k):
+            local = []
+            RunSession.objects.exists()  # connexion ouverte avant la mesure
+            barrier.wait()
+            try:
+                for uid in user_ids[k::threads]:
+                    t0 = time.perf_counter()
+                    try:
+                        outcome = "joined" if runs.join(session_id, uid) else "already"
+                    except runs.Full:
+                        outcome = "full"
+                    except OperationalError as e:
+                        outcome = "locked" if "locked" in str(e) else "error"
+                    local.append((outcome, (time.perf_counter() - t0) * 1000))
+            finally:
+                close_old_connections()
+                connections.close_all()
+            with lock:
+                results.extend(local)
+
+        pool = [threading.Thread(target=worker, args=(k,)) for k in range(threads)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        return results
@@ -0,0 +1,161 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from authapp.auth import issue_tokens
+from authapp.loadtest import throwaway_db
+from authapp.models import Profile
+
+# process "worker" : boot de wsgi.py puis premières requêtes, chronométrés
+WORKER = r"""
+import io, json, os, sys, time
+from wsgiref.util import setup_testing_defaults
+
+sys.path.insert(0, os.getcwd())
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings")
+from django.conf import settings
+
+settings.DATABASES["default"]["NAME"] = os.environ["RUNNR_BENCH_DB"]
+import wsgi
+
+spawned = float(os.environ["RUNNR_BENCH_SPAWNED"])
+if os.environ.get("RUNNR_BENCH_FORK") == "1":
+    # gunicorn --preload : le master a chargé (et chauffé) l'application, le worker est un fork
+    spawned = time.time()
+    pid = os.fork()
+    if pid:
+        os.waitpid(pid, 0)
+        sys.exit(0)
+ready = time.time()
+
+
+def get(path, cookie=""):
+    path, _, qs = path.partition("?")
+    environ = {"PATH_INFO": path, "QUERY_STRING": qs, "HTTP_HOST": "localhost", "HTTP_COOKIE": cookie}
+    setup_testing_defaults(environ)
+    environ["wsgi.input"] = io.BytesIO(b"")
+    status = []
+    t0 = time.perf_counter()
+    body = b"".join(wsgi.application(environ, lambda s, h, exc=None: status.append(s)))
+    return int(status[0][:3]), (time.perf_counter() - t0) * 1000, len(body)
+
+
+cookie = "access_token=" + os.environ["RUNNR_BENCH_TOKEN"]
+out = {"boot_ms": (ready - spawned) * 1000, "routes": {}}
+for path, auth in (("/api/feed?limit=20", True), ("/api/sessions", True), ("/auth/google/login", False)):
+    first = get(path, cookie if auth else "")
+    second = get(path, cookie if auth else "")
+    out["routes"][path] = {"status": first[0], "first_ms": first[1], "second_ms": second[1]}
+out["first_response_ms"] = (time.time() - spawned) * 1000
+print(json.dumps(out))
+"""
+
+# imports d'un worker : wsgi.py, et l'ancien import direct des vues OAuth depuis urls.py
+IMPORTS = {
+    "vues OAuth différées": "import wsgi",
+    "vues OAuth importées au boot": "import wsgi; import authapp.oauth_views",
+}
+
+# (libellé, WARMUP, fork après chargement comme gunicorn --preload)
+WORKER_MODES = (
+    ("sans warm-up", "0", "0"),
+    ("avec warm-up", "1", "0"),
+    ("avec warm-up, forkés (--preload)", "1", "1"),
+)
+
+
+def _import_totals(stderr):
+    """(total en µs, {paquet: µs}) d'une sortie `python -X importtime`."""
+    total, packages = 0, {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        head, cumulative, name = line.split("|")
+        if not name.startswith("  "):
+            total += int(cumulative)  # premier niveau : inclut tout ce qu'il importe
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(head.split(":")[1])
+    return total, packages
+
+
+class Command(BaseCommand):
+    help = (
+        "Démarrage des workers : temps d'import (`python -X importtime`) avec et sans les vues OAuth, "
+        "puis boot et première réponse de N process wsgi, avec et sans WARMUP. Base SQLite jetable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=5, help="Process lancés par configuration.")
+        parser.add_argument("--profiles", type=int, default=20000, help="Profils en base (index du flux, similarité).")
+
+    def handle(self, *args, **opts):
+        with throwaway_db(prefix="runnr-startup-") as db:
+            token = self._seed(opts["profiles"])
+            connections.close_all()
+            env = {**os.environ, "DJANGO_SETTINGS_MODULE": "settings", "RUNNR_BENCH_DB": db, "RUNNR_BENCH_TOKEN": token}
+            self._imports(env, opts["workers"])
+            self._workers(env, opts["workers"])
+
+    def _seed(self, n):
+        User = get_user_model()
+        users = User.objects.bulk_create([User(username=f"bench-startup-{i}") for i in range(n)], batch_size=5000)
+        levels = [c[0] for c in Profile.LEVEL_CHOICES]
+        Profile.objects.bulk_create(
+            [Profile(user=u, level=levels[i % len(levels)], location_city="Lyon", speed_kmh=8 + i % 10)
+             for i, u in enumerate(users)],
+            batch_size=5000,
+        )
+        return str(issue_tokens(users[0]).access_token)
+
+    def _run(self, args, env):
+        return subprocess.run(
+            [sys.executable, *args], env=env, cwd=settings.BASE_DIR, capture_output=True, text=True, check=False
+        )
+
+    def _imports(self, env, runs):
+        results = {}
+        for label, code in IMPORTS.items():
+            totals, top = [], {}
+            for _ in range(runs):
+                proc = self._run(["-X", "importtime", "-c", f"import sys, os; sys.path.insert(0, os.getcwd()); {code}"], env)
+                if proc.returncode:
+                    raise CommandError(proc.stderr[-2000:])
+                total, top = _import_totals(proc.stderr)
+                totals.append(total)
+            results[label] = statistics.median(totals)
+            heaviest = ", ".join(f"{name} {us / 1000:.0f}" for name, us in sorted(top.items(), key=lambda kv: -kv[1])[:5])
+            self.stdout.write(f"imports ({label}) : médiane {results[label] / 1000:.0f} ms sur {runs} ; plus lourds (ms) : {heaviest}")
+        saved = results["vues OAuth importées au boot"] - results["vues OAuth différées"]
+        self.stdout.write(f"vues OAuth différées : {saved / 1000:.0f} ms d'import en moins par worker")
+
+    def _workers(self, env, n):
+        failures = []
+        for label, warmup, fork in WORKER_MODES:
+            samples = []
+            for _ in range(n):
+                proc_env = {**env, "WARMUP": warmup, "RUNNR_BENCH_FORK": fork, "RUNNR_BENCH_SPAWNED": repr(time.time())}
+                proc = self._run(["-c", WORKER], proc_env)
+                if proc.returncode:
+                    raise CommandError(proc.stderr[-2000:])
+                samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+            boot = statistics.median(s["boot_ms"] for s in samples)
+            total = statistics.median(s["first_response_ms"] for s in samples)
+            self.stdout.write(f"{n} workers {label} : boot {boot:.0f} ms, lancement -> 3 premières réponses {total:.0f} ms")
+            for path in samples[0]["routes"]:
+                first = statistics.median(s["routes"][path]["first_ms"] for s in samples)
+                second = statistics.median(s["routes"][path]["second_ms"] for s in samples)
+                statuses = {s["routes"][path]["status"] for s in samples}
+                self.stdout.write(f"  {path} : 1re requête {first:.1f} ms, 2e {second:.1f} ms (statut {sorted(statuses)})")
+                if any(st >= 500 for st in statuses):
+                    failures.append(f"{path} : {sorted(statuses)}")
+        if failures:
+            raise CommandError("; ".join(failures))
+        self.stdout.write("OK")
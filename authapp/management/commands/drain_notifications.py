@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from authapp import notify
+
+
+class Command(BaseCommand):
+    help = (
+        "Programme les rappels de sortie puis envoie les notifications en attente "
+        "(une fois, ou en boucle avec --loop)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--loop", action="store_true", help="tourne en continu (worker)")
+        parser.add_argument("--interval", type=float, default=2.0, help="pause (s) quand la file est vide")
+
+    def handle(self, *args, **opts):
+        while True:
+            reminders = notify.schedule_reminders()
+            if reminders:
+                self.stdout.write(f"{reminders} rappel(s) de sortie programmé(s)")
+            delivered, handled = notify.drain(batch_size=opts["batch_size"])
+            if handled:
+                self.stdout.write(f"{handled} notification(s) traitée(s), {delivered} envoi(s)")
+            if not opts["loop"]:
+                return
+            close_old_connections()
+            if not handled:
+                time.sleep(opts["interval"])
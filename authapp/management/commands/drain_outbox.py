@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from authapp import mailqueue
+
+
+class Command(BaseCommand):
+    help = "Envoie les e-mails en attente dans OutboundEmail (une fois, ou en boucle avec --loop)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--loop", action="store_true", help="tourne en continu (worker)")
+        parser.add_argument("--interval", type=float, default=2.0, help="pause (s) quand la file est vide")
+
+    def handle(self, *args, **opts):
+        while True:
+            sent = mailqueue.drain(batch_size=opts["batch_size"])
+            if sent:
+                self.stdout.write(f"{sent} e-mail(s) envoyé(s)")
+            if not opts["loop"]:
+                return
+            close_old_connections()
+            if not sent:
+                time.sleep(opts["interval"])
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from authapp import bulk
+
+
+class Command(BaseCommand):
+    help = "Exporte les coureurs (utilisateurs + profils) en CSV ou JSONL, en streaming (mémoire constante)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Fichier destination, ou - pour stdout.")
+        parser.add_argument("--format", choices=("csv", "jsonl"), default="")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument(
+            "--with-password-hashes", action="store_true",
+            help="Ajoute la colonne password_hash (migration entre instances ; fichier sensible).",
+        )
+
+    def handle(self, *args, **opts):
+        fmt = opts["format"] or ("csv" if opts["path"].endswith(".csv") else "jsonl")
+        n = bulk.export_file(
+            opts["path"], fmt, chunk_size=opts["chunk_size"], with_password_hashes=opts["with_password_hashes"]
+        )
+        if opts["path"] != "-":
+            self.stdout.write(f"{n} coureur(s) exporté(s) dans {opts['path']}")
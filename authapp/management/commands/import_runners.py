@@ -0,0 +1,42 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from authapp import bulk, feed, similarity
+
+
+class Command(BaseCommand):
+    help = (
+        "Importe des coureurs (utilisateurs + profils) depuis un CSV ou un JSONL, en streaming et par lots. "
+        "Colonnes : email, password ou password_hash (hash Django), first_name, last_name, level, "
+        "location_city, goals, availability_week, availability_weekend, distances, speed_kmh, is_premium."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Fichier source, ou - pour stdin.")
+        parser.add_argument("--format", choices=("csv", "jsonl"), default="")
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--workers", type=int, default=None, help="Processus de hachage (défaut : nb de CPU).")
+
+    def handle(self, *args, **opts):
+        fmt = opts["format"] or ("csv" if opts["path"].endswith(".csv") else "jsonl")
+        t0 = time.perf_counter()
+
+        def progress(stats):
+            rate = stats["created"] / (time.perf_counter() - t0) * 60
+            self.stdout.write(f"{stats['created']} créé(s)… ({rate:,.0f}/min)")
+
+        stats = bulk.import_file(
+            opts["path"], fmt, batch_size=opts["batch_size"], workers=opts["workers"] or os.cpu_count(),
+            on_batch=progress if opts["verbosity"] > 1 else None,
+        )
+        # bulk_create ne déclenche pas post_save : index de ce process à reconstruire,
+        # les autres workers suivent au TTL
+        feed.index.invalidate()
+        similarity.cache.invalidate()
+        elapsed = time.perf_counter() - t0
+        self.stdout.write(
+            f"{stats['created']} créé(s), {stats['skipped']} déjà présent(s), {stats['invalid']} invalide(s) "
+            f"en {elapsed:.1f} s ({stats['created'] / elapsed * 60:,.0f}/min)"
+        )
@@ -0,0 +1,78 @@
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from authapp import loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc de charge : seed N coureurs dans une base SQLite jetable, joue un mix de requêtes "
+        "sur toutes les routes (OAuth simulé en local) et rapporte débit, p50/p95/p99 et requêtes SQL par route."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--requests", type=int, default=5000)
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--only", default="", help="Routes à jouer, séparées par des virgules.")
+        parser.add_argument("--db", default="", help="Fichier SQLite à réutiliser (seed conservé entre runs).")
+        parser.add_argument("--output", default="", help="Écrit le rapport JSON dans ce fichier.")
+        parser.add_argument("--compare", default="", help="Rapport JSON de référence.")
+        parser.add_argument("--tolerance", type=float, default=0.2, help="Hausse de p95 tolérée (0.2 = +20 %%).")
+
+    def handle(self, *args, **opts):
+        missing = loadtest.uncovered_routes()
+        if missing:
+            self.stderr.write(f"routes sans scénario : {', '.join(missing)}")
+        only = {n.strip() for n in opts["only"].split(",") if n.strip()}
+        unknown = only - set(loadtest.SCENARIOS)
+        if unknown:
+            raise CommandError(f"routes inconnues : {', '.join(sorted(unknown))}")
+
+        # base jetable : la base de dev n'est jamais touchée
+        path = opts["db"] or os.path.join(tempfile.mkdtemp(prefix="runnr-loadtest-"), "loadtest.sqlite3")
+        conn = connections["default"]
+        conn.close()
+        conn.settings_dict["NAME"] = path
+        call_command("migrate", verbosity=0, interactive=False)
+
+        user_ids = loadtest.bench_user_ids()
+        if len(user_ids) < opts["users"]:
+            self.stdout.write(f"seed de {opts['users'] - len(user_ids)} coureurs dans {path}")
+            user_ids += loadtest.seed(opts["users"] - len(user_ids), stdout=self.stdout)
+
+        report = loadtest.run(user_ids, opts["requests"], opts["workers"], only or None)
+        self._print(report)
+        if opts["output"]:
+            with open(opts["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+            self.stdout.write(f"rapport écrit dans {opts['output']}")
+
+        if opts["compare"]:
+            with open(opts["compare"], encoding="utf-8") as f:
+                baseline = json.load(f)
+            lines, regressions = loadtest.compare(report, baseline, opts["tolerance"])
+            self.stdout.write("\n".join(lines))
+            if regressions:
+                raise CommandError(f"{len(regressions)} régression(s) : {', '.join(n for n, _ in regressions)}")
+
+    def _print(self, report):
+        self.stdout.write(
+            f"{'route':<30} {'req':>6} {'err':>4} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'sql/req':>8}"
+        )
+        for name, r in sorted(report["routes"].items()):
+            q = "-" if r["queries_per_request"] is None else f"{r['queries_per_request']:.2f}"
+            self.stdout.write(
+                f"{name:<30} {r['requests']:6d} {r['errors']:4d} {r['rps']:8.1f} "
+                f"{r['p50_ms']:8.2f} {r['p95_ms']:8.2f} {r['p99_ms']:8.2f} {q:>8}"
+            )
+        t = report["total"]
+        self.stdout.write(
+            f"{'total':<30} {t['requests']:6d} {t['errors']:4d} {t['rps']:8.1f} "
+            f"{t['p50_ms']:8.2f} {t['p95_ms']:8.2f} {t['p99_ms']:8.2f}"
+        )
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from authapp import purge
+
+
+class Command(BaseCommand):
+    help = "Purge par lots les données des comptes supprimés (une fois, ou en boucle avec --loop)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--pause", type=float, default=0.0, help="pause (s) entre deux lots")
+        parser.add_argument("--loop", action="store_true", help="tourne en continu (worker)")
+        parser.add_argument("--interval", type=float, default=5.0, help="pause (s) quand la file est vide")
+        parser.add_argument("--status", action="store_true", help="affiche les suppressions en cours et sort")
+
+    def handle(self, *args, **opts):
+        if opts["status"]:
+            for job in purge.pending():
+                self.stdout.write(
+                    f"compte {job.user_id} : étape {job.stage}, {job.purged} ligne(s) purgée(s), "
+                    f"demandé le {job.requested_at:%Y-%m-%d %H:%M}{' — ' + job.last_error if job.last_error else ''}"
+                )
+            return
+        while True:
+            done = purge.run(batch_size=opts["batch_size"], pause=opts["pause"])
+            if done:
+                self.stdout.write(f"{done} compte(s) purgé(s)")
+            if not opts["loop"]:
+                return
+            close_old_connections()
+            if not done:
+                time.sleep(opts["interval"])
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from authapp import boost
+
+
+class Command(BaseCommand):
+    help = "Recalcule les poids des profils mis en avant et supprime les boosts expirés (une fois, ou avec --loop)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="tourne en continu (worker)")
+        parser.add_argument("--interval", type=float, default=60.0, help="pause (s) entre deux recalculs")
+
+    def handle(self, *args, **opts):
+        while True:
+            updated, expired = boost.refresh()
+            if updated or expired:
+                self.stdout.write(f"{updated} boost(s) recalculé(s), {expired} expiré(s)")
+            if not opts["loop"]:
+                return
+            close_old_connections()
+            time.sleep(opts["interval"])
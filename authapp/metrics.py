@@ -0,0 +1,233 @@
+"""
+Instrumentation par endpoint : latence, requêtes SQL, cache profils.
+
+`MetricsMiddleware` mesure chaque requête et l'agrège, par nom d'URL
+(urls.py), dans un registre en mémoire du process exposé au format texte
+Prometheus sur /metrics. Le comptage SQL passe par un `execute_wrapper`
+posé une fois pour toutes sur chaque connexion, de tous les alias, à sa
+création (deux appels à perf_counter par requête SQL), sans dépendre de
+DEBUG. Il rattache la requête SQL à la requête HTTP en cours par une
+ContextVar : les connexions sont propres à chaque thread, et sous ASGI
+le SQL s'exécute dans les threads de `sync_to_async`, qui copient le
+contexte mais pas les wrappers posés depuis la boucle.
+
+Si `SLOW_REQUEST_MS` est défini, les requêtes plus lentes sont journalisées
+(logger "authapp.slow") avec leur SQL.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+slow_logger = logging.getLogger("authapp.slow")
+
+# secondes, bornes supérieures des buckets (+Inf implicite)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_current = ContextVar("runnr_request_metrics", default=None)
+
+
+class _RequestStats:
+    __slots__ = ("queries", "db_time", "cache_hits", "cache_misses", "sql")
+
+    def __init__(self, keep_sql):
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.sql = [] if keep_sql else None
+
+
+def note_cache(hits, misses):
+    """Appelé par profile_cache : rattache les hits/misses à la requête en cours."""
+    stats = _current.get()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+def _execute(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    t0 = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - t0
+        if stats.sql is not None:
+            stats.sql.append(sql)
+
+
+def _instrument(connection, **kwargs):
+    # en tête de liste : un `with execute_wrapper()` en cours retire le sien par pop()
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _execute)
+
+
+connection_created.connect(_instrument)
+
+
+class _Endpoint:
+    __slots__ = ("buckets", "count", "duration", "queries", "db_time", "cache_hits", "cache_misses", "statuses")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.statuses = {}
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def observe(self, view, method, status, duration, stats):
+        with self._lock:
+            ep = self._endpoints.get(view)
+            if ep is None:
+                ep = self._endpoints[view] = _Endpoint()
+            ep.buckets[bisect_left(BUCKETS, duration)] += 1
+            ep.count += 1
+            ep.duration += duration
+            ep.queries += stats.queries
+            ep.db_time += stats.db_time
+            ep.cache_hits += stats.cache_hits
+            ep.cache_misses += stats.cache_misses
+            key = (method, status)
+            ep.statuses[key] = ep.statuses.get(key, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+    def snapshot(self):
+        """{vue: {"count", "queries", "db_time", "cache_hits", "cache_misses"}}"""
+        with self._lock:
+            return {
+                view: {
+                    "count": ep.count, "queries": ep.queries, "db_time": ep.db_time,
+                    "cache_hits": ep.cache_hits, "cache_misses": ep.cache_misses,
+                }
+                for view, ep in self._endpoints.items()
+            }
+
+    def render(self):
+        """Format d'exposition texte Prometheus 0.0.4."""
+        with self._lock:
+            snapshot = sorted(self._endpoints.items())
+            lines = [
+                "# HELP runnr_http_requests_total Requêtes HTTP par vue, méthode et statut.",
+                "# TYPE runnr_http_requests_total counter",
+            ]
+            for view, ep in snapshot:
+                for (method, status), n in sorted(ep.statuses.items()):
+                    lines.append(f'runnr_http_requests_total{{view="{view}",method="{method}",status="{status}"}} {n}')
+            lines += [
+                "# HELP runnr_http_request_duration_seconds Latence des requêtes par vue.",
+                "# TYPE runnr_http_request_duration_seconds histogram",
+            ]
+            for view, ep in snapshot:
+                cumulative = 0
+                for bound, n in zip(BUCKETS + (float("inf"),), ep.buckets):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'runnr_http_request_duration_seconds_bucket{{view="{view}",le="{le}"}} {cumulative}')
+                lines.append(f'runnr_http_request_duration_seconds_sum{{view="{view}"}} {ep.duration:.6f}')
+                lines.append(f'runnr_http_request_duration_seconds_count{{view="{view}"}} {ep.count}')
+            for name, attr, kind, help_ in (
+                ("runnr_db_queries_total", "queries", "counter", "Requêtes SQL exécutées par vue."),
+                ("runnr_db_query_seconds_total", "db_time", "counter", "Temps passé en SQL par vue."),
+                ("runnr_profile_cache_hits_total", "cache_hits", "counter", "Hits du cache profils par vue."),
+                ("runnr_profile_cache_misses_total", "cache_misses", "counter", "Misses du cache profils par vue."),
+            ):
+                lines.append(f"# HELP {name} {help_}")
+                lines.append(f"# TYPE {name} {kind}")
+                for view, ep in snapshot:
+                    value = getattr(ep, attr)
+                    value = f"{value:.6f}" if isinstance(value, float) else value
+                    lines.append(f'{name}{{view="{view}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class MetricsMiddleware:
+    """
+    Sync et async : sous asgi.py, un middleware sync-only forcerait
+    l'adaptation `sync_to_async(thread_sensitive=True)` de toute la chaîne,
+    et les requêtes passeraient une à une par un même thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # connexions déjà ouvertes dans ce thread (les autres passent par connection_created)
+        for alias in connections:
+            _instrument(connections[alias])
+
+    def _start(self):
+        return _RequestStats(keep_sql=getattr(settings, "SLOW_REQUEST_MS", None) is not None)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = self._start()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        # sync_to_async (vues sync, ORM des vues async) copie le contexte : la ContextVar y suit la requête
+        stats = self._start()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def _record(self, request, response, stats, duration):
+        slow_ms = getattr(settings, "SLOW_REQUEST_MS", None)
+        match = getattr(request, "resolver_match", None)
+        view = (match.url_name or match.view_name) if match else "unmatched"
+        registry.observe(view, request.method, response.status_code, duration, stats)
+        if slow_ms is not None and duration * 1000 >= slow_ms:
+            slow_logger.warning(
+                "requête lente %s %s (%s) : %.1f ms, %d requêtes SQL (%.1f ms)\n%s",
+                request.method, request.path, view, duration * 1000, stats.queries,
+                stats.db_time * 1000, "\n".join(stats.sql or ()),
+            )
+
+
+def metrics_view(request):
+    allowed = getattr(settings, "METRICS_ALLOWED_IPS", ("127.0.0.1", "::1"))
+    if not settings.DEBUG and request.META.get("REMOTE_ADDR") not in allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
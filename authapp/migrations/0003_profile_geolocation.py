@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:10
+
+from django.db import migrations, models
+
+
+def geocode_existing(apps, schema_editor):
+    from authapp.geo import cell_id, geocode
+
+    Profile = apps.get_model("authapp", "Profile")
+    batch = []
+    for p in Profile.objects.exclude(location_city="").only("id", "location_city").iterator():
+        coords = geocode(p.location_city)
+        if coords is None:
+            continue
+        p.latitude, p.longitude = coords
+        p.geo_cell = cell_id(*coords)
+        batch.append(p)
+        if len(batch) >= 1000:
+            Profile.objects.bulk_update(batch, ["latitude", "longitude", "geo_cell"])
+            batch = []
+    Profile.objects.bulk_update(batch, ["latitude", "longitude", "geo_cell"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authapp', '0002_profile_distances_profile_speed_kmh'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='geo_cell',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(geocode_existing, migrations.RunPython.noop),
+    ]
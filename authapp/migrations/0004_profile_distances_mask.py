@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:11
+
+from django.db import migrations, models
+
+
+def compute_masks(apps, schema_editor):
+    from authapp.similarity import distances_mask
+
+    Profile = apps.get_model("authapp", "Profile")
+    batch = []
+    for p in Profile.objects.exclude(distances="").only("id", "distances").iterator():
+        p.distances_mask = distances_mask(p.distances)
+        batch.append(p)
+        if len(batch) >= 1000:
+            Profile.objects.bulk_update(batch, ["distances_mask"])
+            batch = []
+    Profile.objects.bulk_update(batch, ["distances_mask"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authapp', '0003_profile_geolocation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='distances_mask',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(compute_masks, migrations.RunPython.noop),
+    ]
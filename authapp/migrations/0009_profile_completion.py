@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:32
+
+from django.db import migrations, models
+
+
+def backfill_completion(apps, schema_editor):
+    from authapp.completion import backfill
+
+    backfill(apps.get_model("authapp", "Profile"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authapp', '0008_conversation_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='completion_missing',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='completion_percent',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['geo_cell', 'completion_percent'], name='profile_cell_completion_idx'),
+        ),
+        migrations.RunPython(backfill_completion, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authapp', '0011_profile_last_active'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='photo',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authapp', '0012_profile_photo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RunSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=140)),
+                ('starts_at', models.DateTimeField()),
+                ('duration_min', models.PositiveSmallIntegerField(default=60)),
+                ('location_city', models.CharField(blank=True, default='', max_length=128)),
+                ('meeting_point', models.CharField(blank=True, default='', max_length=255)),
+                ('level', models.CharField(blank=True, choices=[('beginner', 'Débutant'), ('intermediate', 'Intermédiaire'), ('advanced', 'Avancé')], default='', max_length=32)),
+                ('capacity', models.PositiveIntegerField()),
+                ('taken', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('organizer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='run_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Participation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participations', to=settings.AUTH_USER_MODEL)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participations', to='authapp.runsession')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='runsession',
+            index=models.Index(fields=['starts_at', 'id'], name='run_session_start_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='runsession',
+            constraint=models.CheckConstraint(condition=models.Q(('taken__lte', models.F('capacity'))), name='run_session_not_overbooked'),
+        ),
+        migrations.AddIndex(
+            model_name='participation',
+            index=models.Index(fields=['user', 'session'], name='participation_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='participation',
+            constraint=models.UniqueConstraint(fields=('session', 'user'), name='uniq_participation'),
+        ),
+    ]
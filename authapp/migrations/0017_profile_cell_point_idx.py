@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authapp', '0016_notifications'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['geo_cell', 'latitude', 'longitude', 'user', 'paused'], name='profile_cell_point_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authapp', '0017_profile_cell_point_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accountdeletion',
+            name='photo',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -1,5 +1,38 @@
+from datetime import timedelta
+
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+
+class ProfileQuerySet(models.QuerySet):
+    """Requêtes de complétion (cf. completion.py) et d'activité, entièrement en SQL."""
+
+    def incomplete(self, below=100):
+        return self.filter(completion_percent__lt=below)
+
+    def missing(self, *fields):
+        """Profils auxquels il manque au moins un des champs (noms de completion.FIELDS)."""
+        from .completion import mask_of
+
+        mask = mask_of(fields)
+        return self.alias(_missing=models.F("completion_missing").bitand(mask)).filter(_missing__gt=0)
+
+    def in_city(self, city):
+        """
+        Profils de la commune `city`. Une commune connue du gazetteer a des
+        coordonnées fixes : lookup sur l'index (geo_cell, completion_percent).
+        """
+        from .geo import cell_id, geocode
+
+        coords = geocode(city)
+        if coords is None:
+            return self.filter(location_city__iexact=city.strip())
+        return self.filter(geo_cell=cell_id(*coords), latitude=coords[0], longitude=coords[1])
+
+    def active_within(self, seconds):
+        """Coureurs actifs depuis moins de `seconds` (cf. activity.py), sur l'index last_active_at."""
+        return self.filter(last_active_at__gte=timezone.now() - timedelta(seconds=seconds))
 
 
 class Profile(models.Model):
@@ -8,6 +41,8 @@ class Profile(models.Model):
         ("intermediate", "Intermédiaire"),
         ("advanced", "Avancé"),
     ]
+    # champs que le coureur peut masquer sur son profil public (bit i = HIDEABLE_FIELDS[i])
+    HIDEABLE_FIELDS = ("location_city", "goals", "distances", "speed_kmh", "photo", "distance_km")
 
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="profile")
     level = models.CharField(max_length=32, choices=LEVEL_CHOICES, blank=True, default="")
@@ -18,19 +53,309 @@ class Profile(models.Model):
     # Performances
     distances = models.CharField(max_length=128, blank=True, default="")  # ex: "5k,10k,semi"
     speed_kmh = models.FloatField(blank=True, null=True)  # vitesse moyenne
+    distances_mask = models.PositiveSmallIntegerField(default=0, editable=False)  # cf. similarity.DISTANCE_BITS
+    is_premium = models.BooleanField(default=False)
+    # Sert de version pour les ETag (cf. views._etag) : touché à chaque save
+    updated_at = models.DateTimeField(auto_now=True)
+    # Géolocalisation (déduite de location_city, cf. geo.py)
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+    geo_cell = models.IntegerField(blank=True, null=True, db_index=True)
+    # Complétion (cf. completion.py), recalculée à chaque save
+    completion_percent = models.PositiveSmallIntegerField(default=0, db_index=True, editable=False)
+    completion_missing = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Dernière activité, à la minute près, écrite par lots (cf. activity.py)
+    last_active_at = models.DateTimeField(null=True, blank=True, db_index=True, editable=False)
+    # Photo : SHA-256 du fichier original, variantes sous PHOTO_ROOT (cf. photos.py)
+    photo = models.CharField(max_length=64, blank=True, default="", editable=False)
+    # Visibilité : profil en pause (hors flux, recherches et profils publics), champs masqués
+    paused = models.BooleanField(default=False)
+    hidden_fields = models.PositiveSmallIntegerField(default=0)
+
+    objects = ProfileQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # "moins de 75 % dans telle ville"
+            models.Index(fields=["geo_cell", "completion_percent"], name="profile_cell_completion_idx"),
+            # recherche par rayon : points distincts d'une maille, puis premiers user_id d'un point (cf. geo.nearby)
+            models.Index(fields=["geo_cell", "latitude", "longitude", "user", "paused"], name="profile_cell_point_idx"),
+        ]
+
+    def set_location_from_city(self):
+        from .geo import cell_id, geocode
+
+        coords = geocode(self.location_city)
+        if coords is None:
+            self.latitude = self.longitude = self.geo_cell = None
+        else:
+            self.latitude, self.longitude = coords
+            self.geo_cell = cell_id(*coords)
 
     def completion_info(self):
-        required = {
-            "level": bool(self.level),
-            "location_city": bool(self.location_city),
-            "goals": bool(self.goals),
-            "availability": bool(self.availability_week or self.availability_weekend),
-        }
-        total = len(required)
-        done = sum(1 for v in required.values() if v)
-        percent = int(done * 100 / total)
-        missing = [k for k, v in required.items() if not v]
-        return {"percent": percent, "missing": missing}
+        """Depuis les colonnes stockées (à jour après save)."""
+        from .completion import decode
+
+        return {"percent": self.completion_percent, "missing": decode(self.completion_missing)}
+
+    def hidden_list(self):
+        return [f for i, f in enumerate(self.HIDEABLE_FIELDS) if self.hidden_fields & (1 << i)]
+
+    def set_hidden(self, fields):
+        """ValueError si un champ n'est pas masquable."""
+        unknown = set(fields) - set(self.HIDEABLE_FIELDS)
+        if unknown:
+            raise ValueError(f"champ non masquable : {sorted(unknown)[0]}")
+        self.hidden_fields = sum(1 << i for i, f in enumerate(self.HIDEABLE_FIELDS) if f in fields)
 
     def __str__(self):
         return f"Profile<{self.user_id}>"
+
+
+class Swipe(models.Model):
+    swiper = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="swipes_sent")
+    target = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="swipes_received")
+    liked = models.BooleanField()  # True = swipe à droite
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # sert aussi au lookup inverse "target a-t-il liké swiper ?"
+            models.UniqueConstraint(fields=["swiper", "target"], name="uniq_swipe_pair"),
+        ]
+        indexes = [
+            models.Index(fields=["swiper", "liked", "created_at"], name="swipe_swiper_day_idx"),  # quotas, historique
+            models.Index(fields=["target", "liked", "created_at"], name="swipe_target_likes_idx"),  # qui m'a liké
+        ]
+
+    def __str__(self):
+        return f"Swipe<{self.swiper_id}->{self.target_id} {'like' if self.liked else 'pass'}>"
+
+
+class Block(models.Model):
+    """
+    `blocker` ne voit plus `blocked`, et réciproquement (cf. exclusions.py) ;
+    plus aucun message entre eux.
+    """
+
+    blocker = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="blocks_sent")
+    blocked = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="blocks_received")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["blocker", "blocked"], name="uniq_block_pair")]
+        # qui m'a bloqué
+        indexes = [models.Index(fields=["blocked", "blocker"], name="block_blocked_idx")]
+
+    def __str__(self):
+        return f"Block<{self.blocker_id}->{self.blocked_id}>"
+
+
+class ProfileBoost(models.Model):
+    """
+    Mise en avant Premium. `score` est précalculé (décroissance exponentielle
+    depuis `started_at`) par `manage.py refresh_boosts` : le flux ne fait que
+    le lire (cf. boost.py).
+    """
+
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="boost")
+    started_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+    score = models.FloatField(default=1.0)
+    refreshed_at = models.DateTimeField(db_index=True)  # date à laquelle `score` est exact
+
+    def __str__(self):
+        return f"ProfileBoost<{self.user_id} {self.score:.3f}>"
+
+
+class OutboundEmail(models.Model):
+    """File d'envoi des e-mails (drainée par `manage.py drain_outbox`)."""
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    to = models.TextField()  # destinataires séparés par des virgules
+    from_email = models.CharField(max_length=254, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)  # pris par un worker
+    claim = models.CharField(max_length=32, blank=True, default="")
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+
+    class Meta:
+        indexes = [models.Index(fields=["sent_at", "claimed_at", "id"], name="outbox_pending_idx")]
+
+    def __str__(self):
+        return f"OutboundEmail<{self.pk} {self.to}>"
+
+
+class NotificationPreference(models.Model):
+    """Types de notifications acceptés (story 45). Pas de ligne : tout est activé."""
+
+    KINDS = ("match", "message", "session_reminder")
+
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="notification_preference")
+    match = models.BooleanField(default=True)
+    message = models.BooleanField(default=True)
+    session_reminder = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"NotificationPreference<{self.user_id}>"
+
+
+class Notification(models.Model):
+    """
+    File des notifications (drainée par `manage.py drain_notifications`),
+    écrite dans la transaction de l'événement qui la déclenche.
+    """
+
+    KIND_CHOICES = [("match", "Match"), ("message", "Message"), ("session_reminder", "Rappel de sortie")]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="notifications")
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES)
+    group_key = models.CharField(max_length=64)  # notifications fusionnables ("message:<conversation>")
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)  # pris par un worker
+    claim = models.CharField(max_length=32, blank=True, default="")
+    sent_at = models.DateTimeField(null=True, blank=True)
+    outcome = models.CharField(max_length=16, blank=True, default="")  # sent, merged, muted
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    delivered_to = models.JSONField(default=list, blank=True)  # canaux déjà servis, sautés à la reprise
+
+    class Meta:
+        indexes = [models.Index(fields=["sent_at", "claimed_at", "id"], name="notification_pending_idx")]
+
+    def __str__(self):
+        return f"Notification<{self.pk} {self.kind} -> {self.user_id}>"
+
+
+class Conversation(models.Model):
+    """
+    Conversation 1-to-1 ouverte au match (user_a_id < user_b_id). Champs
+    dénormalisés, mis à jour dans la transaction d'envoi d'un message, pour
+    lister les matchs sans agréger Message.
+    """
+
+    user_a = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    user_b = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    created_at = models.DateTimeField(auto_now_add=True)
+    # date du dernier message, ou du match tant qu'aucun message n'a été envoyé
+    last_message_at = models.DateTimeField()
+    last_message_preview = models.CharField(max_length=140, blank=True, default="")
+    last_sender = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    unread_a = models.PositiveIntegerField(default=0)  # messages non lus par user_a
+    unread_b = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user_a", "user_b"], name="uniq_conversation_pair"),
+            models.CheckConstraint(condition=models.Q(user_a__lt=models.F("user_b")), name="conversation_pair_ordered"),
+        ]
+        indexes = [
+            # liste des matchs triée par dernier message, pour chaque côté
+            models.Index(fields=["user_a", "-last_message_at", "-id"], name="conv_a_last_idx"),
+            models.Index(fields=["user_b", "-last_message_at", "-id"], name="conv_b_last_idx"),
+        ]
+
+    def other_id(self, user_id):
+        return self.user_b_id if user_id == self.user_a_id else self.user_a_id
+
+    def unread_for(self, user_id):
+        return self.unread_a if user_id == self.user_a_id else self.unread_b
+
+    def __str__(self):
+        return f"Conversation<{self.user_a_id}-{self.user_b_id}>"
+
+
+class Message(models.Model):
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="messages")
+    sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    body = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # pagination par curseur : WHERE conversation_id = ? AND id < ? ORDER BY id DESC
+        indexes = [models.Index(fields=["conversation", "-id"], name="message_conv_id_idx")]
+
+    def __str__(self):
+        return f"Message<{self.pk} conv={self.conversation_id}>"
+
+
+class AccountDeletion(models.Model):
+    """
+    Suppression de compte en cours (cf. purge.py). Le compte est désactivé et
+    anonymisé à la demande ; un worker purge ensuite ses données par lots.
+    `stage` et `purged` permettent de reprendre après un crash et de suivre
+    l'avancement. La ligne reste comme trace une fois la purge terminée.
+    """
+
+    STAGES = ["conversations", "swipes_sent", "swipes_received", "sessions", "blocks", "notifications", "photo", "user"]
+
+    user_id = models.BigIntegerField(unique=True)  # pas de FK : survit au User
+    requested_at = models.DateTimeField(auto_now_add=True)
+    stage = models.CharField(max_length=32, default=STAGES[0])
+    purged = models.PositiveIntegerField(default=0)  # lignes supprimées
+    claimed_at = models.DateTimeField(null=True, blank=True)  # heartbeat du worker
+    claim = models.CharField(max_length=32, blank=True, default="")
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+    photo = models.CharField(max_length=64, blank=True, default="")  # hash repris du Profile supprimé, vidé une fois purgé
+
+    class Meta:
+        indexes = [models.Index(fields=["finished_at", "claimed_at", "id"], name="deletion_pending_idx")]
+
+    def __str__(self):
+        return f"AccountDeletion<{self.user_id} {self.stage}>"
+
+
+class RunSession(models.Model):
+    """
+    Sortie de groupe. `taken` compte les places prises : il n'est modifié que
+    par des UPDATE conditionnels (cf. runs.join), jamais par lecture-écriture.
+    """
+
+    organizer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="run_sessions")
+    title = models.CharField(max_length=140)
+    starts_at = models.DateTimeField()
+    duration_min = models.PositiveSmallIntegerField(default=60)
+    location_city = models.CharField(max_length=128, blank=True, default="")
+    meeting_point = models.CharField(max_length=255, blank=True, default="")
+    level = models.CharField(max_length=32, choices=Profile.LEVEL_CHOICES, blank=True, default="")
+    capacity = models.PositiveIntegerField()
+    taken = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # version des VEVENT en cache (cf. runs.ics_event)
+    updated_at = models.DateTimeField(auto_now=True)
+    reminded = models.BooleanField(default=False)  # rappels programmés (cf. notify.schedule_reminders)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(condition=models.Q(taken__lte=models.F("capacity")), name="run_session_not_overbooked"),
+        ]
+        indexes = [models.Index(fields=["starts_at", "id"], name="run_session_start_idx")]
+
+    @property
+    def spots_left(self):
+        return self.capacity - self.taken
+
+    def __str__(self):
+        return f"RunSession<{self.pk} {self.title}>"
+
+
+class Participation(models.Model):
+    session = models.ForeignKey(RunSession, on_delete=models.CASCADE, related_name="participations")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="participations")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["session", "user"], name="uniq_participation")]
+        # flux .ics : mes sorties
+        indexes = [models.Index(fields=["user", "session"], name="participation_user_idx")]
+
+    def __str__(self):
+        return f"Participation<{self.user_id} @ {self.session_id}>"
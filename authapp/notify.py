@@ -0,0 +1,309 @@
+"""
+Notifications (match, message, rappel de sortie) hors du thread de requête.
+
+Le code métier appelle `enqueue()` / `enqueue_many()` dans la transaction de
+l'événement : un INSERT dans Notification, commité (ou annulé) avec lui. Ni
+lecture des préférences ni appel à un fournisseur dans la requête.
+
+`drain()` traite la file par lots, comme mailqueue (réclamation par UPDATE
+conditionnel, reprise après `CLAIM_TIMEOUT`) :
+- préférences de tout le lot en une requête ; les types désactivés sont
+  marqués `muted` sans être envoyés ;
+- regroupement par (utilisateur, group_key) : 5 messages d'une même
+  conversation donnent une seule notification "5 nouveaux messages" ;
+  `NOTIFICATION_DELAY` retient les lignes quelques secondes pour laisser
+  les rafales se regrouper ;
+- envoi du lot à chaque canal de `NOTIFICATION_CHANNELS` (chemins
+  pointés) : `ConsoleChannel` et `FileChannel` (JSON lines) servent de
+  remplaçants locaux à un vrai fournisseur push. Chaque canal servi est
+  noté sur les lignes (`delivered_to`) : après un échec partiel, seuls les
+  canaux en échec sont retentés.
+
+Il tourne dans `manage.py drain_notifications --loop` (qui programme aussi
+les rappels de sortie), et dans un thread local après commit si
+`NOTIFICATION_EAGER` est activé (dev). `created_at` → `sent_at` mesure la
+latence de bout en bout.
+"""
+import json
+import logging
+import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+CLAIM_TIMEOUT = timedelta(minutes=5)
+MAX_ATTEMPTS = 5
+UPDATE_CHUNK = 500
+
+_eager_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="notify")
+_eager_lock = threading.Lock()
+_eager_queued = False
+_channels = {}  # tuple de chemins -> instances
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# ---- Écriture ----
+def enqueue(user_id, kind, group_key, **data):
+    """Ajoute une notification ; à appeler dans la transaction de l'événement."""
+    from .models import Notification
+
+    n = Notification.objects.create(user_id=user_id, kind=kind, group_key=group_key, data=data)
+    _after_commit()
+    return n
+
+
+def enqueue_many(items):
+    """`items` : (user_id, kind, group_key, data) ; un seul INSERT."""
+    from .models import Notification
+
+    rows = Notification.objects.bulk_create(
+        [Notification(user_id=u, kind=k, group_key=g, data=d) for u, k, g, d in items]
+    )
+    if rows:
+        _after_commit()
+    return rows
+
+
+def _after_commit():
+    if _setting("NOTIFICATION_EAGER", False):
+        transaction.on_commit(_schedule_eager)
+
+
+def _schedule_eager():
+    # un seul drain en attente à la fois : une rafale de commits ne le multiplie pas
+    global _eager_queued
+    with _eager_lock:
+        if _eager_queued:
+            return
+        _eager_queued = True
+    _eager_pool.submit(_drain_in_thread)
+
+
+def _drain_in_thread():
+    global _eager_queued
+    with _eager_lock:
+        _eager_queued = False  # avant le drain : un commit pendant le drain en reprogramme un
+    try:
+        drain()
+    except Exception:
+        logger.exception("notifications : échec du drain")
+    finally:
+        close_old_connections()
+
+
+# ---- Canaux ----
+class Channel:
+    """Reçoit une liste de livraisons (cf. `_render`) ; lève une exception en cas d'échec."""
+
+    def send(self, deliveries):
+        raise NotImplementedError
+
+
+class ConsoleChannel(Channel):
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def send(self, deliveries):
+        text = "".join(f"[notification] user={d['user_id']} {d['kind']} : {d['title']} — {d['body']}\n" for d in deliveries)
+        with self._lock:
+            self.stream.write(text)
+            self.stream.flush()
+
+
+class FileChannel(Channel):
+    """Une ligne JSON par livraison, ajoutée à `NOTIFICATION_FILE_PATH` (une écriture par lot)."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, deliveries):
+        path = self.path or _setting("NOTIFICATION_FILE_PATH", "notifications.jsonl")
+        text = "".join(json.dumps(d, ensure_ascii=False) + "\n" for d in deliveries)
+        with self._lock, open(path, "a", encoding="utf-8") as f:
+            f.write(text)
+
+
+def channels():
+    paths = tuple(_setting("NOTIFICATION_CHANNELS", ("authapp.notify.ConsoleChannel",)))
+    if paths not in _channels:
+        _channels[paths] = [import_string(p)() for p in paths]
+    return _channels[paths]
+
+
+# ---- Drain ----
+def _claim(batch_size):
+    from .models import Notification
+
+    now = timezone.now()
+    pending = Notification.objects.filter(
+        Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - CLAIM_TIMEOUT),
+        sent_at__isnull=True,
+        attempts__lt=MAX_ATTEMPTS,
+    )
+    delay = _setting("NOTIFICATION_DELAY", 0)
+    if delay:
+        pending = pending.filter(created_at__lte=now - timedelta(seconds=delay))
+    ids = list(pending.order_by("id").values_list("id", flat=True)[:batch_size])
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    # seul le premier worker à passer l'UPDATE obtient chaque ligne
+    pending.filter(id__in=ids).update(claimed_at=now, claim=token)
+    return list(Notification.objects.filter(claim=token, sent_at__isnull=True).order_by("id"))
+
+
+def _muted(user_ids):
+    """{(user_id, kind)} désactivés, pour tout le lot en une requête."""
+    from .models import NotificationPreference
+
+    muted = set()
+    rows = NotificationPreference.objects.filter(user_id__in=user_ids).values_list("user_id", *NotificationPreference.KINDS)
+    for uid, *flags in rows:
+        muted.update((uid, kind) for kind, on in zip(NotificationPreference.KINDS, flags) if not on)
+    return muted
+
+
+def _render(kind, rows):
+    """Livraison pour un groupe de notifications (même utilisateur, même group_key), de la plus ancienne à la plus récente."""
+    n, data = len(rows), rows[-1].data
+    if kind == "match":
+        title = "Nouveau match !" if n == 1 else f"{n} nouveaux matchs"
+        body = "Vous pouvez maintenant discuter."
+    elif kind == "message":
+        title = "Nouveau message" if n == 1 else f"{n} nouveaux messages"
+        body = data.get("preview", "")
+    elif kind == "session_reminder":
+        title = "Votre sortie approche"
+        body = f"{data.get('title', '')} — {data.get('starts_at', '')}"
+    else:
+        title, body = kind, ""
+    return {
+        "user_id": rows[0].user_id,
+        "kind": kind,
+        "group_key": rows[0].group_key,
+        "count": n,
+        "title": title,
+        "body": body,
+        "data": data,
+        "created_at": rows[0].created_at.isoformat(),
+    }
+
+
+def _mark(ids, **fields):
+    from .models import Notification
+
+    ids = list(ids)
+    for i in range(0, len(ids), UPDATE_CHUNK):
+        Notification.objects.filter(id__in=ids[i : i + UPDATE_CHUNK]).update(**fields)
+
+
+def _channel_name(channel):
+    cls = type(channel)
+    return f"{cls.__module__}.{cls.__qualname__}"
+
+
+def drain(batch_size=500, max_batches=None):
+    """
+    Traite la file. Renvoie (livraisons, notifications traitées).
+
+    Chaque canal est servi à part et noté dans `delivered_to` des lignes
+    envoyées : si un canal échoue, le lot reste réclamé et seul ce canal est
+    retenté à la reprise, sans renvoi sur ceux qui ont réussi.
+    """
+    delivered = handled = batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = _claim(batch_size)
+        if not rows:
+            break
+        batches += 1
+        muted = _muted({r.user_id for r in rows})
+        groups, silenced = {}, []
+        for r in rows:
+            if (r.user_id, r.kind) in muted:
+                silenced.append(r.id)
+            else:
+                groups.setdefault((r.user_id, r.kind, r.group_key), []).append(r)
+        now = timezone.now()
+        _mark(silenced, sent_at=now, outcome="muted", attempts=F("attempts") + 1)
+        handled += len(silenced)
+
+        names, errors = [], []
+        for channel in channels():
+            name = _channel_name(channel)
+            names.append(name)
+            todo = {}
+            for key, grp in groups.items():
+                pending = [r for r in grp if name not in r.delivered_to]
+                if pending:
+                    todo[key] = pending
+            if not todo:
+                continue
+            try:
+                channel.send([_render(kind, grp) for (_, kind, _), grp in todo.items()])
+            except Exception as exc:
+                logger.exception("notifications : échec de l'envoi (%s)", name)
+                errors.append(f"{name} : {exc}")
+                continue
+            for grp in todo.values():
+                for r in grp:
+                    r.delivered_to = [*r.delivered_to, name]
+
+        done, retry = [], {}
+        for grp in groups.values():
+            if all(n in r.delivered_to for r in grp for n in names):
+                done.append(grp)
+            else:
+                for r in grp:
+                    retry.setdefault(tuple(r.delivered_to), []).append(r.id)
+        # reste réclamé : nouvelle tentative des seuls canaux en échec après CLAIM_TIMEOUT
+        for channels_done, ids in retry.items():
+            _mark(ids, delivered_to=list(channels_done), attempts=F("attempts") + 1, last_error="; ".join(errors)[:1000])
+        now = timezone.now()
+        # la plus récente de chaque groupe porte l'envoi, les autres y sont fusionnées
+        _mark([grp[-1].id for grp in done], sent_at=now, outcome="sent", attempts=F("attempts") + 1)
+        _mark([r.id for grp in done for r in grp[:-1]], sent_at=now, outcome="merged", attempts=F("attempts") + 1)
+        delivered += len(done)
+        handled += sum(len(grp) for grp in done)
+    return delivered, handled
+
+
+# ---- Rappels de sortie ----
+def schedule_reminders(now=None, limit=100):
+    """
+    Met en file un rappel pour chaque inscrit des sorties qui commencent dans
+    les `SESSION_REMINDER_BEFORE` secondes. `reminded` est posé par UPDATE
+    conditionnel : deux workers ne programment pas deux fois la même sortie.
+    Renvoie le nombre de rappels ajoutés.
+    """
+    from .models import Participation, RunSession
+
+    now = now or timezone.now()
+    soon = now + timedelta(seconds=_setting("SESSION_REMINDER_BEFORE", 3600))
+    due = list(
+        RunSession.objects.filter(reminded=False, starts_at__gt=now, starts_at__lte=soon)
+        .order_by("starts_at", "id").values_list("id", "title", "starts_at")[:limit]
+    )
+    added = 0
+    for sid, title, starts_at in due:
+        with transaction.atomic():
+            # update() : updated_at inchangé, les VEVENT en cache restent valides
+            if not RunSession.objects.filter(pk=sid, reminded=False).update(reminded=True):
+                continue
+            users = Participation.objects.filter(session_id=sid).values_list("user_id", flat=True)
+            data = {"session_id": sid, "title": title, "starts_at": starts_at.isoformat()}
+            added += len(enqueue_many([(u, "session_reminder", f"session:{sid}", data) for u in users]))
+    return added
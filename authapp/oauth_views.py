@@ -0,0 +1,94 @@
+"""
+Vues OAuth (Google, Facebook, Apple).
+
+Séparées de views.py pour que social_django.utils et les backends OAuth ne
+soient importés qu'au premier appel d'une de ces routes (cf. `lazy_view`
+dans urls.py) : les workers démarrent sans, ou les chargent à l'avance via
+le warm-up (authapp.warmup).
+"""
+from django.contrib.auth import login
+from django.http import HttpResponseRedirect
+from django.shortcuts import redirect
+from django.views.decorators.http import require_GET
+from social_core.exceptions import AuthCanceled
+from social_django.utils import load_backend, load_strategy
+
+from .views import FRONTEND_URL, _set_jwt_cookies
+
+# ---- Google OAuth ----
+@require_GET
+def google_login(request):
+    """
+    Démarre l’OAuth Google (Authorization Code Flow côté serveur).
+    """
+    strategy = load_strategy(request)
+    backend = load_backend(strategy=strategy, name="google-oauth2", redirect_uri=_callback_url(request))
+    # Redirection vers Google
+    authorization_url = backend.auth_url()
+    return HttpResponseRedirect(authorization_url)
+
+def _callback_url(request):
+    base = request.build_absolute_uri("/auth/google/callback")
+    return base
+
+@require_GET
+def google_callback_dispatch(request):
+    """
+    Callback Google -> crée/connexion de l'utilisateur, émet des JWT,
+    les met en cookies httpOnly et redirige vers le frontend.
+    """
+    strategy = load_strategy(request)
+    backend = load_backend(strategy=strategy, name="google-oauth2", redirect_uri=_callback_url(request))
+
+    try:
+        user = backend.complete()  # échange code -> token, récupère le profil, crée/associe User
+        login(request, user)      # session Django (facultatif si tu n’utilises que JWT)
+    except AuthCanceled:
+        # L’utilisateur a annulé → retour propre au front
+        return redirect(f"{FRONTEND_URL}/signin?error=cancelled")
+
+    # Générer les JWT et les déposer en cookies httpOnly (recommandé)
+    response = redirect(f"{FRONTEND_URL}/dashboard")
+    return _set_jwt_cookies(response, user)
+
+# ---- Facebook OAuth ----
+@require_GET
+def facebook_login(request):
+    strategy = load_strategy(request)
+    backend = load_backend(strategy=strategy, name="facebook", redirect_uri=_callback_url_fb(request))
+    return HttpResponseRedirect(backend.auth_url())
+
+def _callback_url_fb(request):
+    return request.build_absolute_uri("/auth/facebook/callback")
+
+@require_GET
+def facebook_callback_dispatch(request):
+    strategy = load_strategy(request)
+    backend = load_backend(strategy=strategy, name="facebook", redirect_uri=_callback_url_fb(request))
+    try:
+        user = backend.complete()
+        login(request, user)
+    except AuthCanceled:
+        return redirect(f"{FRONTEND_URL}/signin?error=cancelled")
+    return _set_jwt_cookies(redirect(f"{FRONTEND_URL}/dashboard"), user)
+
+# ---- Apple OAuth ----
+@require_GET
+def apple_login(request):
+    strategy = load_strategy(request)
+    backend = load_backend(strategy=strategy, name="apple-id", redirect_uri=_callback_url_apple(request))
+    return HttpResponseRedirect(backend.auth_url())
+
+def _callback_url_apple(request):
+    return request.build_absolute_uri("/auth/apple/callback")
+
+@require_GET
+def apple_callback_dispatch(request):
+    strategy = load_strategy(request)
+    backend = load_backend(strategy=strategy, name="apple-id", redirect_uri=_callback_url_apple(request))
+    try:
+        user = backend.complete()
+        login(request, user)
+    except AuthCanceled:
+        return redirect(f"{FRONTEND_URL}/signin?error=cancelled")
+    return _set_jwt_cookies(redirect(f"{FRONTEND_URL}/dashboard"), user)
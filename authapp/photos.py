@@ -0,0 +1,250 @@
+"""
+Photos de profil : upload en streaming, stockage adressé par contenu,
+variantes redimensionnées hors du thread de requête.
+
+- `HashingUploadHandler` écrit l'upload par blocs dans un fichier temporaire
+  en calculant son SHA-256 au passage : la requête ne garde jamais le
+  fichier en mémoire, et la taille est bornée (`PHOTO_MAX_BYTES`).
+- L'original est rangé sous `PHOTO_ROOT/orig/<sha[:2]>/<sha>` (jamais servi) ;
+  un contenu déjà connu n'est ni réécrit ni retraité.
+- Les variantes (`PHOTO_SIZES` px de côté max, WebP + JPEG, sans EXIF) sont
+  produites dans un pool de threads borné (`PHOTO_WORKERS`, Pillow relâche
+  le GIL), puis `Profile.photo` reçoit le hash par un UPDATE de ce seul
+  champ (cache profils et ETag invalidés explicitement).
+- Les URLs contiennent le hash : immuables, servies avec un cache d'un an.
+- Suppression de compte : les fichiers sont effacés par la purge (étape
+  "photo") si plus aucun profil ne référence le hash.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"JPEG", "PNG", "WEBP"}
+VARIANT_FORMATS = (("webp", "WEBP", {"quality": 80, "method": 4}), ("jpg", "JPEG", {"quality": 82, "optimize": True}))
+CHUNK_SIZE = 64 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+_latest_lock = threading.Lock()
+_latest = {}  # user_id -> dernier hash uploadé (un upload plus ancien ne l'écrase pas)
+
+
+class PhotoError(ValueError):
+    pass
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def root():
+    return _setting("PHOTO_ROOT", os.path.join(settings.MEDIA_ROOT, "photos"))
+
+
+def sizes():
+    return _setting("PHOTO_SIZES", (160, 480, 1080))
+
+
+def original_path(sha):
+    return os.path.join(root(), "orig", sha[:2], sha)
+
+
+def variant_name(sha, size, ext):
+    return f"{sha[:2]}/{sha}-{size}.{ext}"
+
+
+def variant_path(sha, size, ext):
+    return os.path.join(root(), "v", variant_name(sha, size, ext))
+
+
+def urls(sha):
+    """{"160": {"webp": url, "jpg": url}, ...} ; None sans photo."""
+    if not sha:
+        return None
+    base = settings.MEDIA_URL.rstrip("/") + "/photos/"
+    return {str(s): {ext: base + variant_name(sha, s, ext) for ext, _, _ in VARIANT_FORMATS} for s in sizes()}
+
+
+def is_ready(sha):
+    return all(os.path.exists(variant_path(sha, s, ext)) for s in sizes() for ext, _, _ in VARIANT_FORMATS)
+
+
+# ---- Upload ----
+class HashedUpload(UploadedFile):
+    """Fichier temporaire déjà écrit sur disque, avec son SHA-256."""
+
+    def __init__(self, file, name, content_type, size, sha256):
+        super().__init__(file, name, content_type, size)
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """Remplace les handlers par défaut (mémoire sous 2,5 Mo) : tout va sur disque, haché au fil de l'eau."""
+
+    chunk_size = CHUNK_SIZE
+    too_large = False
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        tmp_dir = os.path.join(root(), "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        self.file = tempfile.NamedTemporaryFile(dir=tmp_dir, prefix="upload-", delete=False)
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > _setting("PHOTO_MAX_BYTES", 10 * 1024 * 1024):
+            self.too_large = True
+            self.upload_interrupted()
+            raise StopUpload(connection_reset=True)
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        self.file.flush()
+        self.file.seek(0)
+        return HashedUpload(self.file, self.file_name, self.content_type, self.size, self.hasher.hexdigest())
+
+    def upload_interrupted(self):
+        f = getattr(self, "file", None)
+        if f is not None and not f.closed:
+            f.close()
+            os.unlink(f.name)
+
+
+def discard(upload):
+    upload.close()
+    try:
+        os.unlink(upload.temporary_file_path())
+    except FileNotFoundError:
+        pass
+
+
+def store(upload):
+    """
+    Valide l'image (en-tête seulement) et range l'original. Renvoie le hash.
+    PhotoError si le fichier n'est pas une image acceptée.
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    path = upload.temporary_file_path()
+    try:
+        with Image.open(path) as im:
+            fmt, (w, h) = im.format, im.size
+    except (UnidentifiedImageError, OSError):
+        discard(upload)
+        raise PhotoError("image illisible") from None
+    if fmt not in FORMATS:
+        discard(upload)
+        raise PhotoError("format non supporté (JPEG, PNG ou WebP)")
+    if w * h > _setting("PHOTO_MAX_PIXELS", 40_000_000):
+        discard(upload)
+        raise PhotoError("image trop grande")
+    sha = upload.sha256
+    dest = original_path(sha)
+    upload.close()
+    if os.path.exists(dest):
+        os.unlink(path)  # contenu déjà connu
+    else:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(path, dest)
+    return sha
+
+
+# ---- Variantes ----
+def render(sha):
+    """Écrit les variantes manquantes (fichier temporaire puis rename : jamais de variante tronquée)."""
+    from PIL import Image, ImageOps
+
+    missing = [(s, ext, fmt, opts) for s in sizes() for ext, fmt, opts in VARIANT_FORMATS
+               if not os.path.exists(variant_path(sha, s, ext))]
+    if not missing:
+        return
+    with Image.open(original_path(sha)) as im:
+        im.draft("RGB", (max(sizes()), max(sizes())))  # JPEG : décodage directement réduit
+        im = ImageOps.exif_transpose(im).convert("RGB")
+        for s in sorted({s for s, *_ in missing}, reverse=True):
+            im.thumbnail((s, s), Image.Resampling.LANCZOS)
+            for size, ext, fmt, opts in missing:
+                if size != s:
+                    continue
+                dest = variant_path(sha, s, ext)
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                tmp = f"{dest}.{threading.get_ident()}.tmp"
+                im.save(tmp, fmt, **opts)  # sans exif= : métadonnées (GPS...) non recopiées
+                os.replace(tmp, dest)
+
+
+def _executor():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=_setting("PHOTO_WORKERS", 2), thread_name_prefix="photos")
+    return _pool
+
+
+def _assign(sha, user_id):
+    from . import profile_cache
+    from .models import Profile
+
+    # UPDATE ciblé : un save() complet écraserait une édition du profil faite pendant le traitement
+    if Profile.objects.filter(user_id=user_id).exclude(photo=sha).update(photo=sha, updated_at=timezone.now()):
+        profile_cache.invalidate(user_id)  # pas de post_save : nouvelle version (ETag) à la main
+
+
+def delete_files(sha):
+    """Supprime l'original et les variantes de `sha`. Renvoie le nombre de fichiers supprimés."""
+    deleted = 0
+    paths = [original_path(sha)] + [variant_path(sha, s, ext) for s in sizes() for ext, _, _ in VARIANT_FORMATS]
+    for path in paths:
+        try:
+            os.unlink(path)
+            deleted += 1
+        except FileNotFoundError:
+            pass
+    return deleted
+
+
+def assign_now(sha, user_id):
+    """Photo déjà prête (contenu connu) : affectée tout de suite, un traitement plus ancien en cours est ignoré."""
+    with _latest_lock:
+        _latest.pop(user_id, None)
+    _assign(sha, user_id)
+
+
+def _process(sha, user_id):
+    try:
+        render(sha)
+        with _latest_lock:
+            if _latest.get(user_id) != sha:
+                return  # remplacée par un upload plus récent
+            del _latest[user_id]
+        _assign(sha, user_id)
+    except Exception:
+        logger.exception("photos : échec du traitement de %s", sha)
+    finally:
+        close_old_connections()
+
+
+def submit(sha, user_id):
+    """Programme les variantes de `sha` puis l'affectation au profil de `user_id`."""
+    with _latest_lock:
+        _latest[user_id] = sha
+    return _executor().submit(_process, sha, user_id)
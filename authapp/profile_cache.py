@@ -0,0 +1,118 @@
+"""
+Cache read-through des profils sérialisés.
+
+Un enregistrement par utilisateur (`profile:v1:<user_id>`) contenant tout ce
+dont les vues profil ont besoin, complétion comprise ; chaque vue en extrait
+les champs qu'elle expose. Stocké dans l'alias de cache `PROFILE_CACHE_ALIAS`
+(locmem borné en LRU en dev, n'importe quel backend en prod), invalidé par
+les signaux post_save de Profile et User.
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics, photos
+
+KEY_PREFIX = "profile:v4:"
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _cache():
+    return caches[getattr(settings, "PROFILE_CACHE_ALIAS", "default")]
+
+
+def _ttl():
+    return getattr(settings, "PROFILE_CACHE_TTL", 300)
+
+
+def _key(user_id):
+    return f"{KEY_PREFIX}{user_id}"
+
+
+def _count(hits, misses):
+    with _stats_lock:
+        _stats["hits"] += hits
+        _stats["misses"] += misses
+    metrics.note_cache(hits, misses)
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def version(p):
+    """Version du profil pour les ETag : updated_at en microsecondes."""
+    return int(p.updated_at.timestamp() * 1_000_000) if p.updated_at else 0
+
+
+def build(p):
+    """Enregistrement cacheable d'un Profile (dont `p.user` doit être chargé)."""
+    u = p.user
+    info = p.completion_info()
+    return {
+        "id": u.id,
+        "name": u.get_full_name() or u.username,
+        "level": p.level,
+        "location_city": p.location_city,
+        "goals": p.goals,
+        "availability_week": p.availability_week,
+        "availability_weekend": p.availability_weekend,
+        "distances": p.distances,
+        "speed_kmh": p.speed_kmh,
+        "latitude": p.latitude,
+        "longitude": p.longitude,
+        "photo": photos.urls(p.photo),
+        "paused": p.paused,
+        "hidden": p.hidden_list(),
+        "completion": info["percent"],
+        "missing": info["missing"],
+        "version": version(p),
+    }
+
+
+def get_many(user_ids):
+    """
+    {user_id: enregistrement} pour les ids connus. Un seul aller-retour cache,
+    et les absents sont chargés en une requête `user_id__in`.
+    """
+    from .models import Profile
+
+    ids = list(dict.fromkeys(user_ids))
+    if not ids:
+        return {}
+    cache = _cache()
+    found = cache.get_many([_key(i) for i in ids])
+    out = {i: found[_key(i)] for i in ids if _key(i) in found}
+    misses = [i for i in ids if i not in out]
+    _count(len(out), len(misses))
+    if misses:
+        fresh = {}
+        for p in Profile.objects.select_related("user").filter(user_id__in=misses):
+            fresh[p.user_id] = build(p)
+        if fresh:
+            cache.set_many({_key(i): rec for i, rec in fresh.items()}, _ttl())
+        out.update(fresh)
+    return out
+
+
+def get(user_id):
+    return get_many([user_id]).get(user_id)
+
+
+def put(p):
+    """Met en cache un profil déjà chargé (évite de le relire au prochain hit)."""
+    rec = build(p)
+    _cache().set(_key(p.user_id), rec, _ttl())
+    return rec
+
+
+def invalidate(user_id):
+    _cache().delete(_key(user_id))
+
+
+def invalidate_many(user_ids):
+    _cache().delete_many([_key(i) for i in user_ids])
@@ -0,0 +1,219 @@
+"""
+Suppression de compte en arrière-plan.
+
+`schedule()` tourne dans la requête et ne touche que quelques lignes : le
+User est désactivé et anonymisé (email libéré, mot de passe inutilisable),
+ses associations OAuth et son Profile sont supprimés. Le Profile parti, le
+coureur disparaît aussitôt des flux, de `public_profile` et des caches (via
+les signaux post_delete).
+
+Le reste (conversations et messages, swipes, sorties et inscriptions, blocages, notifications, fichiers photo) peut représenter des centaines
+de milliers de lignes : `run()` le purge par lots de `batch_size`, une
+courte transaction par lot, pour ne jamais bloquer la base. Il tourne dans
+`manage.py purge_accounts --loop` en prod, et dans un thread local après
+le commit si `ACCOUNT_PURGE_EAGER` est activé (dev).
+
+Chaque lot met à jour `stage`, `purged` et `claimed_at` (heartbeat) de
+l'AccountDeletion : un worker mort en cours de route est relayé après
+`CLAIM_TIMEOUT`, qui reprend à l'étape enregistrée. Les suppressions
+re-sélectionnent ce qui reste, elles sont donc sans effet si rejouées.
+"""
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import photos, runs
+from .models import (
+    AccountDeletion, Block, Conversation, Message, Notification, Participation, Profile, RunSession, Swipe,
+)
+
+logger = logging.getLogger(__name__)
+
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+_eager_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="purge")
+
+
+def schedule(user):
+    """Désactive le compte, le retire des flux et programme la purge. Idempotent."""
+    User = get_user_model()
+    with transaction.atomic():
+        photo = Profile.objects.filter(user_id=user.pk).values_list("photo", flat=True).first() or ""
+        job, created = AccountDeletion.objects.get_or_create(user_id=user.pk, defaults={"photo": photo})
+        if not created and photo:
+            AccountDeletion.objects.filter(pk=job.pk).update(photo=photo)
+        User.objects.filter(pk=user.pk).update(
+            is_active=False, username=f"deleted-{user.pk}", email="", first_name="", last_name="",
+            password=make_password(None),
+        )
+        user.social_auth.all().delete()
+        # signaux post_delete : index du flux, similarité, cache profils
+        Profile.objects.filter(user_id=user.pk).delete()
+        if getattr(settings, "ACCOUNT_PURGE_EAGER", False):
+            transaction.on_commit(lambda: _eager_pool.submit(_run_in_thread))
+    return job
+
+
+def _run_in_thread():
+    try:
+        run()
+    except Exception:
+        logger.exception("purge: échec")
+    finally:
+        close_old_connections()
+
+
+# ---- Étapes : chacune supprime au plus un lot et renvoie le nombre de lignes ----
+def _delete_ids(model, qs, batch_size):
+    ids = list(qs.values_list("pk", flat=True)[:batch_size])
+    if ids:
+        model.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def _conversations_step(user_id, batch_size):
+    # une conversation à la fois : ses messages par lots (index conversation, -id), puis elle
+    for side in ("user_a_id", "user_b_id"):
+        conv_id = next(iter(Conversation.objects.filter(**{side: user_id}).values_list("id", flat=True)[:1]), None)
+        if conv_id is not None:
+            break
+    else:
+        return 0
+    n = _delete_ids(Message, Message.objects.filter(conversation_id=conv_id), batch_size)
+    if n:
+        return n
+    Conversation.objects.filter(pk=conv_id).delete()
+    return 1
+
+
+def _swipes_sent_step(user_id, batch_size):
+    return _delete_ids(Swipe, Swipe.objects.filter(swiper_id=user_id), batch_size)
+
+
+def _swipes_received_step(user_id, batch_size):
+    return _delete_ids(Swipe, Swipe.objects.filter(target_id=user_id), batch_size)
+
+
+def _sessions_step(user_id, batch_size):
+    # sorties organisées (capacité bornée : cascade courte), puis places rendues
+    session_id = next(iter(RunSession.objects.filter(organizer_id=user_id).values_list("id", flat=True)[:1]), None)
+    if session_id is not None:
+        runs.invalidate_participants(session_id)
+        RunSession.objects.filter(pk=session_id).delete()
+        return 1
+    ids = list(Participation.objects.filter(user_id=user_id).values_list("session_id", flat=True)[:batch_size])
+    for session_id in ids:
+        runs.leave(session_id, user_id)  # décrémente `taken`, que la cascade oublierait
+    return len(ids)
+
+
+def _blocks_step(user_id, batch_size):
+    # un gros bloqueur peut en avoir des centaines de milliers : par lots, pas dans la cascade du User
+    n = _delete_ids(Block, Block.objects.filter(blocker_id=user_id), batch_size)
+    return n or _delete_ids(Block, Block.objects.filter(blocked_id=user_id), batch_size)
+
+
+def _notifications_step(user_id, batch_size):
+    # historique envoyé compris : par lots, pas dans la cascade du User
+    return _delete_ids(Notification, Notification.objects.filter(user_id=user_id), batch_size)
+
+
+def _photo_step(user_id, batch_size):
+    # fichiers adressés par contenu : conservés tant qu'un autre profil a la même photo
+    sha = AccountDeletion.objects.filter(user_id=user_id).values_list("photo", flat=True).first()
+    if not sha:
+        return 0
+    n = 0 if Profile.objects.filter(photo=sha).exists() else photos.delete_files(sha)
+    AccountDeletion.objects.filter(user_id=user_id).update(photo="")
+    return n
+
+
+def _user_step(user_id, batch_size):
+    # ne reste que des lignes isolées : la cascade est courte
+    get_user_model().objects.filter(pk=user_id).delete()
+    return 0
+
+
+STEPS = {
+    "conversations": _conversations_step,
+    "swipes_sent": _swipes_sent_step,
+    "swipes_received": _swipes_received_step,
+    "sessions": _sessions_step,
+    "blocks": _blocks_step,
+    "notifications": _notifications_step,
+    "photo": _photo_step,
+    "user": _user_step,
+}
+
+
+# ---- Worker ----
+def _claim():
+    now = timezone.now()
+    pending = AccountDeletion.objects.filter(
+        Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - CLAIM_TIMEOUT), finished_at__isnull=True
+    )
+    for job_id in pending.order_by("id").values_list("id", flat=True)[:10]:
+        token = uuid.uuid4().hex
+        # seul le premier worker à passer l'UPDATE obtient la suppression
+        if pending.filter(id=job_id).update(claimed_at=now, claim=token):
+            return AccountDeletion.objects.get(id=job_id), token
+    return None, None
+
+
+def _purge(job, token, batch_size, pause, max_batches):
+    """Déroule les étapes depuis `job.stage`. True si terminé, False si interrompu."""
+    batches = 0
+    for stage in AccountDeletion.STAGES[AccountDeletion.STAGES.index(job.stage):]:
+        while True:
+            if max_batches is not None and batches >= max_batches:
+                return False
+            with transaction.atomic():
+                n = STEPS[stage](job.user_id, batch_size)
+                done = {"finished_at": timezone.now()} if stage == "user" else {}
+                owned = AccountDeletion.objects.filter(pk=job.pk, claim=token).update(
+                    stage=stage, purged=F("purged") + n, claimed_at=timezone.now(), **done
+                )
+            batches += 1
+            if not owned:
+                return False  # relayé par un autre worker après CLAIM_TIMEOUT
+            if not n:
+                break
+            if pause:
+                time.sleep(pause)
+    return True
+
+
+def run(batch_size=500, pause=0.0, max_jobs=None, max_batches=None):
+    """
+    Purge les comptes en attente. `pause` (s) entre deux lots laisse passer
+    les autres écritures ; `max_batches` borne le travail par compte (le
+    reste est repris plus tard). Renvoie le nombre de purges terminées.
+    """
+    finished = jobs = 0
+    while max_jobs is None or jobs < max_jobs:
+        job, token = _claim()
+        if job is None:
+            break
+        jobs += 1
+        try:
+            ok = _purge(job, token, batch_size, pause, max_batches)
+        except Exception as exc:
+            # reste réclamé : reprise après CLAIM_TIMEOUT
+            logger.exception("purge: échec pour le compte %s", job.user_id)
+            AccountDeletion.objects.filter(pk=job.pk).update(last_error=str(exc)[:1000])
+            continue
+        finished += ok
+    return finished
+
+
+def pending():
+    return AccountDeletion.objects.filter(finished_at__isnull=True).order_by("id")
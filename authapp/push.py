@@ -0,0 +1,281 @@
+"""
+Canal push temps réel (matchs, messages) : évite aux clients de poller l'API.
+
+`PushApp` enveloppe l'application ASGI Django (asgi.py) et sert lui-même,
+sans la pile Django (une connexion inactive ne coûte qu'une coroutine et
+une petite file) :
+- `GET /api/events` en Server-Sent Events ;
+- `/ws/events` en websocket (serveur -> client uniquement).
+L'utilisateur est identifié par le JWT (`Authorization: Bearer` ou cookie
+`access_token`), validé sans requête DB.
+
+Les vues publient avec `notify()`, après le commit. Le broker
+(`PUSH_BROKER`) distribue aux connexions : `LocalBroker` en mémoire pour un
+process ; pour plusieurs nodes, une sous-classe relaie `publish()` vers un
+bus partagé (Redis pub/sub...) et, à la réception, appelle
+`LocalBroker.publish()` pour la diffusion locale.
+
+Chaque connexion a une file bornée (`PUSH_QUEUE_MAX`) : un client trop lent
+perd les événements les plus anciens et reçoit un `resync`, qui l'invite à
+recharger l'état via l'API.
+"""
+import asyncio
+import json
+import re
+import threading
+from collections import deque
+from http.cookies import SimpleCookie
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+SSE_PATH = "/api/events"
+WS_PATH = "/ws/events"
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# ---- Connexions et diffusion ----
+class Subscription:
+    """File d'événements bornée d'une connexion, vidée par la boucle ASGI."""
+
+    __slots__ = ("user_id", "loop", "queue", "dropped", "closed", "_wakeup")
+
+    def __init__(self, user_id, loop, maxlen):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = deque(maxlen=maxlen)
+        self.dropped = 0
+        self.closed = False
+        self._wakeup = asyncio.Event()
+
+    def push(self, event):
+        """Depuis n'importe quel thread."""
+        self.loop.call_soon_threadsafe(self._push, event)
+
+    def _push(self, event):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1  # deque(maxlen) évince le plus ancien
+        self.queue.append(event)
+        self._wakeup.set()
+
+    def close(self):
+        self.closed = True
+        self._wakeup.set()
+
+    async def next(self, timeout):
+        """Prochain événement (type, json), ou None après `timeout` s (heartbeat)."""
+        if not self.queue and not self.closed:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if self.closed:
+            return None
+        if self.dropped:
+            self.dropped = 0
+            return ("resync", '{"type": "resync"}')
+        return self.queue.popleft()
+
+
+class Broker:
+    """
+    Interface : subscribe()/unsubscribe() depuis la boucle ASGI, publish()
+    depuis n'importe quel thread (vues WSGI ou ASGI).
+    """
+
+    def subscribe(self, sub):
+        raise NotImplementedError
+
+    def unsubscribe(self, sub):
+        raise NotImplementedError
+
+    def publish(self, user_id, event):
+        raise NotImplementedError
+
+    def connections(self):
+        return 0
+
+
+class LocalBroker(Broker):
+    """Pub/sub en mémoire du process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs = {}  # user_id -> set(Subscription)
+        self._count = 0
+
+    def subscribe(self, sub):
+        """False si l'utilisateur a déjà PUSH_MAX_CONNECTIONS_PER_USER connexions."""
+        with self._lock:
+            subs = self._subs.setdefault(sub.user_id, set())
+            if len(subs) >= _setting("PUSH_MAX_CONNECTIONS_PER_USER", 5):
+                return False
+            subs.add(sub)
+            self._count += 1
+            return True
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subs.get(sub.user_id)
+            if subs and sub in subs:
+                subs.discard(sub)
+                self._count -= 1
+                if not subs:
+                    del self._subs[sub.user_id]
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subs = list(self._subs.get(user_id, ()))
+        for sub in subs:
+            sub.push(event)
+
+    def connections(self):
+        return self._count
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(_setting("PUSH_BROKER", "authapp.push.LocalBroker"))()
+    return _broker
+
+
+def notify(recipient_id, type_, **data):
+    """Publie {"type": type_, ...} aux connexions de `recipient_id` une fois la transaction commitée."""
+    event = (type_, json.dumps({"type": type_, **data}))
+    transaction.on_commit(lambda: broker().publish(recipient_id, event))
+
+
+# ---- ASGI ----
+def _headers(scope):
+    return {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", ())}
+
+
+def _user_id(headers):
+    raw = None
+    auth = headers.get("authorization", "")
+    if auth.startswith("Bearer "):
+        raw = auth[7:].strip()
+    elif "cookie" in headers:
+        morsel = SimpleCookie(headers["cookie"]).get("access_token")
+        raw = morsel.value if morsel else None
+    if not raw:
+        return None
+    try:
+        return int(AccessToken(raw)[jwt_settings.USER_ID_CLAIM])
+    except (TokenError, KeyError, ValueError):
+        return None
+
+
+def _cors_headers(headers):
+    """corsheaders ne voit pas ces requêtes : mêmes origines autorisées qu'en settings."""
+    origin = headers.get("origin")
+    if not origin:
+        return []
+    allowed = origin in _setting("CORS_ALLOWED_ORIGINS", ()) or any(
+        re.match(r, origin) for r in _setting("CORS_ALLOWED_ORIGIN_REGEXES", ())
+    )
+    if not allowed:
+        return []
+    return [(b"access-control-allow-origin", origin.encode()), (b"access-control-allow-credentials", b"true")]
+
+
+async def _watch_disconnect(receive, sub, disconnect_type):
+    while True:
+        message = await receive()
+        if message["type"] == disconnect_type:
+            sub.close()
+            return
+
+
+async def _pump(sub, write):
+    heartbeat = _setting("PUSH_HEARTBEAT_S", 25)
+    while not sub.closed:
+        event = await sub.next(heartbeat)
+        if sub.closed:
+            return
+        await write(event)
+
+
+class PushApp:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == SSE_PATH:
+            return await self._sse(scope, receive, send)
+        if scope["type"] == "websocket" and scope["path"] == WS_PATH:
+            return await self._websocket(scope, receive, send)
+        return await self.app(scope, receive, send)
+
+    def _open(self, user_id):
+        sub = Subscription(user_id, asyncio.get_running_loop(), _setting("PUSH_QUEUE_MAX", 64))
+        return sub if broker().subscribe(sub) else None
+
+    async def _serve(self, sub, receive, disconnect_type, write):
+        watcher = asyncio.ensure_future(_watch_disconnect(receive, sub, disconnect_type))
+        try:
+            await _pump(sub, write)
+        finally:
+            watcher.cancel()
+            broker().unsubscribe(sub)
+
+    async def _sse(self, scope, receive, send):
+        headers = _headers(scope)
+        cors = _cors_headers(headers)
+        user_id = _user_id(headers)
+        sub = self._open(user_id) if user_id is not None else None
+        if sub is None:
+            status = 401 if user_id is None else 429
+            await send({"type": "http.response.start", "status": status, "headers": cors})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": cors + [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),  # pas de buffering nginx
+            ],
+        })
+        await send({"type": "http.response.body", "body": b": ok\n\n", "more_body": True})
+
+        async def write(event):
+            if event is None:
+                body = b": ping\n\n"
+            else:
+                body = f"event: {event[0]}\ndata: {event[1]}\n\n".encode()
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+
+        await self._serve(sub, receive, "http.disconnect", write)
+
+    async def _websocket(self, scope, receive, send):
+        if (await receive())["type"] != "websocket.connect":
+            return
+        user_id = _user_id(_headers(scope))
+        sub = self._open(user_id) if user_id is not None else None
+        if sub is None:
+            # 4401 / 4429 : codes applicatifs, équivalents des statuts HTTP
+            await send({"type": "websocket.close", "code": 4401 if user_id is None else 4429})
+            return
+        await send({"type": "websocket.accept"})
+
+        async def write(event):
+            await send({"type": "websocket.send", "text": '{"type": "ping"}' if event is None else event[1]})
+
+        await self._serve(sub, receive, "websocket.disconnect", write)
@@ -0,0 +1,77 @@
+"""
+Compteurs de likes quotidiens (offre Free).
+
+Les compteurs vivent dans le cache Django (locmem en dev, Redis/Memcached en
+prod pour partager entre workers) sous la clé `likes:<user_id>:<AAAAMMJJ>`.
+La base n'est lue qu'une fois par utilisateur et par jour, pour amorcer le
+compteur si le cache l'a perdu.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+COUNTER_TTL = 2 * 24 * 3600
+
+
+def daily_limit():
+    return getattr(settings, "FREE_DAILY_LIKES", 20)
+
+
+def _key(user_id, day):
+    return f"likes:{user_id}:{day:%Y%m%d}"
+
+
+def _seed(user_id, day):
+    from .models import Swipe
+
+    start = timezone.make_aware(datetime.combine(day, time.min), timezone.get_default_timezone())
+    used = Swipe.objects.filter(
+        swiper_id=user_id, liked=True, created_at__gte=start, created_at__lt=start + timedelta(days=1)
+    ).count()
+    cache.add(_key(user_id, day), used, COUNTER_TTL)
+
+
+def _incr(user_id, day, n):
+    key = _key(user_id, day)
+    try:
+        return cache.incr(key, n)
+    except ValueError:  # clé absente : amorçage depuis la base
+        _seed(user_id, day)
+        return cache.incr(key, n)
+
+
+def consume(user_id, n=1):
+    """
+    Réserve jusqu'à `n` likes pour aujourd'hui. Renvoie le nombre accordé
+    (0..n). Incrément atomique puis remboursement de l'excédent, pour rester
+    correct avec plusieurs workers sur le même cache.
+    """
+    if n <= 0:
+        return 0
+    day = timezone.localdate()
+    limit = daily_limit()
+    used = _incr(user_id, day, n)
+    granted = max(0, min(n, limit - (used - n)))
+    if granted < n:
+        cache.decr(_key(user_id, day), n - granted)
+    return granted
+
+
+def refund(user_id, n=1):
+    """Rend des likes réservés mais non utilisés (swipe déjà existant...)."""
+    if n > 0:
+        try:
+            cache.decr(_key(user_id, timezone.localdate()), n)
+        except ValueError:
+            pass
+
+
+def remaining(user_id):
+    day = timezone.localdate()
+    used = cache.get(_key(user_id, day))
+    if used is None:
+        _seed(user_id, day)
+        used = cache.get(_key(user_id, day), 0)
+    return max(0, daily_limit() - used)
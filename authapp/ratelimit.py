@@ -0,0 +1,174 @@
+"""
+Limitation de débit des endpoints d'authentification (anti brute-force).
+
+Fenêtre glissante approchée : pour chaque clé, le compteur de la fenêtre
+courante plus celui de la précédente pondéré par la part de la fenêtre
+précédente encore couverte. Trois entiers par clé, précision largement
+suffisante pour du throttling.
+
+Les règles (`RATE_LIMITS`) associent à chaque scope des limites par IP et
+par identifiant (email, uid...). Les vues appellent `check()` avant tout
+hachage de mot de passe : une rafale de credential stuffing est refusée en
+429 sans brûler de PBKDF2.
+
+Stockage (`RATE_LIMIT_STORE`) :
+- "local" : dict LRU en mémoire du process, borné à `RATE_LIMIT_MAX_KEYS`
+  clés (les plus anciennes sont évincées) ;
+- un alias de CACHES (Redis en prod) pour partager les compteurs entre
+  workers.
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULT_RULES = {
+    # scope: ((clé, requêtes, fenêtre en s), ...)
+    "login": (("ip", 30, 60), ("ident", 10, 900)),
+    "register": (("ip", 10, 3600),),
+    "password_reset": (("ip", 10, 3600), ("ident", 3, 3600)),
+    "password_reset_confirm": (("ip", 20, 3600),),
+}
+
+
+def _retry_after(prev, curr, limit, window, offset):
+    """Secondes avant que prev * (1 - t / window) + curr repasse sous `limit`."""
+    if curr >= limit:
+        # attendre la fenêtre suivante, où `curr` devient le compteur précédent
+        wait = window - offset + window * max(0.0, 1 - limit / curr)
+    else:
+        wait = window * (1 - (limit - curr) / prev) - offset
+    return max(1, math.ceil(wait))
+
+
+def _estimate(prev, curr, window, offset):
+    return prev * (1 - offset / window) + curr
+
+
+class LocalStore:
+    """Compteurs (fenêtre, précédent, courant) par clé, en LRU borné."""
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def hit(self, key, limit, window, now):
+        idx = int(now // window)
+        offset = now - idx * window
+        with self._lock:
+            entry = self._data.get(key)
+            prev = curr = 0
+            if entry is not None:
+                w, p, c = entry
+                if w == idx:
+                    prev, curr = p, c
+                elif w == idx - 1:
+                    prev = c
+            if _estimate(prev, curr, window, offset) >= limit:
+                self._data[key] = (idx, prev, curr)
+                self._data.move_to_end(key)
+                return _retry_after(prev, curr, limit, window, offset)
+            self._data[key] = (idx, prev, curr + 1)
+            self._data.move_to_end(key)
+            if len(self._data) > self.max_keys:
+                self._data.popitem(last=False)
+        return None
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class CacheStore:
+    """Même algorithme sur un cache Django partagé (une clé par fenêtre)."""
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def hit(self, key, limit, window, now):
+        cache = caches[self.alias]
+        idx = int(now // window)
+        offset = now - idx * window
+        curr_key, prev_key = f"rl:{key}:{idx}", f"rl:{key}:{idx - 1}"
+        # incrément atomique puis remboursement si refusé (comme quotas.consume) :
+        # correct entre workers sur Redis/Memcached
+        cache.add(curr_key, 0, 2 * window)
+        curr = cache.incr(curr_key) - 1
+        prev = cache.get(prev_key, 0)
+        if _estimate(prev, curr, window, offset) >= limit:
+            cache.decr(curr_key)
+            return _retry_after(prev, curr, limit, window, offset)
+        return None
+
+    def clear(self):
+        pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                name = getattr(settings, "RATE_LIMIT_STORE", "local")
+                if name == "local":
+                    _store = LocalStore(getattr(settings, "RATE_LIMIT_MAX_KEYS", 100_000))
+                else:
+                    _store = CacheStore(name)
+    return _store
+
+
+def client_ip(request):
+    # derrière un proxy, REMOTE_ADDR doit être réécrit par le serveur (ex. --proxy-headers)
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def _digest(value):
+    # clés compactes et sans donnée personnelle en clair
+    return hashlib.blake2b(value.encode(), digest_size=8).hexdigest()
+
+
+def check(scope, request, ident=None):
+    """
+    Compte la tentative et renvoie None si elle est autorisée, sinon le
+    délai (s) avant la prochaine tentative possible.
+    """
+    rules = getattr(settings, "RATE_LIMITS", DEFAULT_RULES).get(scope)
+    if not rules:
+        return None
+    now = time.time()
+    s = store()
+    for kind, limit, window in rules:
+        if kind == "ip":
+            value = client_ip(request)
+        elif ident:
+            value = ident.strip().lower()
+        else:
+            continue
+        retry = s.hit(f"{scope}:{kind}:{_digest(value)}", limit, window, now)
+        if retry is not None:
+            return retry
+    return None
+
+
+async def acheck(scope, request, ident=None):
+    """check() pour les vues async : le store local ne bloque pas la boucle, un cache si."""
+    if isinstance(store(), LocalStore):
+        return check(scope, request, ident)
+    return await sync_to_async(check)(scope, request, ident)
+
+
+def limited_payload(retry_after):
+    return {"error": "trop de tentatives, réessaie plus tard", "retry_after": retry_after}
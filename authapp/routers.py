@@ -0,0 +1,57 @@
+"""
+Routage lecture / écriture vers un réplica.
+
+Les vues en lecture seule décorées par `@replica_reads` (me, profile_get,
+public_profile) lisent les tables utilisateurs et profils sur l'alias
+`replica`, s'il est déclaré dans settings.DATABASES. Tout le reste reste
+sur "default" : écritures, sessions, vues non décorées, et toute lecture
+qui suit une écriture dans la même requête.
+
+Le décalage de réplication reste visible d'une requête à l'autre ;
+profile_update réchauffe le cache profils, si bien que le profil modifié
+est relu depuis le cache et pas depuis le réplica.
+"""
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+REPLICA_ALIAS = "replica"
+# sessions, contenttypes, social_django... restent sur le primaire
+REPLICA_APPS = {"auth", "authapp"}
+
+# None : hors vue en lecture ; True : réplica ; False : épinglé au primaire
+_use_replica = ContextVar("runnr_use_replica", default=None)
+
+
+def replica_reads(view):
+    """Fait lire `view` (vue GET) sur le réplica quand il est configuré."""
+
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        token = _use_replica.set(REPLICA_ALIAS in settings.DATABASES)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+
+    return wrapped
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and model._meta.app_label in REPLICA_APPS:
+            return REPLICA_ALIAS
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        if _use_replica.get():
+            _use_replica.set(False)  # lire ses propres écritures
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # même jeu de données des deux côtés
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
@@ -0,0 +1,222 @@
+"""
+Sorties de groupe : création, inscriptions, flux iCalendar.
+
+Capacité : une inscription est un UPDATE conditionnel
+`taken = taken + 1 WHERE taken < capacity` suivi de l'INSERT de la
+Participation, dans une transaction minimale. Pas de lecture-puis-écriture,
+donc pas de surréservation, même avec des centaines d'inscriptions à la
+même seconde (la contrainte run_session_not_overbooked le garantit en
+dernier recours). Une sortie complète, ou une inscription déjà faite, est
+refusée par une simple lecture, sans prendre le verrou d'écriture SQLite :
+après le remplissage, la rafale ne fait pas la queue derrière le writer.
+
+Flux .ics : un VEVENT par sortie, mis en cache et partagé entre tous les
+inscrits (clé versionnée par `updated_at`). Le flux complet d'un
+utilisateur est mis en cache jusqu'à ce que ses inscriptions changent.
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core import signing
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Participation, RunSession
+
+FEED_TTL = 24 * 3600
+EVENT_TTL = 7 * 24 * 3600
+CALENDAR_SALT = "runnr.calendar"
+
+
+class Full(Exception):
+    pass
+
+
+class Closed(Exception):
+    pass
+
+
+def create(organizer, **fields):
+    """Crée la sortie ; l'organisateur y occupe la première place."""
+    with transaction.atomic():
+        session = RunSession.objects.create(organizer=organizer, taken=1, **fields)
+        Participation.objects.create(session=session, user=organizer)
+        _feed_changed(organizer.id)
+    return session
+
+
+def join(session_id, user_id):
+    """
+    Réserve une place. Renvoie False si l'utilisateur était déjà inscrit.
+    Full si la sortie est complète, Closed si elle a commencé ou n'existe pas.
+    """
+    now = timezone.now()
+    # lectures sans verrou : les refus évidents ne passent pas par le writer
+    row = RunSession.objects.filter(pk=session_id).values("taken", "capacity", "starts_at").first()
+    if row is None or row["starts_at"] <= now:
+        raise Closed()
+    if Participation.objects.filter(session_id=session_id, user_id=user_id).exists():
+        return False
+    if row["taken"] >= row["capacity"]:
+        raise Full()
+    try:
+        with transaction.atomic():
+            if not RunSession.objects.filter(
+                pk=session_id, taken__lt=F("capacity"), starts_at__gt=now
+            ).update(taken=F("taken") + 1):
+                raise Full()
+            Participation.objects.create(session_id=session_id, user_id=user_id)
+            _feed_changed(user_id)
+    except IntegrityError:
+        return False  # double clic concurrent : la place réservée est annulée avec la transaction
+    return True
+
+
+def leave(session_id, user_id):
+    """Libère la place ; False si l'utilisateur n'était pas inscrit."""
+    with transaction.atomic():
+        deleted, _ = Participation.objects.filter(session_id=session_id, user_id=user_id).delete()
+        if deleted:
+            RunSession.objects.filter(pk=session_id).update(taken=F("taken") - 1)
+            _feed_changed(user_id)
+    return bool(deleted)
+
+
+def joined_ids(user_id, session_ids):
+    """Parmi `session_ids`, celles où `user_id` est inscrit (une requête)."""
+    if not session_ids:
+        return set()
+    return set(
+        Participation.objects.filter(user_id=user_id, session_id__in=session_ids).values_list("session_id", flat=True)
+    )
+
+
+def session_data(s, joined=False):
+    return {
+        "id": s.id,
+        "title": s.title,
+        "organizer_id": s.organizer_id,
+        "starts_at": s.starts_at.isoformat(),
+        "duration_min": s.duration_min,
+        "location_city": s.location_city,
+        "meeting_point": s.meeting_point,
+        "level": s.level,
+        "capacity": s.capacity,
+        "spots_left": s.spots_left,
+        "joined": joined,
+    }
+
+
+def upcoming(city=None, after=None, limit=20):
+    """Sorties à venir par date de début, curseur (starts_at, id). Renvoie (sorties, next_cursor)."""
+    qs = RunSession.objects.filter(starts_at__gt=timezone.now())
+    if city:
+        qs = qs.filter(location_city__iexact=city.strip())
+    if after is not None:
+        at, sid = after
+        qs = qs.filter(starts_at__gte=at).exclude(starts_at=at, id__lte=sid)
+    rows = list(qs.order_by("starts_at", "id")[: limit + 1])
+    page = rows[:limit]
+    return page, (encode_cursor(page[-1]) if len(rows) > limit else None)
+
+
+def encode_cursor(s):
+    return f"{int(s.starts_at.timestamp() * 1_000_000)}_{s.id}"
+
+
+def decode_cursor(raw):
+    """ValueError si le curseur est invalide."""
+    micros, sid = raw.split("_")
+    return datetime.fromtimestamp(int(micros) / 1_000_000, dt_timezone.utc), int(sid)
+
+
+# ---- iCalendar ----
+def calendar_token(user_id):
+    """Jeton d'URL du flux (les agendas ne portent pas de cookie)."""
+    return signing.dumps(user_id, salt=CALENDAR_SALT)
+
+
+def user_for_token(token):
+    try:
+        return signing.loads(token, salt=CALENDAR_SALT)
+    except signing.BadSignature:
+        return None
+
+
+def _feed_key(user_id):
+    return f"ics:feed:{user_id}"
+
+
+def _feed_changed(user_id):
+    transaction.on_commit(lambda: cache.delete(_feed_key(user_id)))
+
+
+def invalidate_participants(session_id):
+    """Sortie modifiée ou supprimée : flux de tous ses inscrits."""
+    ids = list(Participation.objects.filter(session_id=session_id).values_list("user_id", flat=True))
+    transaction.on_commit(lambda: cache.delete_many([_feed_key(i) for i in ids]))
+
+
+def _escape(text):
+    # CR seul ou CRLF saisis par l'organisateur : un CR brut couperait la ligne (injection de propriété)
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _fold(line):
+    """Lignes de 75 octets max (RFC 5545 §3.1), continuation par un espace."""
+    raw = line.encode()
+    if len(raw) <= 75:
+        return line
+    parts, start = [], 0
+    while start < len(raw):
+        end = min(start + (75 if not parts else 74), len(raw))
+        while end < len(raw) and (raw[end] & 0xC0) == 0x80:  # pas de coupure dans un caractère UTF-8
+            end -= 1
+        parts.append(raw[start:end].decode())
+        start = end
+    return "\r\n ".join(parts)
+
+
+def _ics_time(dt):
+    return dt.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def ics_event(s):
+    """VEVENT d'une sortie, en cache tant qu'elle n'est pas modifiée (partagé entre inscrits)."""
+    key = f"ics:event:{s.id}:{int(s.updated_at.timestamp() * 1_000_000)}"
+    event = cache.get(key)
+    if event is None:
+        location = ", ".join(p for p in (s.meeting_point, s.location_city) if p)
+        lines = [
+            "BEGIN:VEVENT",
+            f"UID:run-session-{s.id}@runnr",
+            f"DTSTAMP:{_ics_time(s.updated_at)}",
+            f"DTSTART:{_ics_time(s.starts_at)}",
+            f"DTEND:{_ics_time(s.starts_at + timedelta(minutes=s.duration_min))}",
+            f"SUMMARY:{_escape(s.title)}",
+            f"LOCATION:{_escape(location)}",
+            "END:VEVENT",
+        ]
+        event = "\r\n".join(_fold(line) for line in lines) + "\r\n"
+        cache.set(key, event, EVENT_TTL)
+    return event
+
+
+def ics_feed(user_id):
+    """(corps, etag) du flux de `user_id` : ses sorties des 30 derniers jours et à venir."""
+    feed = cache.get(_feed_key(user_id))
+    if feed is None:
+        since = timezone.now() - timedelta(days=30)
+        sessions = RunSession.objects.filter(participations__user_id=user_id, starts_at__gte=since).order_by("starts_at")
+        body = (
+            "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Runnr//Sorties//FR\r\nCALSCALE:GREGORIAN\r\n"
+            "X-WR-CALNAME:Runnr\r\n"
+            + "".join(ics_event(s) for s in sessions)
+            + "END:VCALENDAR\r\n"
+        )
+        feed = (body, '"' + hashlib.md5(body.encode()).hexdigest() + '"')
+        cache.set(_feed_key(user_id), feed, FEED_TTL)
+    return feed
@@ -1,14 +1,47 @@
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 from .models import Profile
+from . import completion, feed, similarity, profile_cache
 
 
 User = get_user_model()
+# champs de User repris dans les payloads profil (me, public_profile)
+USER_PAYLOAD_FIELDS = {"username", "email", "first_name", "last_name"}
 
 
 @receiver(post_save, sender=User)
 def create_profile_on_user_create(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
+        return
+    update_fields = kwargs.get("update_fields")
+    if update_fields is None or USER_PAYLOAD_FIELDS & set(update_fields):
+        # nom/email affichés : nouvelle version du profil pour les ETag
+        Profile.objects.filter(user_id=instance.pk).update(updated_at=timezone.now())
+        profile_cache.invalidate(instance.pk)
 
+
+@receiver(pre_save, sender=Profile)
+def denormalize_profile(sender, instance, **kwargs):
+    instance.set_location_from_city()
+    instance.distances_mask = similarity.distances_mask(instance.distances)
+    instance.completion_percent, instance.completion_missing = completion.compute(instance)
+
+
+@receiver(post_save, sender=Profile)
+def update_feed_index(sender, instance, **kwargs):
+    feed.index.update(instance)
+    if instance.paused:
+        similarity.cache.remove(instance.user_id)
+    else:
+        similarity.cache.update(instance.user_id, instance.speed_kmh, instance.distances_mask)
+    profile_cache.invalidate(instance.user_id)
+
+
+@receiver(post_delete, sender=Profile)
+def remove_from_feed_index(sender, instance, **kwargs):
+    feed.index.remove(instance.user_id)
+    similarity.cache.remove(instance.user_id)
+    profile_cache.invalidate(instance.user_id)
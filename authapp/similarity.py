@@ -0,0 +1,223 @@
+"""
+Score de "performances similaires" (story 9), vectorisé avec NumPy.
+
+Chaque profil est réduit à deux colonnes numériques :
+- `distances_mask` : bitmask des distances courues (5k, 10k, semi...),
+  calculé une fois à l'enregistrement du profil ;
+- `speed_kmh`.
+
+`PerfCache` garde ces colonnes en tableaux NumPy (un par colonne, triés par
+user_id) pour scorer des milliers de candidats en une seule passe. Maintenu par les
+signaux de Profile, il est relu au plus tard toutes les
+`SIMILARITY_CACHE_TTL` secondes (en tâche de fond, l'ancien reste servi)
+pour rattraper les écritures des autres workers : créations, pauses,
+suppressions, imports.
+"""
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+# Ordre figé : ne jamais réordonner, les masques sont stockés en base
+DISTANCE_BITS = {
+    "5k": 1 << 0,
+    "10k": 1 << 1,
+    "semi": 1 << 2,
+    "marathon": 1 << 3,
+    "trail": 1 << 4,
+    "ultra": 1 << 5,
+}
+_ALIASES = {"5km": "5k", "10km": "10k", "21k": "semi", "semi-marathon": "semi", "42k": "marathon"}
+
+SPEED_SCALE_KMH = 2.0  # écart de vitesse qui divise le score vitesse par e
+SPEED_WEIGHT = 0.6
+DISTANCE_WEIGHT = 0.4
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.float32)
+
+
+def distances_mask(distances: str) -> int:
+    """"5k, 10k,Semi" -> 0b111. Les valeurs inconnues sont ignorées."""
+    mask = 0
+    for token in (distances or "").split(","):
+        token = token.strip().lower()
+        mask |= DISTANCE_BITS.get(_ALIASES.get(token, token), 0)
+    return mask
+
+
+def score_arrays(speed, mask, ref_speed, ref_mask):
+    """
+    Score dans [0, 1] pour chaque candidat (arrays alignés).
+    Vitesse : exp(-|Δ|/SPEED_SCALE_KMH). Distances : indice de Jaccard des
+    masques. Une composante inconnue (vitesse absente, aucune distance) est
+    remplacée par 0.5 pour ne pas favoriser les profils vides.
+    """
+    if ref_speed is None or np.isnan(ref_speed):
+        s_speed = np.full(speed.shape, 0.5, dtype=np.float32)
+    else:
+        s_speed = np.exp(-np.abs(speed - np.float32(ref_speed)) / SPEED_SCALE_KMH)
+        s_speed = np.where(np.isnan(speed), np.float32(0.5), s_speed)
+    inter = _POPCOUNT[mask & ref_mask]
+    union = _POPCOUNT[mask | ref_mask]
+    s_dist = np.divide(inter, union, out=np.full(inter.shape, 0.5, dtype=np.float32), where=union > 0)
+    return (SPEED_WEIGHT * s_speed + DISTANCE_WEIGHT * s_dist).astype(np.float32)
+
+
+class PerfCache:
+    def __init__(self, ttl=None):
+        self._lock = threading.Lock()
+        self._ids = None  # int64, trié
+        self._speed = None  # float32, NaN = inconnue
+        self._mask = None  # uint8
+        self._pending = {}  # user_id -> (speed, mask) pas encore dans les tableaux
+        self._built_at = None
+        self._rebuilding = False
+        self._changes = {}  # user_id -> (speed, mask) ou None (retiré), reçus pendant une reconstruction
+        self.ttl = ttl
+
+    # ---- construction / maintenance ----
+    def _ttl(self):
+        if self.ttl is not None:
+            return self.ttl
+        return getattr(settings, "SIMILARITY_CACHE_TTL", 300)
+
+    def _read(self):
+        from .models import Profile
+
+        rows = (
+            Profile.objects.filter(paused=False, user__is_active=True)
+            .order_by("user_id").values_list("user_id", "speed_kmh", "distances_mask")
+        )
+        n = rows.count()
+        ids = np.empty(n, dtype=np.int64)
+        speed = np.empty(n, dtype=np.float32)
+        mask = np.empty(n, dtype=np.uint8)
+        i = 0
+        for uid, s, m in rows.iterator(chunk_size=10000):
+            if i >= n:
+                break  # lignes créées pendant la lecture : rattrapées par _pending
+            ids[i], speed[i], mask[i] = uid, np.nan if s is None else s, m
+            i += 1
+        return ids[:i], speed[:i], mask[:i]
+
+    def _ensure(self):
+        built_at = self._built_at
+        if built_at is not None and time.monotonic() - built_at < self._ttl():
+            return
+        if built_at is None:
+            # premier build : synchrone, la requête n'a rien d'autre à servir
+            with self._lock:
+                if self._built_at is None:
+                    self._ids, self._speed, self._mask = self._read()
+                    self._built_at = time.monotonic()
+            return
+        # tableaux périmés : on sert les anciens pendant la reconstruction
+        if not self._rebuilding:
+            self._rebuilding = True
+            threading.Thread(target=self._background_rebuild, daemon=True).start()
+
+    def _background_rebuild(self):
+        from django.db import connection
+
+        try:
+            self.rebuild()
+        finally:
+            self._rebuilding = False
+            connection.close()
+
+    def rebuild(self):
+        """Relit la table hors verrou puis remplace les tableaux (cf. feed.CandidateIndex)."""
+        with self._lock:
+            self._changes.clear()
+        ids, speed, mask = self._read()
+        with self._lock:
+            pending = {**self._pending, **self._changes}
+            self._ids, self._speed, self._mask = ids, speed, mask
+            self._pending, self._changes = {}, {}
+            # écritures de ce worker arrivées pendant la lecture : rejouées sur les nouveaux tableaux
+            for uid, row in pending.items():
+                if row is None:
+                    self._remove(uid)
+                else:
+                    self._update(uid, *row)
+            self._built_at = time.monotonic()
+
+    def _merge_pending(self):
+        uids = np.fromiter(self._pending.keys(), dtype=np.int64, count=len(self._pending))
+        vals = list(self._pending.values())
+        speed = np.array([np.nan if s is None else s for s, _ in vals], dtype=np.float32)
+        mask = np.array([m for _, m in vals], dtype=np.uint8)
+        ids = np.concatenate([self._ids, uids])
+        order = np.argsort(ids, kind="stable")
+        self._ids = ids[order]
+        self._speed = np.concatenate([self._speed, speed])[order]
+        self._mask = np.concatenate([self._mask, mask])[order]
+        self._pending.clear()
+
+    def _snapshot(self):
+        self._ensure()
+        with self._lock:
+            if self._pending:
+                self._merge_pending()
+            return self._ids, self._speed, self._mask
+
+    def _update(self, user_id, speed_kmh, mask):
+        i = int(np.searchsorted(self._ids, user_id))
+        if i < len(self._ids) and self._ids[i] == user_id:
+            self._speed[i] = np.nan if speed_kmh is None else speed_kmh
+            self._mask[i] = mask
+        else:
+            self._pending[user_id] = (speed_kmh, mask)
+
+    def _remove(self, user_id):
+        self._pending.pop(user_id, None)
+        i = int(np.searchsorted(self._ids, user_id))
+        if i < len(self._ids) and self._ids[i] == user_id:
+            keep = np.ones(len(self._ids), dtype=bool)
+            keep[i] = False
+            self._ids, self._speed, self._mask = self._ids[keep], self._speed[keep], self._mask[keep]
+
+    def update(self, user_id, speed_kmh, mask):
+        """Met à jour une seule ligne (appelé au post_save de Profile)."""
+        with self._lock:
+            if self._ids is None:
+                return
+            if self._rebuilding:
+                self._changes[user_id] = (speed_kmh, mask)
+            self._update(user_id, speed_kmh, mask)
+
+    def remove(self, user_id):
+        with self._lock:
+            if self._ids is None:
+                return
+            if self._rebuilding:
+                self._changes[user_id] = None
+            self._remove(user_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._ids = self._speed = self._mask = None
+            self._built_at = None
+            self._pending.clear()
+            self._changes.clear()
+
+    def rank(self, ref_speed, ref_mask, candidate_ids, limit=None):
+        """
+        Classe `candidate_ids` par similarité décroissante en une passe.
+        Renvoie [(user_id, score)] ; les ids inconnus sont ignorés.
+        """
+        ids, speed, mask = self._snapshot()
+        cand = np.unique(np.asarray(candidate_ids, dtype=np.int64))
+        pos = np.searchsorted(ids, cand)
+        pos = np.minimum(pos, max(len(ids) - 1, 0))
+        found = ids[pos] == cand if len(ids) else np.zeros(len(cand), dtype=bool)
+        cand, pos = cand[found], pos[found]
+        scores = score_arrays(speed[pos], mask[pos], ref_speed, ref_mask)
+        order = np.argsort(-scores, kind="stable")
+        if limit is not None:
+            order = order[:limit]
+        return [(int(cand[j]), round(float(scores[j]), 4)) for j in order]
+
+
+cache = PerfCache()
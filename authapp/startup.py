@@ -0,0 +1,97 @@
+"""
+Démarrage des workers : imports différés et warm-up.
+
+- `lazy_view("authapp.oauth_views.google_login")` : vue importée au premier
+  appel de sa route. urls.py n'importe donc pas la pile OAuth
+  (social_django.utils, backends Google/Facebook/Apple) au boot.
+- `warm_up()` (opt-in, `WARMUP=1`) : appelé depuis wsgi.py / asgi.py, donc
+  une fois dans le master avec `gunicorn --preload` (les workers forkés
+  héritent de tout, en copy-on-write), sinon dans chaque worker. Il charge
+  ce que la première requête paierait : résolution d'URL et vues différées,
+  backends d'authentification, catalogue de traductions, connexion à la
+  base, index du flux, cache de similarité, table des boosts, communes.
+  Les connexions sont refermées à la fin : jamais de socket partagé entre
+  process forkés.
+"""
+import logging
+import time
+from contextlib import contextmanager
+
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def lazy_view(dotted):
+    """Vue résolue par import au premier appel (puis depuis sys.modules)."""
+    name = dotted.rsplit(".", 1)[1]
+
+    def view(request, *args, **kwargs):
+        return import_string(dotted)(request, *args, **kwargs)
+
+    view.__name__ = view.__qualname__ = name
+    view.lazy_target = dotted
+    return view
+
+
+@contextmanager
+def _step(timings, name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        logger.exception("warm-up : échec de l'étape %s", name)
+    timings[name] = (time.perf_counter() - t0) * 1000
+
+
+def _walk(patterns):
+    for p in patterns:
+        if hasattr(p, "url_patterns"):
+            yield from _walk(p.url_patterns)
+        else:
+            yield p
+
+
+def warm_up():
+    """Précharge ce que la première requête paierait. Renvoie {étape: ms}."""
+    from django.conf import settings
+    from django.contrib.auth import get_backends
+    from django.db import connections
+    from django.urls import get_resolver
+    from django.utils import translation
+
+    from . import boost, feed, geo, similarity
+
+    timings = {}
+    with _step(timings, "urls"):
+        resolver = get_resolver()
+        resolver.reverse_dict  # construit les tables de reverse()
+        for p in _walk(resolver.url_patterns):
+            target = getattr(p.callback, "lazy_target", None)
+            if target:
+                import_string(target)
+    with _step(timings, "auth"):
+        get_backends()
+        from social_core.backends.utils import load_backends
+
+        load_backends(settings.AUTHENTICATION_BACKENDS)
+        from rest_framework.settings import api_settings
+        from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+        api_settings.DEFAULT_AUTHENTICATION_CLASSES  # import des classes d'authentification DRF
+        jwt_settings.SIGNING_KEY
+    with _step(timings, "i18n"):
+        translation.activate(settings.LANGUAGE_CODE)
+        translation.gettext("Bad Request")
+        translation.deactivate()
+    with _step(timings, "db"):
+        for alias in connections:
+            connections[alias].ensure_connection()
+    with _step(timings, "caches"):
+        feed.index._ensure()
+        similarity.cache._snapshot()
+        len(boost.table)
+        geo._load()
+    connections.close_all()
+    logger.info("warm-up : %s", ", ".join(f"{k} {v:.0f} ms" for k, v in timings.items()))
+    return timings
@@ -0,0 +1,778 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.core.handlers.asgi import ASGIHandler
+from django.db import connections
+from django.db.models import Q
+from django.test import AsyncClient, Client, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from authapp import (
+    activity, boost, bulk, chat, exclusions, feed, geo, metrics, notify, photos, profile_cache, purge, quotas, ratelimit, runs,
+    similarity,
+)
+from authapp.auth import issue_tokens
+from authapp.models import (
+    AccountDeletion, Block, Conversation, Message, Notification, NotificationPreference, Participation, Profile,
+    RunSession, Swipe,
+)
+from authapp.views import _apply_swipes
+
+User = get_user_model()
+
+
+def tearDownModule():
+    # activité notée par le middleware : écrite tant que la base de test existe (sinon flush d'arrêt en échec)
+    activity.flush()
+
+
+def _in_threads(n, fn):
+    """Lance `fn(i)` dans `n` threads partis en même temps ; renvoie les résultats dans l'ordre."""
+    results = [None] * n
+    barrier = threading.Barrier(n)
+
+    def worker(i):
+        try:
+            barrier.wait()
+            results[i] = fn(i)
+        finally:
+            connections.close_all()  # connexion propre au thread
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return results
+
+
+def _jwt_client(user):
+    """Client authentifié par le cookie access_token (chemin sans requête d'authentification)."""
+    c = Client(HTTP_HOST="localhost")
+    c.cookies["access_token"] = str(issue_tokens(user).access_token)
+    return c
+
+
+class ProfileQueryCountTests(TestCase):
+    """Nombre de requêtes de me / profile_get / public_profile, indépendant du volume de données liées."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("moi@runnr.local", "moi@runnr.local", "x")
+        cls.other = User.objects.create_user("lui@runnr.local", "lui@runnr.local", "x")
+        Profile.objects.filter(user__in=[cls.user, cls.other]).update(level="intermediate", location_city="Lyon")
+        # données liées : une requête par ligne ferait exploser le compte
+        runners = User.objects.bulk_create([User(username=f"coureur-{i}@runnr.local") for i in range(50)])
+        Profile.objects.bulk_create([Profile(user=u, location_city="Lyon") for u in runners])
+        Swipe.objects.bulk_create([Swipe(swiper=cls.user, target=u, liked=True) for u in runners])
+        Swipe.objects.bulk_create([Swipe(swiper=u, target=cls.user, liked=True) for u in runners])
+        Block.objects.bulk_create([Block(blocker=cls.user, blocked=u) for u in runners[:25]])
+        Block.objects.bulk_create([Block(blocker=u, blocked=cls.user) for u in runners[25:]])
+
+    def setUp(self):
+        caches["profiles"].clear()
+        exclusions.clear()
+        self.client = _jwt_client(self.user)
+
+    def test_me(self):
+        with self.assertNumQueries(1):  # profil (cache vide)
+            self.assertEqual(self.client.get("/api/me").status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/api/me").status_code, 200)
+
+    def test_profile_get(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get("/api/profile").status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/api/profile").status_code, 200)
+
+    def test_public_profile(self):
+        url = f"/api/users/{self.other.id}/profile"
+        # les deux profils (consulté + appelant) en une requête, puis blocages dans les deux sens
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class MetricsAsyncTests(TestCase):
+    """Sous ASGI : chaîne de middlewares entièrement async, SQL des vues async compté."""
+
+    def test_asgi_chain_is_not_adapted(self):
+        # Django journalise (en DEBUG) chaque middleware sync repassé par sync_to_async
+        with override_settings(DEBUG=True), self.assertNoLogs("django.request", "DEBUG"):
+            ASGIHandler()
+
+    async def test_async_view_queries_are_counted(self):
+        metrics.registry.reset()
+        resp = await AsyncClient().post(
+            "/api/async/login", {"email": "personne@runnr.local", "password": "x"}, content_type="application/json"
+        )
+        self.assertEqual(resp.status_code, 400)
+        # recherche par username puis par email, exécutées dans les threads de sync_to_async
+        self.assertGreaterEqual(metrics.registry.snapshot()["login_email_async"]["queries"], 2)
+
+
+class PerfCacheTests(TestCase):
+    """Le cache de similarité rattrape les écritures faites sans ses signaux (autres workers, imports)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create([User(username=f"perf-{i}@runnr.local") for i in range(3)])
+        Profile.objects.bulk_create([Profile(user=u, speed_kmh=10, distances="10k") for u in users])
+        cls.ids = [u.id for u in users]
+
+    def test_rebuild_drops_paused_and_inactive(self):
+        cache = similarity.PerfCache(ttl=0)
+        self.assertEqual(len(cache.rank(10, 2, self.ids)), 3)
+        # update() : pas de post_save, comme une écriture d'un autre process
+        Profile.objects.filter(user_id=self.ids[0]).update(paused=True)
+        User.objects.filter(pk=self.ids[1]).update(is_active=False)
+        self.assertEqual(len(cache.rank(10, 2, self.ids)), 3)  # périmé : anciens tableaux servis
+        cache.rebuild()
+        self.assertEqual([uid for uid, _ in cache.rank(10, 2, self.ids)], [self.ids[2]])
+
+    def test_changes_during_rebuild_are_replayed(self):
+        cache = similarity.PerfCache()
+        cache.rank(10, 2, self.ids)
+        read = cache._read
+
+        def slow_read():
+            arrays = read()
+            cache.remove(self.ids[0])  # post_delete reçu pendant la lecture
+            cache.update(self.ids[1], 20, 2)
+            return arrays
+
+        cache._rebuilding = True
+        cache._read = slow_read
+        cache.rebuild()
+        ranked = dict(cache.rank(10, 2, self.ids))
+        self.assertNotIn(self.ids[0], ranked)
+        self.assertLess(ranked[self.ids[1]], ranked[self.ids[2]])
+
+
+class NearbyTests(TestCase):
+    """Recherche par rayon : même résultat qu'un parcours exhaustif, en une requête bornée par point."""
+
+    CITIES = ("Paris", "Versailles", "Saint-Denis", "Lyon")
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create([User(username=f"geo-{i}@runnr.local") for i in range(200)])
+        profiles = []
+        for i, u in enumerate(users):
+            p = Profile(user=u, location_city=cls.CITIES[i % len(cls.CITIES)], paused=i % 7 == 0)
+            p.set_location_from_city()
+            profiles.append(p)
+        Profile.objects.bulk_create(profiles)
+        cls.lat, cls.lon = geo.geocode("Paris")
+
+    def _brute_force(self, radius, limit, exclude):
+        hits = [
+            (uid, geo.haversine_km(self.lat, self.lon, lat, lon))
+            for uid, lat, lon in Profile.objects.filter(paused=False).values_list("user_id", "latitude", "longitude")
+            if uid not in exclude
+        ]
+        return sorted((h for h in hits if h[1] <= radius), key=lambda h: (h[1], h[0]))[:limit]
+
+    def test_matches_brute_force(self):
+        ids = list(Profile.objects.values_list("user_id", flat=True))
+        small = set(ids[::3])
+        large = set(ids[::2]) | set(range(10**6, 10**6 + geo.NEARBY_SQL_EXCLUDE_MAX))  # filtré en mémoire
+        for radius, limit, exclude in ((30, 20, ()), (30, 80, small), (100, 150, large), (5, 10, small)):
+            with self.subTest(radius=radius, limit=limit, excluded=len(exclude)):
+                self.assertEqual(
+                    geo.nearby(self.lat, self.lon, radius, limit=limit, exclude=exclude),
+                    self._brute_force(radius, limit, exclude),
+                )
+
+    def test_dense_point_is_limited(self):
+        # un seul point dans le rayon : une requête, limit lignes au plus
+        with self.assertNumQueries(1):
+            self.assertEqual(len(geo.nearby(self.lat, self.lon, 1, limit=5)), 5)
+
+
+class RateLimitConcurrencyTests(TransactionTestCase):
+    """Sous accès simultanés, exactement `limit` tentatives passent par fenêtre."""
+
+    def setUp(self):
+        ratelimit.store().clear()
+
+    def test_stores_allow_exactly_limit(self):
+        limit, threads = 200, 8
+        for name, store in (("local", ratelimit.LocalStore(1000)), ("cache", ratelimit.CacheStore("default"))):
+            now = time.time()
+            key = f"test:{name}:{now}"
+
+            def hammer(i):
+                return sum(store.hit(key, limit, 3600, now) is None for _ in range(2 * limit // threads + 1))
+
+            with self.subTest(store=name):
+                self.assertEqual(sum(_in_threads(threads, hammer)), limit)
+
+    @override_settings(RATE_LIMITS={"login": (("ip", 5, 60),)})
+    def test_login_burst_refused_before_hashing(self):
+        User.objects.create_user("rl@runnr.local", "rl@runnr.local", "x")
+        body = {"email": "rl@runnr.local", "password": "faux"}
+
+        def attempts(i):
+            client = Client(HTTP_HOST="localhost", REMOTE_ADDR="198.51.100.9")
+            return [client.post("/api/login", body, content_type="application/json").status_code for _ in range(3)]
+
+        statuses = [code for codes in _in_threads(8, attempts) for code in codes]
+        self.assertEqual(statuses.count(400), 5)
+        self.assertEqual(statuses.count(429), 19)
+
+
+class ActivityShutdownTests(TestCase):
+    """Le flush d'arrêt (atexit) écrit tout le tampon d'activité."""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create([User(username=f"actif-{i}@runnr.local") for i in range(1200)])
+        Profile.objects.bulk_create([Profile(user=u) for u in users])
+        cls.ids = [u.id for u in users]
+
+    def setUp(self):
+        activity.flush()
+
+        def restore():
+            activity._stop.clear()
+            activity._flusher = None  # arrêté par shutdown() : relancé au prochain touch()
+
+        self.addCleanup(restore)
+
+    @override_settings(ACTIVITY_FLUSH_INTERVAL=0)
+    def test_shutdown_flushes_every_buffered_user(self):
+        base = 1_800_000_000
+        expected = {}
+        for i, uid in enumerate(self.ids):
+            ts = base + (i % 3) * 60  # plusieurs minutes distinctes, plus d'un paquet UPDATE_CHUNK
+            activity.touch(uid, now=ts + 5)
+            expected[uid] = datetime.fromtimestamp(ts, dt_timezone.utc)
+        self.assertEqual(activity.pending_count(), len(self.ids))
+        self.assertFalse(Profile.objects.filter(last_active_at__isnull=False).exists())
+
+        activity.shutdown()
+
+        self.assertEqual(activity.pending_count(), 0)
+        written = dict(Profile.objects.filter(user_id__in=self.ids).values_list("user_id", "last_active_at"))
+        self.assertEqual(written, expected)
+
+
+class ActivityAsyncTests(TestCase):
+    """Sous ASGI, le middleware d'activité note l'utilisateur sans repasser en sync."""
+
+    def test_middleware_is_async_capable(self):
+        async def view(request):
+            return None
+
+        self.assertTrue(iscoroutinefunction(activity.ActivityMiddleware(view)))
+
+    async def test_async_login_touches_user(self):
+        user = await sync_to_async(User.objects.create_user)("async@runnr.local", "async@runnr.local", "secret")
+        # touch() simulé : le vrai lancerait le thread de flush, hors de la transaction du test
+        with mock.patch.object(activity, "touch") as touch:
+            resp = await AsyncClient().post(
+                "/api/async/login", {"email": "async@runnr.local", "password": "secret"}, content_type="application/json"
+            )
+        self.assertEqual(resp.status_code, 200)
+        touch.assert_called_once_with(user.id)
+
+
+class RunJoinConcurrencyTests(TransactionTestCase):
+    """Inscriptions simultanées : jamais plus de `capacity` places prises."""
+
+    def test_no_overbooking(self):
+        capacity, threads = 5, 16
+        organizer = User.objects.create_user("orga@runnr.local", "orga@runnr.local", "x")
+        users = User.objects.bulk_create([User(username=f"rsvp-{i}@runnr.local") for i in range(threads)])
+        # l'organisateur occupe la première place
+        session = runs.create(organizer, title="Fractionné", starts_at=timezone.now() + timedelta(days=1), capacity=capacity)
+
+        def attempt(i):
+            try:
+                return runs.join(session.id, users[i].id)
+            except runs.Full:
+                return "full"
+
+        outcomes = _in_threads(threads, attempt)
+        self.assertEqual(outcomes.count(True), capacity - 1)
+        self.assertEqual(outcomes.count("full"), threads - capacity + 1)
+        self.assertEqual(Participation.objects.filter(session=session).count(), capacity)
+        session.refresh_from_db()
+        self.assertEqual(session.taken, capacity)
+
+
+class RunIcsTests(TestCase):
+    def test_carriage_return_cannot_inject_a_property(self):
+        organizer = User.objects.create_user("ics@runnr.local", "ics@runnr.local", "x")
+        session = runs.create(
+            organizer, title="Sortie\r\nLOCATION:ailleurs", meeting_point="Parc\rDESCRIPTION:x",
+            starts_at=timezone.now() + timedelta(days=1), capacity=5,
+        )
+        lines = runs.ics_event(session).split("\r\n")
+        self.assertIn("SUMMARY:Sortie\\nLOCATION:ailleurs", lines)
+        self.assertFalse([line for line in lines if "\r" in line or "\n" in line])
+        self.assertEqual(sum(line.startswith("LOCATION:") for line in lines), 1)
+
+
+class _Recorder(notify.Channel):
+    def __init__(self):
+        self.sent = []
+        self.fail = False
+
+    def send(self, deliveries):
+        if self.fail:
+            raise RuntimeError("fournisseur indisponible")
+        self.sent.extend(deliveries)
+
+
+class _SecondRecorder(_Recorder):
+    pass
+
+
+@override_settings(NOTIFICATION_EAGER=False, NOTIFICATION_DELAY=0)
+class NotifyDrainTests(TestCase):
+    """Regroupement, préférences, et reprise d'un envoi partiel sur le seul canal en échec."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.a = User.objects.create_user("notif-a@runnr.local", "notif-a@runnr.local", "x")
+        cls.b = User.objects.create_user("notif-b@runnr.local", "notif-b@runnr.local", "x")
+        NotificationPreference.objects.create(user=cls.b, message=False)
+
+    def setUp(self):
+        self.first, self.second = _Recorder(), _SecondRecorder()
+        patcher = mock.patch.object(notify, "channels", lambda: [self.first, self.second])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _outcomes(self):
+        return sorted(Notification.objects.values_list("outcome", flat=True))
+
+    def test_groups_and_mutes(self):
+        notify.enqueue_many(
+            [(self.a.id, "message", "message:1", {"preview": f"m{i}"}) for i in range(3)]
+            + [(self.a.id, "match", "match", {"user_id": self.b.id})]
+            + [(self.b.id, "message", "message:1", {"preview": "chut"})] * 2
+        )
+        self.assertEqual(notify.drain(), (2, 6))
+        titles = sorted(d["title"] for d in self.first.sent)
+        self.assertEqual(titles, ["3 nouveaux messages", "Nouveau match !"])
+        self.assertEqual(self.second.sent, self.first.sent)
+        self.assertEqual(self._outcomes(), ["merged", "merged", "muted", "muted", "sent", "sent"])
+        self.assertEqual(notify.drain(), (0, 0))
+
+    def test_partial_failure_retries_only_the_failed_channel(self):
+        notify.enqueue_many([(self.a.id, "match", "match", {"user_id": self.b.id})])
+        self.second.fail = True
+        self.assertEqual(notify.drain(), (0, 0))
+        n = Notification.objects.get()
+        self.assertIsNone(n.sent_at)
+        self.assertEqual((n.attempts, n.delivered_to), (1, [notify._channel_name(self.first)]))
+        self.assertIn("fournisseur indisponible", n.last_error)
+
+        self.second.fail = False
+        self.assertEqual(notify.drain(), (0, 0))  # encore réclamé : pas de reprise avant CLAIM_TIMEOUT
+        Notification.objects.update(claimed_at=timezone.now() - notify.CLAIM_TIMEOUT - timedelta(seconds=1))
+        self.assertEqual(notify.drain(), (1, 1))
+        self.assertEqual(len(self.first.sent), 1)  # pas de renvoi sur le canal qui avait réussi
+        self.assertEqual(len(self.second.sent), 1)
+        self.assertEqual(self._outcomes(), ["sent"])
+
+
+class ImportRunnersTests(TestCase):
+    """Import CSV / JSONL : doublons (fichier et base, sans tenir compte de la casse), lignes invalides, hashs repris."""
+
+    def test_csv_duplicates_invalid_and_prehashed(self):
+        User.objects.create_user("oauth-foo", "Foo@Gmail.com", "x")  # compte OAuth, email en casse mixte
+        hashed = make_password("secret")
+        text = (
+            "email,first_name,last_name,level,speed_kmh,is_premium,password_hash\n"
+            "foo@gmail.com,Foo,Bar,beginner,10,0,\n"
+            f"new@runnr.local,Nouvelle,Coureuse,intermediate,11.5,oui,{hashed}\n"
+            "NEW@runnr.local,Doublon,,beginner,,,\n"
+            "pas-un-email,X,,,,,\n"
+            "lent@runnr.local,X,,expert,,,\n"
+            "vite@runnr.local,X,,,rapide,,\n"
+            "sans-mdp@runnr.local,Sans,,,,,\n"
+        )
+        stats = bulk.import_rows(bulk.read_rows(io.StringIO(text), "csv"))
+        self.assertEqual(stats, {"created": 2, "skipped": 2, "invalid": 3})
+        self.assertEqual(User.objects.filter(email__iexact="foo@gmail.com").count(), 1)
+        new = User.objects.select_related("profile").get(email="new@runnr.local")
+        self.assertTrue(new.check_password("secret"))
+        self.assertEqual((new.profile.level, new.profile.speed_kmh, new.profile.is_premium), ("intermediate", 11.5, True))
+        self.assertFalse(User.objects.get(email="sans-mdp@runnr.local").has_usable_password())
+
+    def test_jsonl_export_import_round_trip(self):
+        for i in range(3):
+            u = User.objects.create_user(f"rt-{i}@runnr.local", f"rt-{i}@runnr.local", f"mdp-{i}", first_name=f"R{i}")
+            Profile.objects.filter(user=u).update(
+                level="advanced", location_city="Lyon", speed_kmh=12 + i, is_premium=i == 1
+            )
+        text = "".join(json.dumps(row) + "\n" for row in bulk.export_rows(with_password_hashes=True))
+        before = [{k: v for k, v in row.items() if k not in ("id", "date_joined")} for row in bulk.export_rows()]
+
+        def run():
+            return bulk.import_rows(bulk.read_rows(io.StringIO(text), "jsonl"))
+
+        self.assertEqual(run(), {"created": 0, "skipped": 3, "invalid": 0})
+        User.objects.all().delete()
+        self.assertEqual(run(), {"created": 3, "skipped": 0, "invalid": 0})
+
+        after = [{k: v for k, v in row.items() if k not in ("id", "date_joined")} for row in bulk.export_rows()]
+        self.assertEqual(after, before)
+        self.assertTrue(User.objects.get(email="rt-2@runnr.local").check_password("mdp-2"))
+
+
+class ChatTests(TestCase):
+    """Pagination par curseur (historique, liste fusionnée des deux côtés), non-lus, envoi bloqué."""
+
+    @classmethod
+    def setUpTestData(cls):
+        before = User.objects.bulk_create([User(username=f"avant-{i}@runnr.local") for i in range(4)])
+        cls.me = User.objects.create_user("chat@runnr.local", "chat@runnr.local", "x")
+        after = User.objects.bulk_create([User(username=f"apres-{i}@runnr.local") for i in range(4)])
+        Profile.objects.bulk_create([Profile(user=u) for u in before + after])
+        # côté user_b avec les premiers, user_a avec les suivants
+        chat.open_conversations(cls.me.id, [u.id for u in before + after])
+        base = timezone.now()
+        minutes = [0, 3, 1, 1, 3, 2, 1, 4]  # ex aequo répartis sur les deux côtés : départage par id
+        convs = list(Conversation.objects.order_by("id"))
+        for conv, m in zip(convs, minutes):
+            Conversation.objects.filter(pk=conv.pk).update(last_message_at=base - timedelta(minutes=m))
+        cls.expected = [
+            c.id for c in sorted(Conversation.objects.all(), key=lambda c: (c.last_message_at, c.id), reverse=True)
+        ]
+
+    def setUp(self):
+        exclusions.clear()
+        caches["profiles"].clear()
+
+    def test_inbox_pages_cover_every_conversation_once(self):
+        for limit in (1, 2, 3, 8, 20):
+            seen, cursor = [], None
+            while True:
+                page, raw = chat.inbox(self.me.id, cursor, limit)
+                seen += [c.id for c in page]
+                if raw is None:
+                    break
+                cursor = chat.decode_cursor(raw)
+            self.assertEqual(seen, self.expected, f"limit={limit}")
+
+    def test_inbox_view_follows_cursor(self):
+        client = _jwt_client(self.me)
+        seen, url = [], "/api/conversations?limit=3"
+        while url:
+            body = client.get(url).json()
+            seen += [r["id"] for r in body["results"]]
+            url = f"/api/conversations?limit=3&cursor={body['next_cursor']}" if body["next_cursor"] else None
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(client.get("/api/conversations?cursor=abc").status_code, 400)
+
+    def test_history_pages_with_before(self):
+        conv = Conversation.objects.get(pk=self.expected[0])
+        other = conv.other_id(self.me.id)
+        sent = [chat.send(conv, self.me.id if i % 2 else other, f"message {i}")["id"] for i in range(7)]
+        client = _jwt_client(self.me)
+        seen, url = [], f"/api/conversations/{conv.id}/messages?limit=3"
+        while url:
+            body = client.get(url).json()
+            seen += [m["id"] for m in body["results"]]
+            cursor = body["next_cursor"]
+            url = f"/api/conversations/{conv.id}/messages?limit=3&before={cursor}" if cursor else None
+        self.assertEqual(seen, sent[::-1])
+
+    def test_unread_counters(self):
+        conv = Conversation.objects.get(pk=self.expected[0])
+        other = conv.other_id(self.me.id)
+        for i in range(2):
+            chat.send(conv, other, f"salut {i}")
+        chat.send(conv, self.me.id, "salut")
+        conv.refresh_from_db()
+        self.assertEqual((conv.unread_for(self.me.id), conv.unread_for(other)), (2, 1))
+        resp = _jwt_client(self.me).post(f"/api/conversations/{conv.id}/read")
+        self.assertEqual(resp.status_code, 200)
+        conv.refresh_from_db()
+        self.assertEqual((conv.unread_for(self.me.id), conv.unread_for(other)), (0, 1))
+        self.assertEqual(conv.last_message_preview, "salut")
+        self.assertEqual(conv.last_sender_id, self.me.id)
+
+    def test_send_to_blocked_is_refused(self):
+        conv = Conversation.objects.get(pk=self.expected[0])
+        Block.objects.create(blocker_id=conv.other_id(self.me.id), blocked=self.me)
+        resp = _jwt_client(self.me).post(
+            f"/api/conversations/{conv.id}/send", {"body": "tu es là ?"}, content_type="application/json"
+        )
+        self.assertEqual(resp.status_code, 403)
+        self.assertFalse(Message.objects.filter(conversation=conv).exists())
+
+
+class PhotoAssignTests(TestCase):
+    """L'affectation d'une photo traitée ne touche que `photo` et publie une nouvelle version du profil."""
+
+    def test_assign_keeps_concurrent_edits(self):
+        user = User.objects.create_user("photo@runnr.local", "photo@runnr.local", "x")
+        before = profile_cache.get(user.id)
+        # édition faite pendant le rendu des variantes
+        Profile.objects.filter(user=user).update(goals="sub 40 au 10k")
+        sha = "ab" * 32
+        photos._assign(sha, user.id)
+        p = Profile.objects.get(user=user)
+        self.assertEqual((p.photo, p.goals), (sha, "sub 40 au 10k"))
+        after = profile_cache.get(user.id)
+        self.assertEqual(after["photo"], photos.urls(sha))
+        self.assertNotEqual(after["version"], before["version"])
+        with self.assertNumQueries(1):  # déjà affectée : UPDATE sans effet, cache conservé
+            photos._assign(sha, user.id)
+        self.assertEqual(profile_cache.get(user.id), after)
+
+
+@override_settings(ACCOUNT_PURGE_EAGER=False)
+class PurgeResumeTests(TransactionTestCase):
+    """
+    Purge par lots réellement commités : un worker arrêté en route est relayé
+    après CLAIM_TIMEOUT et le compte finit entièrement purgé, photo comprise.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="runnr-test-photos-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.enterContext(override_settings(PHOTO_ROOT=self.root))
+        self.heavy = User.objects.create_user("lourd@runnr.local", "lourd@runnr.local", "x")
+        self.others = User.objects.bulk_create([User(username=f"autre-{i}@runnr.local") for i in range(40)])
+        Profile.objects.bulk_create([Profile(user=u) for u in self.others])
+        other_ids = [u.id for u in self.others]
+        chat.open_conversations(self.heavy.id, other_ids[:20])
+        convs = list(Conversation.objects.all())
+        Message.objects.bulk_create(
+            [Message(conversation=c, sender_id=self.heavy.id, body=f"message {i}") for c in convs for i in range(30)]
+        )
+        # témoin : conversation entre deux autres comptes
+        chat.open_conversations(other_ids[0], [other_ids[1]])
+        self.witness = Conversation.objects.exclude(pk__in=[c.pk for c in convs]).get()
+        Message.objects.create(conversation=self.witness, sender_id=other_ids[0], body="témoin")
+        Swipe.objects.bulk_create(
+            [Swipe(swiper_id=self.heavy.id, target_id=o, liked=True) for o in other_ids]
+            + [Swipe(swiper_id=o, target_id=self.heavy.id, liked=True) for o in other_ids]
+        )
+        Block.objects.bulk_create([Block(blocker_id=self.heavy.id, blocked_id=o) for o in other_ids[20:]])
+        starts = timezone.now() + timedelta(days=1)
+        runs.create(self.heavy, title="Sortie du lourd", starts_at=starts, capacity=10)
+        self.other_session = runs.create(self.others[0], title="Sortie d'un autre", starts_at=starts, capacity=10)
+        runs.join(self.other_session.id, self.heavy.id)
+        Notification.objects.bulk_create(
+            [Notification(user_id=self.heavy.id, kind="message", group_key=f"message:{i}") for i in range(30)]
+        )
+
+    def _photo(self, user):
+        sha = f"{user.id:064x}"
+        files = [photos.original_path(sha)] + [
+            photos.variant_path(sha, s, ext) for s in photos.sizes() for ext, _, _ in photos.VARIANT_FORMATS
+        ]
+        for path in files:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "wb").close()
+        Profile.objects.filter(user=user).update(photo=sha)
+        return sha, files
+
+    def _assert_purged(self, user_id):
+        self.assertFalse(User.objects.filter(pk=user_id).exists())
+        self.assertFalse(Conversation.objects.filter(Q(user_a_id=user_id) | Q(user_b_id=user_id)).exists())
+        self.assertFalse(Message.objects.filter(sender_id=user_id).exists())
+        self.assertFalse(Swipe.objects.filter(Q(swiper_id=user_id) | Q(target_id=user_id)).exists())
+        self.assertFalse(Block.objects.filter(Q(blocker_id=user_id) | Q(blocked_id=user_id)).exists())
+        self.assertFalse(Participation.objects.filter(user_id=user_id).exists())
+        self.assertFalse(RunSession.objects.filter(organizer_id=user_id).exists())
+        self.assertFalse(Notification.objects.filter(user_id=user_id).exists())
+
+    def test_interrupted_purge_resumes_to_completion(self):
+        sha, files = self._photo(self.heavy)
+        purge.schedule(self.heavy)
+        self.assertFalse(Profile.objects.filter(user=self.heavy).exists())
+
+        self.assertEqual(purge.run(batch_size=50, max_batches=10), 0)  # worker arrêté en route
+        job = AccountDeletion.objects.get(user_id=self.heavy.id)
+        self.assertIsNone(job.finished_at)
+        self.assertGreater(job.purged, 0)
+        self.assertTrue(Message.objects.filter(sender_id=self.heavy.id).exists())
+        self.assertEqual(purge.run(batch_size=50), 0)  # encore réclamé : pas de second worker
+
+        AccountDeletion.objects.filter(pk=job.pk).update(claimed_at=timezone.now() - purge.CLAIM_TIMEOUT * 2)
+        self.assertEqual(purge.run(batch_size=50), 1)
+
+        job.refresh_from_db()
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual((job.stage, job.photo), ("user", ""))
+        self._assert_purged(self.heavy.id)
+        self.assertFalse(any(os.path.exists(f) for f in files))
+        # autres comptes intacts ; la place prise dans la sortie d'un autre est rendue
+        self.assertTrue(Message.objects.filter(conversation=self.witness).exists())
+        self.assertEqual(Profile.objects.filter(user__in=self.others).count(), len(self.others))
+        self.other_session.refresh_from_db()
+        self.assertEqual(self.other_session.taken, 1)
+
+    def test_shared_photo_is_kept(self):
+        sha, files = self._photo(self.heavy)
+        Profile.objects.filter(user=self.others[0]).update(photo=sha)  # même contenu uploadé par un autre
+        purge.schedule(self.heavy)
+        self.assertEqual(purge.run(batch_size=500), 1)
+        self._assert_purged(self.heavy.id)
+        self.assertTrue(all(os.path.exists(f) for f in files))
+
+
+class FeedExclusionTests(TestCase):
+    """Déjà swipés exclus du flux sans relire tous les swipes à chaque page ; cibles désactivées refusées."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("flux@runnr.local", "flux@runnr.local", "x")
+        runners = User.objects.bulk_create([User(username=f"flux-{i}@runnr.local") for i in range(30)])
+        Profile.objects.bulk_create([Profile(user=u, location_city="Lyon") for u in runners])
+        Profile.objects.filter(user=cls.user).update(location_city="Lyon")
+        cls.ids = [u.id for u in runners]
+        Swipe.objects.bulk_create([Swipe(swiper=cls.user, target_id=t, liked=False) for t in cls.ids[:10]])
+
+    def setUp(self):
+        caches["profiles"].clear()
+        exclusions.clear()
+        feed.index.invalidate()
+        self.client = _jwt_client(self.user)
+
+    def _feed(self):
+        resp = self.client.get("/api/feed?limit=50&level=&city=")
+        self.assertEqual(resp.status_code, 200)
+        return [r["id"] for r in resp.json()["results"]]
+
+    def test_swiped_excluded_and_cache_updated_after_commit(self):
+        self.assertEqual(self._feed(), self.ids[10:])
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post("/api/swipe", {"target_id": self.ids[10], "like": False}, content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(self.ids[10], exclusions.for_feed(self.user.id))
+        self.assertEqual(self._feed(), self.ids[11:])
+
+    def test_swipe_from_another_worker_is_dropped_from_the_page(self):
+        self._feed()  # tableau des swipés en cache
+        Swipe.objects.create(swiper=self.user, target_id=self.ids[10], liked=False)  # add_swiped jamais appelé ici
+        self.assertNotIn(self.ids[10], exclusions.for_feed(self.user.id))
+        self.assertEqual(self._feed(), self.ids[11:])
+
+    def test_inactive_target_is_invalid(self):
+        User.objects.filter(pk=self.ids[20]).update(is_active=False)
+        resp = self.client.post("/api/swipe", {"target_id": self.ids[20], "like": False}, content_type="application/json")
+        self.assertEqual(resp.status_code, 404)
+        self.assertFalse(Swipe.objects.filter(swiper=self.user, target_id=self.ids[20]).exists())
+
+
+class SwipeQuotaConcurrencyTests(TransactionTestCase):
+    """Un like envoyé plusieurs fois en même temps : un seul swipe, un seul like décompté."""
+
+    def test_concurrent_double_submit_burns_one_like(self):
+        caches["default"].clear()
+        exclusions.clear()
+        user = User.objects.create_user("double@runnr.local", "double@runnr.local", "x")
+        target = User.objects.create_user("cible@runnr.local", "cible@runnr.local", "x")
+
+        results = _in_threads(8, lambda i: _apply_swipes(user, [(target.id, True)])[0][0]["status"])
+
+        self.assertEqual(sorted(results), ["already"] * 7 + ["ok"])
+        self.assertEqual(Swipe.objects.filter(swiper=user, target=target).count(), 1)
+        self.assertEqual(quotas.remaining(user.id), quotas.daily_limit() - 1)
+
+
+@override_settings(BOOST_SLOTS=2)
+class FeedBoostTests(TestCase):
+    """Boostés du flux : mêmes profils pour un même (lecteur, curseur), jamais répétés d'une page à l'autre."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("boost@runnr.local", "boost@runnr.local", "x")
+        runners = User.objects.bulk_create([User(username=f"boost-{i}@runnr.local") for i in range(40)])
+        Profile.objects.bulk_create([Profile(user=u, location_city="Lyon") for u in runners])
+        for u in runners[-6:]:  # en fin de flux : montrés en boostés bien avant leur place organique
+            boost.activate(u.id)
+
+    def setUp(self):
+        caches["profiles"].clear()
+        exclusions.clear()
+        feed.index.invalidate()
+        boost.table.invalidate()
+        self.client = _jwt_client(self.user)
+
+    def _page(self, cursor=None):
+        url = "/api/feed?limit=5&level=&city=" + (f"&cursor={cursor}" if cursor else "")
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def test_stable_for_same_cursor_and_no_repeat_across_pages(self):
+        shown, boosted, cursor = [], [], None
+        while True:
+            body = self._page(cursor)
+            self.assertEqual(self._page(cursor), body)  # rechargement : même page
+            shown += [r["id"] for r in body["results"]]
+            boosted += [r["id"] for r in body["results"] if r["boosted"]]
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(len(boosted), 6)
+        self.assertEqual(len(shown), len(set(shown)))  # ni boosté deux fois, ni revu en organique
+        self.assertEqual(len(shown), 40)
+
+
+@override_settings(EXCLUSION_CACHE_IDS=30)
+class ExclusionCacheBudgetTests(TestCase):
+    """LRU des exclusions borné en ids gardés au total, pas seulement en utilisateurs."""
+
+    @classmethod
+    def setUpTestData(cls):
+        others = User.objects.bulk_create([User(username=f"bloque-{i}@runnr.local") for i in range(40)])
+        cls.a, cls.b, cls.c = (User.objects.create_user(f"{n}@runnr.local") for n in "abc")
+        Block.objects.bulk_create(
+            [Block(blocker=cls.a, blocked=u) for u in others[:20]]
+            + [Block(blocker=cls.b, blocked=u) for u in others[20:]]
+            + [Block(blocker=cls.c, blocked=u) for u in others]
+        )
+        cls.others = [u.id for u in others]
+
+    def setUp(self):
+        exclusions.clear()
+        self.addCleanup(exclusions.clear)
+
+    def test_oldest_evicted_and_oversized_not_kept(self):
+        exclusions.for_user(self.a.id)
+        exclusions.for_user(self.b.id)
+        self.assertEqual(list(exclusions._sets), [self.b.id])  # 20 + 20 > 30 : le plus ancien sort
+        self.assertEqual(exclusions._stored, 20)
+
+        excl = exclusions.for_user(self.c.id)  # 40 ids : servi mais pas gardé
+        self.assertEqual(excl.filter(self.others), [])
+        self.assertNotIn(self.c.id, exclusions._sets)
+        self.assertEqual(exclusions._stored, 20)
+
+        exclusions.invalidate(self.b.id)
+        self.assertEqual(exclusions._stored, 0)
+
+
+class BlockUserTests(TestCase):
+    def test_deactivated_account_cannot_be_blocked(self):
+        me = User.objects.create_user("bloqueur@runnr.local", "bloqueur@runnr.local", "x")
+        gone = User.objects.create_user("parti@runnr.local", "parti@runnr.local", "x")
+        User.objects.filter(pk=gone.pk).update(is_active=False)  # comme purge.schedule
+        resp = _jwt_client(me).post(f"/api/users/{gone.id}/block")
+        self.assertEqual(resp.status_code, 404)
+        self.assertFalse(Block.objects.exists())
@@ -1,71 +1,40 @@
 import os, urllib.parse, json
-from django.http import HttpResponseRedirect, JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.contrib.auth import login, logout, authenticate, get_user_model
 from django.views.decorators.http import require_GET
+from django.views.static import serve
 from django.conf import settings
-from django.shortcuts import redirect
-from social_django.utils import load_strategy, load_backend
-from social_core.exceptions import AuthCanceled
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.exceptions import AuthenticationFailed
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes
+from django.utils.cache import parse_etags
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.db import transaction
 from django.contrib.auth.tokens import default_token_generator
-from .models import Profile
-from .auth import CsrfExemptSessionAuthentication
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from .models import Block, NotificationPreference, Profile, RunSession, Swipe
+from .auth import CsrfExemptSessionAuthentication, CookieJWTAuthentication, issue_tokens
+from .routers import replica_reads
+from . import chat, completion, feed, ratelimit, geo, similarity, quotas, profile_cache, mailqueue, push, purge, photos, runs, exclusions, boost, notify
 
 # FRONTEND_URL pour rediriger après login
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
 User = get_user_model()
 
-@require_GET
-def google_login(request):
-    """
-    Démarre l’OAuth Google (Authorization Code Flow côté serveur).
-    """
-    strategy = load_strategy(request)
-    backend = load_backend(strategy=strategy, name="google-oauth2", redirect_uri=_callback_url(request))
-    # Redirection vers Google
-    authorization_url = backend.auth_url()
-    return HttpResponseRedirect(authorization_url)
-
-def _callback_url(request):
-    base = request.build_absolute_uri("/auth/google/callback")
-    return base
-
-@require_GET
-def google_callback_dispatch(request):
-    """
-    Callback Google -> crée/connexion de l'utilisateur, émet des JWT,
-    les met en cookies httpOnly et redirige vers le frontend.
-    """
-    strategy = load_strategy(request)
-    backend = load_backend(strategy=strategy, name="google-oauth2", redirect_uri=_callback_url(request))
-
-    try:
-        user = backend.complete()  # échange code -> token, récupère le profil, crée/associe User
-        login(request, user)      # session Django (facultatif si tu n’utilises que JWT)
-    except AuthCanceled:
-        # L’utilisateur a annulé → retour propre au front
-        return redirect(f"{FRONTEND_URL}/signin?error=cancelled")
-
-    # Générer les JWT
-    refresh = RefreshToken.for_user(user)
-    access = str(refresh.access_token)
-
-    # Déposer en cookies httpOnly (recommandé)
-    response = redirect(f"{FRONTEND_URL}/dashboard")
+def _set_jwt_cookies(response, user):
+    """Cookies lus par StatelessJWTAuthentication (chemin rapide sans DB)."""
+    refresh = issue_tokens(user)
     response.set_cookie(
         key="access_token",
-        value=access,
+        value=str(refresh.access_token),
         httponly=True,
         secure=False,  # True en prod (HTTPS)
         samesite="Lax",
-        max_age=60*60,
+        max_age=int(settings.SIMPLE_JWT["ACCESS_TOKEN_LIFETIME"].total_seconds()),
     )
     response.set_cookie(
         key="refresh_token",
@@ -73,70 +42,79 @@ def google_callback_dispatch(request):
         httponly=True,
         secure=False,  # True en prod
         samesite="Lax",
-        max_age=60*60*24*7,
+        max_age=int(settings.SIMPLE_JWT["REFRESH_TOKEN_LIFETIME"].total_seconds()),
     )
     return response
 
-# ---- Facebook OAuth ----
-@require_GET
-def facebook_login(request):
-    strategy = load_strategy(request)
-    backend = load_backend(strategy=strategy, name="facebook", redirect_uri=_callback_url_fb(request))
-    return HttpResponseRedirect(backend.auth_url())
-
-def _callback_url_fb(request):
-    return request.build_absolute_uri("/auth/facebook/callback")
+def _too_many(retry_after):
+    resp = Response(ratelimit.limited_payload(retry_after), status=429)
+    resp["Retry-After"] = str(retry_after)
+    return resp
 
-@require_GET
-def facebook_callback_dispatch(request):
-    strategy = load_strategy(request)
-    backend = load_backend(strategy=strategy, name="facebook", redirect_uri=_callback_url_fb(request))
+def _profile_of(user):
+    """
+    Profil de l'utilisateur courant, sans requête si `user.profile` a déjà été
+    chargé (cf. ProfileModelBackend), une seule sinon. Nécessite un vrai User.
+    """
     try:
-        user = backend.complete()
-        login(request, user)
-    except AuthCanceled:
-        return redirect(f"{FRONTEND_URL}/signin?error=cancelled")
-    return redirect(f"{FRONTEND_URL}/dashboard")
+        return user.profile
+    except Profile.DoesNotExist:
+        # comptes créés avant le signal create_profile_on_user_create
+        p, _ = Profile.objects.get_or_create(user=user)
+        return p
 
-# ---- Apple OAuth ----
-@require_GET
-def apple_login(request):
-    strategy = load_strategy(request)
-    backend = load_backend(strategy=strategy, name="apple-id", redirect_uri=_callback_url_apple(request))
-    return HttpResponseRedirect(backend.auth_url())
+def _own_record(user):
+    """
+    Enregistrement profil (cf. profile_cache) de l'appelant. Ne lit que
+    `user.id` : fonctionne aussi avec le RunnrTokenUser du chemin JWT.
+    """
+    rec = profile_cache.get(user.id)
+    if rec is None:
+        # JWT encore valide d'un compte supprimé : ne pas lui recréer de profil
+        if not User.objects.filter(pk=user.id, is_active=True).exists():
+            raise AuthenticationFailed("compte désactivé")
+        Profile.objects.get_or_create(user_id=user.id)  # comptes antérieurs au signal
+        rec = profile_cache.get(user.id)
+    return rec
 
-def _callback_url_apple(request):
-    return request.build_absolute_uri("/auth/apple/callback")
+# ---- GET conditionnels ----
+def _etag(*parts):
+    return '"' + "-".join(str(p) for p in parts) + '"'
 
-@require_GET
-def apple_callback_dispatch(request):
-    strategy = load_strategy(request)
-    backend = load_backend(strategy=strategy, name="apple-id", redirect_uri=_callback_url_apple(request))
-    try:
-        user = backend.complete()
-        login(request, user)
-    except AuthCanceled:
-        return redirect(f"{FRONTEND_URL}/signin?error=cancelled")
-    return redirect(f"{FRONTEND_URL}/dashboard")
+def _conditional(request, etag, build):
+    """
+    Répond 304 si If-None-Match correspond à `etag`, sans appeler `build` ;
+    sinon sérialise via `build()`. Les navigateurs revalident à chaque appel.
+    """
+    header = request.META.get("HTTP_IF_NONE_MATCH")
+    if header and (header.strip() == "*" or etag in parse_etags(header)):
+        resp = Response(status=304)
+    else:
+        resp = Response(build())
+    resp["ETag"] = etag
+    resp["Cache-Control"] = "private, no-cache"
+    return resp
 
+@replica_reads
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def me(request):
     u = request.user
-    # Ensure profile exists
-    Profile.objects.get_or_create(user=u)
-    info = u.profile.completion_info()
-    return Response({
-        "id": u.id,
-        "email": u.email,
-        "name": u.get_full_name() or u.username,
-        "profile_completion": info["percent"],
-        "profile_missing": info["missing"],
-    })
+    rec = _own_record(u)
+
+    def build():
+        return {
+            "id": u.id,
+            "email": u.email,
+            "name": rec["name"],
+            "profile_completion": rec["completion"],
+            "profile_missing": rec["missing"],
+        }
+    return _conditional(request, _etag("me", u.id, rec["version"]), build)
 
 @csrf_exempt
 @api_view(["POST"])  # POC: pas de CSRF exigé
-@authentication_classes([CsrfExemptSessionAuthentication, JWTAuthentication])
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
 @permission_classes([AllowAny])
 def logout_view(request):
     # Efface les cookies côté client
@@ -147,9 +125,16 @@ def logout_view(request):
     return resp
 
 # ---- Email/password sign-up & login ----
+def _split_name(name):
+    """Tenter de découper prénom/nom simplement."""
+    parts = name.split(" ", 1)
+    if len(parts) == 2:
+        return parts[0], parts[1]
+    return name, ""
+
 @csrf_exempt
 @api_view(["POST"])  # POC: CSRF exempt pour simplicité front
-@authentication_classes([CsrfExemptSessionAuthentication, JWTAuthentication])
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
 @permission_classes([AllowAny])
 def register_email(request):
     data = getattr(request, "data", None) or (json.loads(request.body or b"{}"))
@@ -158,58 +143,60 @@ def register_email(request):
     name = (data.get("name") or "").strip()
     if not email or not password:
         return Response({"error": "email et mot de passe requis"}, status=400)
+    retry = ratelimit.check("register", request)
+    if retry:
+        return _too_many(retry)
     if User.objects.filter(email=email).exists():
         return Response({"error": "email déjà utilisé"}, status=400)
+    first_name, last_name = _split_name(name)
     try:
-        user = User.objects.create_user(username=email, email=email, password=password)
+        user = User.objects.create_user(
+            username=email, email=email, password=password, first_name=first_name, last_name=last_name
+        )
     except Exception as e:
         return Response({"error": "création utilisateur impossible"}, status=500)
-    if name:
-        # Tenter de découper prénom/nom simplement
-        parts = name.split(" ", 1)
-        if len(parts) == 2:
-            user.first_name, user.last_name = parts[0], parts[1]
-        else:
-            user.first_name = name
-        user.save()
-    # Crée un profil vide associé
-    Profile.objects.get_or_create(user=user)
-    login(request, user)
-    return Response({"ok": True, "email": user.email})
+    # le profil vide est créé par le signal post_save de User
+    login(request, user, backend="authapp.auth.ProfileModelBackend")
+    return _set_jwt_cookies(Response({"ok": True, "email": user.email}), user)
 
 @csrf_exempt
 @api_view(["POST"])  # POC: CSRF exempt
-@authentication_classes([CsrfExemptSessionAuthentication, JWTAuthentication])
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
 @permission_classes([AllowAny])
 def login_email(request):
     data = getattr(request, "data", None) or (json.loads(request.body or b"{}"))
     identifier = (data.get("email") or "").strip()  # peut être email OU username
     email_lower = identifier.lower()
     password = data.get("password") or ""
-    # 1) tenter comme username direct (permet la connexion avec "admin")
-    user = authenticate(request, username=identifier, password=password)
-    # 2) sinon, tenter par email → username
-    if not user:
-        try:
-            u = User.objects.get(email=email_lower)
-            user = authenticate(request, username=u.username, password=password)
-        except User.DoesNotExist:
-            user = None
+    # refus avant tout hachage
+    retry = ratelimit.check("login", request, identifier)
+    if retry:
+        return _too_many(retry)
+    # username direct (permet la connexion avec "admin"), sinon email → username ;
+    # un seul authenticate, donc un seul hachage PBKDF2 (même sans compte)
+    u = (
+        User.objects.filter(username=identifier).only("username").first()
+        or User.objects.filter(email=email_lower).only("username").first()
+    )
+    user = authenticate(request, username=u.username if u else identifier, password=password)
     if not user:
         return Response({"error": "identifiants invalides"}, status=400)
     login(request, user)
-    return Response({"ok": True})
+    return _set_jwt_cookies(Response({"ok": True}), user)
 
 # ---- Password reset ----
 @csrf_exempt
 @api_view(["POST"])  # POC: CSRF exempt
-@authentication_classes([CsrfExemptSessionAuthentication, JWTAuthentication])
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
 @permission_classes([AllowAny])
 def request_password_reset(request):
     data = json.loads(request.body or b"{}")
     email = (data.get("email") or "").strip().lower()
     if not email:
         return Response({"error": "email requis"}, status=400)
+    retry = ratelimit.check("password_reset", request, email)
+    if retry:
+        return _too_many(retry)
     try:
         user = User.objects.get(email=email)
     except User.DoesNotExist:
@@ -218,20 +205,17 @@ def request_password_reset(request):
     uid = urlsafe_base64_encode(force_bytes(user.pk))
     token = default_token_generator.make_token(user)
     reset_url = f"{FRONTEND_URL}/reset/confirm?uid={uid}&token={token}"
-    # En dev, l'email part vers la console
-    from django.core.mail import send_mail
-    send_mail(
+    # Mis en file : envoyé hors requête par drain_outbox (console en dev)
+    mailqueue.enqueue(
         subject="Réinitialisation de mot de passe",
-        message=f"Clique sur ce lien pour réinitialiser ton mot de passe: {reset_url}",
-        from_email=None,
-        recipient_list=[email],
-        fail_silently=True,
+        body=f"Clique sur ce lien pour réinitialiser ton mot de passe: {reset_url}",
+        recipients=[email],
     )
     return Response({"ok": True})
 
 @csrf_exempt
 @api_view(["POST"])  # POC: CSRF exempt
-@authentication_classes([CsrfExemptSessionAuthentication, JWTAuthentication])
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
 @permission_classes([AllowAny])
 def reset_password_confirm(request):
     data = json.loads(request.body or b"{}")
@@ -240,6 +224,9 @@ def reset_password_confirm(request):
     new_password = data.get("password") or ""
     if not (uidb64 and token and new_password):
         return Response({"error": "données incomplètes"}, status=400)
+    retry = ratelimit.check("password_reset_confirm", request)
+    if retry:
+        return _too_many(retry)
     try:
         uid = urlsafe_base64_decode(uidb64).decode()
         user = User.objects.get(pk=uid)
@@ -252,27 +239,26 @@ def reset_password_confirm(request):
     return Response({"ok": True})
 
 # ---- Profile read/update ----
+PROFILE_FIELDS = (
+    "level", "location_city", "goals", "availability_week", "availability_weekend", "completion", "missing", "photo",
+    "paused", "hidden",
+)
+
+@replica_reads
 @api_view(["GET"])  # infos profil + complétion
 @permission_classes([IsAuthenticated])
 def profile_get(request):
-    p, _ = Profile.objects.get_or_create(user=request.user)
-    info = p.completion_info()
-    return Response({
-        "level": p.level,
-        "location_city": p.location_city,
-        "goals": p.goals,
-        "availability_week": p.availability_week,
-        "availability_weekend": p.availability_weekend,
-        "completion": info["percent"],
-        "missing": info["missing"],
-    })
+    rec = _own_record(request.user)
+    return _conditional(
+        request, _etag("profile", rec["id"], rec["version"]), lambda: {k: rec[k] for k in PROFILE_FIELDS}
+    )
 
 @csrf_exempt
 @api_view(["PATCH", "POST"])  # CSRF exempt à ce niveau (POC)
-@authentication_classes([CsrfExemptSessionAuthentication, JWTAuthentication])
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def profile_update(request):
-    p, _ = Profile.objects.get_or_create(user=request.user)
+    p = _profile_of(request.user)
     try:
         data = json.loads(request.body or b"{}")
     except Exception:
@@ -300,26 +286,664 @@ def profile_update(request):
             p.speed_kmh = float(val) if val not in (None, "") else None
         except (TypeError, ValueError):
             return Response({"error": "speed_kmh invalide"}, status=400)
+    # Visibilité
+    if "paused" in data:
+        p.paused = bool(data.get("paused"))
+    if "hidden" in data:
+        try:
+            p.set_hidden(data.get("hidden") or [])
+        except (TypeError, ValueError) as e:
+            return Response({"error": str(e) if isinstance(e, ValueError) else "hidden invalide"}, status=400)
     p.save()
-    info = p.completion_info()
-    return Response({"ok": True, "completion": info["percent"], "missing": info["missing"]})
+    rec = profile_cache.put(p)  # réchauffe le cache invalidé par le post_save
+    return Response({"ok": True, "completion": rec["completion"], "missing": rec["missing"]})
+
+# ---- Mise en avant (Premium) ----
+@csrf_exempt
+@api_view(["POST"])  # BOOST_DURATION secondes de mise en avant dans le flux (cf. boost.py)
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def profile_boost(request):
+    if not _profile_of(request.user).is_premium:
+        return Response({"error": "réservé aux comptes Premium"}, status=403)
+    try:
+        b = boost.activate(request.user.id)
+    except boost.AlreadyBoosted as e:
+        return Response({"error": "mise en avant déjà en cours", "expires_at": e.expires_at.isoformat()}, status=409)
+    return Response({"ok": True, "expires_at": b.expires_at.isoformat()}, status=201)
+
+# ---- Photo de profil ----
+@csrf_exempt
+@api_view(["POST"])  # multipart, champ "photo" : streamé sur disque, variantes en arrière-plan (cf. photos.py)
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def profile_photo_upload(request):
+    handler = photos.HashingUploadHandler(request)
+    request.upload_handlers = [handler]  # avant toute lecture du corps
+    files = request.FILES
+    upload = files.get("photo")
+    for name, f in files.items():
+        if name != "photo":
+            photos.discard(f)
+    if handler.too_large:
+        return Response({"error": "photo trop lourde"}, status=413)
+    if upload is None:
+        return Response({"error": "champ photo manquant"}, status=400)
+    try:
+        sha = photos.store(upload)
+    except photos.PhotoError as e:
+        return Response({"error": str(e)}, status=400)
+    if photos.is_ready(sha):
+        photos.assign_now(sha, request.user.id)
+        return Response({"ok": True, "status": "ready", "photo": photos.urls(sha)})
+    photos.submit(sha, request.user.id)
+    return Response({"ok": True, "status": "processing", "photo": photos.urls(sha)}, status=202)
+
+PHOTO_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@require_GET
+def photo_file(request, path):
+    """Variantes (URLs adressées par contenu). En prod, le serveur web sert PHOTO_ROOT/v directement."""
+    resp = serve(request, path, document_root=os.path.join(photos.root(), "v"))
+    resp["Cache-Control"] = PHOTO_CACHE_CONTROL
+    return resp
+
+# ---- Suppression de compte ----
+@csrf_exempt
+@api_view(["POST"])  # compte désactivé tout de suite, données purgées en arrière-plan (cf. purge.py)
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def account_delete(request):
+    purge.schedule(request.user)
+    resp = Response({"ok": True, "status": "scheduled"}, status=202)
+    resp.delete_cookie("access_token")
+    resp.delete_cookie("refresh_token")
+    logout(request)
+    return resp
+
+# ---- Blocages ----
+BLOCKS_PAGE_MAX = 500
+
+@csrf_exempt
+@api_view(["POST"])  # il disparaît de mes résultats, et moi des siens ; plus de messages
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def block_user(request, user_id: int):
+    # compte désactivé (suppression en cours) : introuvable, pas de Block recréé derrière la purge
+    if user_id == request.user.id or not User.objects.filter(pk=user_id, is_active=True).exists():
+        return Response({"error": "utilisateur introuvable"}, status=404)
+    created = exclusions.block(request.user.id, user_id)
+    return Response({"ok": True, "blocked": True}, status=201 if created else 200)
+
+@csrf_exempt
+@api_view(["POST"])
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def unblock_user(request, user_id: int):
+    exclusions.unblock(request.user.id, user_id)
+    return Response({"ok": True, "blocked": False})
+
+@api_view(["GET"])  # mes blocages par id croissant : ?after=<user_id>&limit=
+@permission_classes([IsAuthenticated])
+def blocks_list(request):
+    qp = request.query_params
+    try:
+        after = int(qp.get("after") or 0)
+        limit = max(1, min(int(qp.get("limit") or 100), BLOCKS_PAGE_MAX))
+    except ValueError:
+        return Response({"error": "paramètres invalides"}, status=400)
+    ids = list(
+        Block.objects.filter(blocker_id=request.user.id, blocked_id__gt=after)
+        .order_by("blocked_id").values_list("blocked_id", flat=True)[:limit]
+    )
+    return Response({"results": ids, "next_cursor": ids[-1] if len(ids) == limit else None})
+
+# ---- Préférences de notification ----
+def _notification_prefs(user_id):
+    p = NotificationPreference.objects.filter(user_id=user_id).values(*NotificationPreference.KINDS).first()
+    return p or dict.fromkeys(NotificationPreference.KINDS, True)
+
+@api_view(["GET"])  # {"match": true, "message": true, "session_reminder": true}
+@permission_classes([IsAuthenticated])
+def notification_preferences(request):
+    return Response(_notification_prefs(request.user.id))
+
+@csrf_exempt
+@api_view(["POST"])  # champs partiels ; appliqués par le worker (cf. notify.py), aucune lecture dans les vues chaudes
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def notification_preferences_update(request):
+    try:
+        data = json.loads(request.body or b"{}")
+        changes = {k: data[k] for k in NotificationPreference.KINDS if k in data}
+    except (TypeError, ValueError):
+        return Response({"error": "préférences invalides"}, status=400)
+    if any(not isinstance(v, bool) for v in changes.values()):
+        return Response({"error": "valeurs booléennes attendues"}, status=400)
+    if changes:
+        NotificationPreference.objects.update_or_create(user_id=request.user.id, defaults=changes)
+    return Response(_notification_prefs(request.user.id))
 
 # ---- Public profile view ----
+PUBLIC_FIELDS = ("id", "name", "level", "location_city", "goals", "distances", "speed_kmh", "photo")
+PROFILES_BATCH_MAX = 100
+
+def _distance_km(lat, lon, rec):
+    """Distance approximative depuis (lat, lon), None si l'un n'est pas localisé."""
+    if lat is None or rec["latitude"] is None:
+        return None
+    return geo.approx_km(geo.haversine_km(lat, lon, rec["latitude"], rec["longitude"]))
+
+def _public_data(rec, distance_km=None):
+    data = {k: rec[k] for k in PUBLIC_FIELDS}
+    data["distance_km"] = distance_km
+    for f in rec["hidden"]:  # champs masqués par le coureur (cf. Profile.HIDEABLE_FIELDS)
+        data[f] = None
+    return data
+
+def _visible(rec, me_id, excl):
+    """Profil montrable à `me_id` : ni en pause, ni bloqué dans un sens ou l'autre."""
+    return rec["id"] == me_id or (not rec["paused"] and rec["id"] not in excl)
+
+def _active_within(qp):
+    """?active_within=<secondes> ; None si absent, ValueError si invalide."""
+    raw = qp.get("active_within")
+    if not raw:
+        return None
+    seconds = int(raw)
+    if seconds <= 0:
+        raise ValueError(raw)
+    return seconds
+
+def _active_ids(qp):
+    """Ids actifs sur la période demandée (parcours d'index last_active_at), None sans filtre."""
+    seconds = _active_within(qp)
+    if seconds is None:
+        return None
+    return set(Profile.objects.active_within(seconds).values_list("user_id", flat=True))
+
+@replica_reads
 @api_view(["GET"])  # voir le profil d'un autre coureur
 @permission_classes([IsAuthenticated])
 def public_profile(request, user_id: int):
+    # profil consulté + le sien (pour la distance) : un aller-retour cache
+    recs = profile_cache.get_many([user_id, request.user.id])
+    rec = recs.get(user_id)
+    if rec is None:
+        try:
+            other = User.objects.get(pk=user_id, is_active=True)  # comptes supprimés : 404
+        except User.DoesNotExist:
+            return Response({"error": "utilisateur introuvable"}, status=404)
+        rec = profile_cache.put(_profile_of(other))
+    if not _visible(rec, request.user.id, exclusions.for_user(request.user.id)):
+        return Response({"error": "utilisateur introuvable"}, status=404)  # pause, blocage : comme absent
+    me_rec = recs.get(request.user.id) or {"latitude": None, "longitude": None, "version": 0}
+    # la distance dépend aussi de la position de l'appelant
+    etag = _etag("public", user_id, rec["version"], request.user.id, me_rec["version"])
+    return _conditional(
+        request, etag, lambda: _public_data(rec, _distance_km(me_rec["latitude"], me_rec["longitude"], rec))
+    )
+
+@api_view(["GET"])  # plusieurs profils publics : ?ids=1,2,3[&active_within=<secondes>]
+@permission_classes([IsAuthenticated])
+def public_profiles_batch(request):
     try:
-        other = User.objects.get(pk=user_id)
-    except User.DoesNotExist:
+        ids = [int(i) for i in (request.query_params.get("ids") or "").split(",") if i.strip()]
+    except ValueError:
+        return Response({"error": "ids invalides"}, status=400)
+    if len(ids) > PROFILES_BATCH_MAX:
+        return Response({"error": f"{PROFILES_BATCH_MAX} ids maximum"}, status=400)
+    try:
+        seconds = _active_within(request.query_params)
+    except ValueError:
+        return Response({"error": "active_within invalide"}, status=400)
+    excl = exclusions.for_user(request.user.id)
+    ids = excl.filter(ids)
+    if seconds is not None:
+        active = set(Profile.objects.filter(user_id__in=ids).active_within(seconds).values_list("user_id", flat=True))
+        ids = [i for i in ids if i in active]
+    recs = profile_cache.get_many(ids + [request.user.id])
+    me_rec = recs.get(request.user.id) or {"latitude": None, "longitude": None}
+    return Response({"results": [
+        _public_data(recs[i], _distance_km(me_rec["latitude"], me_rec["longitude"], recs[i]))
+        for i in dict.fromkeys(ids) if i in recs and _visible(recs[i], request.user.id, excl)
+    ]})
+
+@api_view(["GET"])
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
+@permission_classes([IsAdminUser])
+def profile_cache_stats(request):
+    return Response(profile_cache.stats())
+
+INCOMPLETE_PAGE_MAX = 500
+
+@api_view(["GET"])  # relances : ?below=75&city=Lyon&missing=goals,level&after=<user_id>&limit=
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
+@permission_classes([IsAdminUser])
+def incomplete_profiles(request):
+    qp = request.query_params
+    try:
+        below = int(qp.get("below") or 100)
+        after = int(qp.get("after") or 0)
+        limit = max(1, min(int(qp.get("limit") or 100), INCOMPLETE_PAGE_MAX))
+        qs = Profile.objects.incomplete(below)
+        if qp.get("city"):
+            qs = qs.in_city(qp["city"])
+        if qp.get("missing"):
+            qs = qs.missing(*[f.strip() for f in qp["missing"].split(",") if f.strip()])
+    except ValueError as e:
+        return Response({"error": str(e) or "paramètres invalides"}, status=400)
+    rows = list(
+        qs.filter(user_id__gt=after).order_by("user_id")
+        .values_list("user_id", "completion_percent", "completion_missing")[:limit]
+    )
+    return Response({
+        "results": [{"id": uid, "completion": pct, "missing": completion.decode(m)} for uid, pct, m in rows],
+        "next_cursor": rows[-1][0] if len(rows) == limit else None,
+    })
+
+# ---- Feed (swipe) ----
+FEED_MAX_LIMIT = 50
+
+def _parse_bool(value):
+    if value is None or value == "":
+        return None
+    return value.lower() in ("1", "true", "yes", "on")
+
+def _feed_exclusions(user):
+    """Ids à ne jamais proposer à `user` : bloqués, déjà swipés (tableaux triés en cache, cf. exclusions.py), lui-même."""
+    return exclusions.for_feed(user.id)
+
+def _drop_swiped(user, ids):
+    """Swipes faits dans un autre worker (cache en retard de EXCLUSION_TTL au plus) : revérifiés en base sur la page seule."""
+    if not ids:
+        return ids
+    swiped = set(Swipe.objects.filter(swiper_id=user.id, target_id__in=ids).values_list("target_id", flat=True))
+    return [uid for uid in ids if uid not in swiped] if swiped else ids
+
+@api_view(["GET"])  # flux de candidats paginé par curseur
+@permission_classes([IsAuthenticated])
+def feed_view(request):
+    qp = request.query_params
+    me_rec = _own_record(request.user)
+    # filtre absent -> valeur du profil courant ; filtre vide -> pas de filtre
+    level = qp.get("level", me_rec["level"]) or None
+    city = qp.get("city", me_rec["location_city"]) or None
+    week = _parse_bool(qp.get("week"))
+    weekend = _parse_bool(qp.get("weekend"))
+    try:
+        raw_cursor = qp.get("cursor") or "0"
+        after, boost_seen = boost.decode_cursor(raw_cursor)
+        limit = max(1, min(int(qp.get("limit") or 20), FEED_MAX_LIMIT))
+    except ValueError:
+        return Response({"error": "cursor/limit invalide"}, status=400)
+    if level is not None and level not in {c[0] for c in Profile.LEVEL_CHOICES}:
+        return Response({"error": "level invalide"}, status=400)
+    try:
+        active = _active_ids(qp)
+    except ValueError:
+        return Response({"error": "active_within invalide"}, status=400)
+
+    exclude = _feed_exclusions(request.user)
+    ids, next_cursor = feed.index.page(
+        level=level, week=week, weekend=weekend, city=city,
+        after=after, limit=limit, exclude=exclude, only=active,
+    )
+    if boost_seen:
+        shown = set(boost_seen)
+        ids = [uid for uid in ids if uid not in shown]  # déjà montrés en boostés plus haut dans le flux
+    ck = feed.city_key(city) if city is not None else None
+    # Premium mis en avant : tirage pondéré, stable pour (lecteur, curseur), sans ceux des pages précédentes
+    ids, picks = boost.merge(ids, request.user.id, raw_cursor, lambda uid: (
+        uid not in exclude and (active is None or uid in active) and feed.index.matches(uid, level, week, weekend, ck)
+    ), seen=boost_seen)
+    boosted = set(picks)
+    if next_cursor is not None:
+        next_cursor = boost.encode_cursor(next_cursor, boost_seen + picks)
+    ids = _drop_swiped(request.user, ids)
+    recs = profile_cache.get_many(ids)
+    results = []
+    for uid in ids:
+        rec = recs.get(uid)
+        # index d'un autre worker pas encore à jour : on revérifie sur l'enregistrement
+        if rec is None or rec["paused"]:
+            continue
+        key = (rec["level"], rec["availability_week"], rec["availability_weekend"], feed.city_key(rec["location_city"]))
+        if not feed.key_matches(key, level, week, weekend, ck):
+            continue
+        data = _public_data(rec, _distance_km(me_rec["latitude"], me_rec["longitude"], rec))
+        data["boosted"] = uid in boosted
+        results.append(data)
+    return Response({"results": results, "next_cursor": next_cursor})
+
+NEARBY_MAX_RADIUS_KM = 100
+
+@api_view(["GET"])  # coureurs dans un rayon autour de sa ville
+@permission_classes([IsAuthenticated])
+def nearby_view(request):
+    me_rec = _own_record(request.user)
+    if me_rec["latitude"] is None:
+        return Response({"error": "ville du profil inconnue"}, status=400)
+    try:
+        radius = float(request.query_params.get("radius_km") or 10)
+        limit = max(1, min(int(request.query_params.get("limit") or 20), FEED_MAX_LIMIT))
+    except ValueError:
+        return Response({"error": "radius_km/limit invalide"}, status=400)
+    if not 0 < radius <= NEARBY_MAX_RADIUS_KM:
+        return Response({"error": "radius_km invalide"}, status=400)
+
+    hits = geo.nearby(me_rec["latitude"], me_rec["longitude"], radius, limit=limit, exclude=_feed_exclusions(request.user))
+    keep = set(_drop_swiped(request.user, [uid for uid, _ in hits]))
+    hits = [(uid, d) for uid, d in hits if uid in keep]
+    recs = profile_cache.get_many([uid for uid, _ in hits])
+    results = [_public_data(recs[uid], geo.approx_km(d)) for uid, d in hits if uid in recs and not recs[uid]["paused"]]
+    return Response({"results": results})
+
+# ---- Performances similaires ----
+SIMILARITY_MAX_IDS = 5000
+
+@csrf_exempt
+@api_view(["POST"])  # classe un lot de candidats par similarité avec soi
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def similarity_rank(request):
+    try:
+        data = json.loads(request.body or b"{}")
+        ids = [int(i) for i in data.get("ids") or []]
+        limit = int(data["limit"]) if data.get("limit") else None
+    except (TypeError, ValueError):
+        return Response({"error": "ids invalides"}, status=400)
+    if len(ids) > SIMILARITY_MAX_IDS:
+        return Response({"error": f"{SIMILARITY_MAX_IDS} ids maximum"}, status=400)
+    me_p = _profile_of(request.user)
+    ids = exclusions.for_user(request.user.id).filter(ids)  # profils en pause ou désactivés : hors du cache
+    ranked = similarity.cache.rank(me_p.speed_kmh, me_p.distances_mask, ids, limit=limit)
+    return Response({"results": [{"id": uid, "score": score} for uid, score in ranked]})
+
+# ---- Swipes ----
+SWIPE_BATCH_MAX = 100
+
+def _apply_swipes(user, items):
+    """
+    Enregistre une liste ordonnée de (target_id, liked) en requêtes groupées :
+    validation des cibles, swipes existants, insertion, détection des matchs.
+    Renvoie (résultats par item, likes restants ou None si Premium).
+    """
+    wanted = {}
+    for target_id, liked in items:
+        wanted[target_id] = liked  # le dernier swipe sur une même cible l'emporte
+    targets = exclusions.for_user(user.id).filter(t for t in wanted if t != user.id)  # bloqués : invalides
+    valid = set(User.objects.filter(id__in=targets, is_active=True).values_list("id", flat=True))
+    premium = _profile_of(user).is_premium
+    granted = 0
+    try:
+        # BEGIN IMMEDIATE (settings.DATABASES) : le verrou d'écriture est pris avant de lire les swipes
+        # existants, un swipe concurrent ou envoyé deux fois sur la même cible est vu ici ("already")
+        # au lieu d'être écarté en silence par la contrainte unique après avoir consommé un like
+        with transaction.atomic():  # swipes, conversations et notifications de match ensemble
+            already = set(Swipe.objects.filter(swiper=user, target_id__in=valid).values_list("target_id", flat=True))
+            fresh = [t for t in targets if t in valid and t not in already]
+            likes = [t for t in fresh if wanted[t]]
+            granted = len(likes) if premium else quotas.consume(user.id, len(likes))
+            refused = set(likes[granted:])
+
+            liked_now = [t for t in likes if t not in refused]
+            swiped = [t for t in fresh if t not in refused]
+            Swipe.objects.bulk_create([Swipe(swiper=user, target_id=t, liked=wanted[t]) for t in swiped])
+            transaction.on_commit(lambda: exclusions.add_swiped(user.id, swiped))  # exclusions du flux de ce worker
+            # lookup inverse sur l'index unique (swiper, target)
+            matches = set(
+                Swipe.objects.filter(swiper_id__in=liked_now, target=user, liked=True).values_list("swiper_id", flat=True)
+            ) if liked_now else set()
+            if matches:
+                chat.open_conversations(user.id, matches)
+                notify.enqueue_many(
+                    [(t, "match", "match", {"user_id": user.id}) for t in matches]
+                    + [(user.id, "match", "match", {"user_id": t}) for t in matches]
+                )
+    except Exception:
+        if not premium:
+            quotas.refund(user.id, granted)  # transaction annulée : likes rendus
+        raise
+    for t in matches:
+        push.notify(t, "match", user_id=user.id)
+        push.notify(user.id, "match", user_id=t)
+
+    results = []
+    for t in wanted:
+        if t == user.id or t not in valid:
+            status = "invalid"
+        elif t in already:
+            status = "already"
+        elif t in refused:
+            status = "quota"
+        else:
+            status = "ok"
+        results.append({"target_id": t, "status": status, "match": t in matches})
+    return results, None if premium else quotas.remaining(user.id)
+
+def _parse_swipe(item):
+    return int(item["target_id"]), bool(item.get("like"))
+
+@csrf_exempt
+@api_view(["POST"])  # swipe unitaire : {"target_id": 12, "like": true}
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def swipe(request):
+    try:
+        item = _parse_swipe(json.loads(request.body or b"{}"))
+    except (KeyError, TypeError, ValueError):
+        return Response({"error": "target_id requis"}, status=400)
+    results, left = _apply_swipes(request.user, [item])
+    r = results[0]
+    if r["status"] == "invalid":
         return Response({"error": "utilisateur introuvable"}, status=404)
-    p, _ = Profile.objects.get_or_create(user=other)
-    data = {
-        "id": other.id,
-        "name": other.get_full_name() or other.username,
-        "level": p.level,
-        "location_city": p.location_city,
-        "goals": p.goals,
-        "distances": p.distances,
-        "speed_kmh": p.speed_kmh,
+    if r["status"] == "quota":
+        return Response({"error": "limite de likes atteinte", "likes_left": 0}, status=429)
+    return Response({"ok": True, "already": r["status"] == "already", "match": r["match"], "likes_left": left})
+
+@csrf_exempt
+@api_view(["POST"])  # lot de swipes : {"swipes": [{"target_id": 12, "like": true}, ...]}
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def swipe_bulk(request):
+    try:
+        data = json.loads(request.body or b"{}")
+        items = [_parse_swipe(i) for i in data.get("swipes") or []]
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return Response({"error": "swipes invalides"}, status=400)
+    if len(items) > SWIPE_BATCH_MAX:
+        return Response({"error": f"{SWIPE_BATCH_MAX} swipes maximum"}, status=400)
+    results, left = _apply_swipes(request.user, items)
+    return Response({"results": results, "likes_left": left})
+
+# ---- Messagerie ----
+def _page_limit(request, default):
+    return max(1, min(int(request.query_params.get("limit") or default), chat.PAGE_MAX))
+
+@api_view(["GET"])  # matchs triés par dernier message : ?cursor=&limit=
+@permission_classes([IsAuthenticated])
+def conversations_list(request):
+    try:
+        limit = _page_limit(request, 20)
+        raw = request.query_params.get("cursor")
+        cursor = chat.decode_cursor(raw) if raw else None
+    except ValueError:
+        return Response({"error": "paramètres invalides"}, status=400)
+    me_id = request.user.id
+    convs, next_cursor = chat.inbox(me_id, cursor, limit)
+    excl = exclusions.for_user(me_id)
+    convs = [c for c in convs if c.other_id(me_id) not in excl]  # conversations avec un bloqué : masquées
+    recs = profile_cache.get_many([c.other_id(me_id) for c in convs])
+    results = []
+    for c in convs:
+        other = recs.get(c.other_id(me_id))
+        results.append({
+            "id": c.id,
+            "user": {"id": c.other_id(me_id), "name": other["name"] if other else ""},
+            "last_message_at": c.last_message_at.isoformat(),
+            "last_message_preview": c.last_message_preview,
+            "last_sender_id": c.last_sender_id,
+            "unread": c.unread_for(me_id),
+        })
+    return Response({"results": results, "next_cursor": next_cursor})
+
+@api_view(["GET"])  # historique, du plus récent au plus ancien : ?before=<message id>&limit=
+@permission_classes([IsAuthenticated])
+def conversation_messages(request, conversation_id: int):
+    try:
+        limit = _page_limit(request, 30)
+        before = int(request.query_params["before"]) if request.query_params.get("before") else None
+    except ValueError:
+        return Response({"error": "paramètres invalides"}, status=400)
+    if chat.get_for(conversation_id, request.user.id) is None:
+        return Response({"error": "conversation introuvable"}, status=404)
+    messages, next_cursor = chat.history(conversation_id, before, limit)
+    return Response({"results": messages, "next_cursor": next_cursor})
+
+@csrf_exempt
+@api_view(["POST"])  # {"body": "On court demain matin ?"}
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def message_send(request, conversation_id: int):
+    try:
+        body = (json.loads(request.body or b"{}").get("body") or "").strip()
+    except (ValueError, AttributeError):
+        body = ""
+    if not body:
+        return Response({"error": "message vide"}, status=400)
+    if len(body) > chat.BODY_MAX:
+        return Response({"error": f"{chat.BODY_MAX} caractères maximum"}, status=400)
+    conv = chat.get_for(conversation_id, request.user.id)
+    if conv is None:
+        return Response({"error": "conversation introuvable"}, status=404)
+    if exclusions.is_blocked(request.user.id, conv.other_id(request.user.id)):
+        return Response({"error": "conversation bloquée"}, status=403)
+    return Response(chat.send(conv, request.user.id, body), status=201)
+
+@csrf_exempt
+@api_view(["POST"])  # remet à zéro mes non-lus
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def conversation_read(request, conversation_id: int):
+    conv = chat.get_for(conversation_id, request.user.id)
+    if conv is None:
+        return Response({"error": "conversation introuvable"}, status=404)
+    chat.mark_read(conv, request.user.id)
+    return Response({"ok": True})
+
+# ---- Sorties de groupe ----
+SESSION_CAPACITY_MAX = 200
+
+def _parse_session(data):
+    """Champs d'une sortie à créer ; ValueError (message affichable) si invalides."""
+    title = (data.get("title") or "").strip()
+    starts_at = parse_datetime(str(data.get("starts_at") or ""))
+    try:
+        capacity = int(data.get("capacity") or 0)
+        duration = int(data.get("duration_min") or 60)
+    except (TypeError, ValueError):
+        raise ValueError("capacité ou durée invalide") from None
+    level = data.get("level") or ""
+    if starts_at is not None and timezone.is_naive(starts_at):
+        starts_at = timezone.make_aware(starts_at)
+    if not title or len(title) > 140 or starts_at is None or starts_at <= timezone.now():
+        raise ValueError("titre ou date invalide")
+    if not 2 <= capacity <= SESSION_CAPACITY_MAX or not 10 <= duration <= 600:
+        raise ValueError("capacité ou durée invalide")
+    if level and level not in dict(Profile.LEVEL_CHOICES):
+        raise ValueError("niveau invalide")
+    return {
+        "title": title,
+        "starts_at": starts_at,
+        "duration_min": duration,
+        "capacity": capacity,
+        "level": level,
+        "location_city": (data.get("location_city") or "").strip()[:128],
+        "meeting_point": (data.get("meeting_point") or "").strip()[:255],
     }
-    return Response(data)
+
+@csrf_exempt
+@api_view(["POST"])  # {"title", "starts_at" (ISO 8601), "capacity", "duration_min", "location_city", "meeting_point", "level"}
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def session_create(request):
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return Response({"error": "JSON invalide"}, status=400)
+    if not isinstance(data, dict):
+        return Response({"error": "JSON invalide"}, status=400)
+    try:
+        fields = _parse_session(data)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    s = runs.create(request.user, **fields)
+    return Response(runs.session_data(s, joined=True), status=201)
+
+@api_view(["GET"])  # sorties à venir par date : ?city=&cursor=&limit=
+@permission_classes([IsAuthenticated])
+def sessions_list(request):
+    qp = request.query_params
+    try:
+        limit = max(1, min(int(qp.get("limit") or 20), 50))
+        after = runs.decode_cursor(qp["cursor"]) if qp.get("cursor") else None
+    except ValueError:
+        return Response({"error": "paramètres invalides"}, status=400)
+    sessions, next_cursor = runs.upcoming(qp.get("city"), after, limit)
+    joined = runs.joined_ids(request.user.id, [s.id for s in sessions])
+    return Response({
+        "results": [runs.session_data(s, joined=s.id in joined) for s in sessions],
+        "next_cursor": next_cursor,
+    })
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def session_detail(request, session_id: int):
+    s = RunSession.objects.filter(pk=session_id).first()
+    if s is None:
+        return Response({"error": "sortie introuvable"}, status=404)
+    return Response(runs.session_data(s, joined=bool(runs.joined_ids(request.user.id, [s.id]))))
+
+@csrf_exempt
+@api_view(["POST"])  # 409 si complète, 410 si commencée
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def session_join(request, session_id: int):
+    try:
+        created = runs.join(session_id, request.user.id)
+    except runs.Full:
+        return Response({"error": "sortie complète"}, status=409)
+    except runs.Closed:
+        return Response({"error": "sortie introuvable ou commencée"}, status=410)
+    return Response({"ok": True, "joined": True, "created": created}, status=201 if created else 200)
+
+@csrf_exempt
+@api_view(["POST"])
+@authentication_classes([CsrfExemptSessionAuthentication, CookieJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def session_leave(request, session_id: int):
+    left = runs.leave(session_id, request.user.id)
+    return Response({"ok": True, "joined": False, "left": left})
+
+@api_view(["GET"])  # URL d'abonnement au flux .ics (secrète : jeton signé)
+@permission_classes([IsAuthenticated])
+def calendar_link(request):
+    token = runs.calendar_token(request.user.id)
+    return Response({"url": request.build_absolute_uri(f"/api/calendar/{token}.ics")})
+
+@require_GET
+def calendar_feed(request, token):
+    """Flux iCalendar de mes sorties ; les agendas le revalident via If-None-Match."""
+    user_id = runs.user_for_token(token)
+    if user_id is None or not User.objects.filter(pk=user_id, is_active=True).exists():
+        return HttpResponse(status=404)
+    body, etag = runs.ics_feed(user_id)
+    header = request.META.get("HTTP_IF_NONE_MATCH")
+    if header and etag in parse_etags(header):
+        resp = HttpResponse(status=304)
+    else:
+        resp = HttpResponse(body, content_type="text/calendar; charset=utf-8")
+    resp["ETag"] = etag
+    resp["Cache-Control"] = "private, no-cache"
+    return resp
@@ -36,15 +36,25 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # en premier pour mesurer toute la chaîne (session, auth...)
+    "authapp.metrics.MetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    # dernière activité, tamponnée en mémoire (cf. authapp.activity)
+    "authapp.activity.ActivityMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
 ]
 
+# /metrics (format Prometheus) : accessible en local, ou à tous si DEBUG
+METRICS_ALLOWED_IPS = ("127.0.0.1", "::1")
+# Journalise (logger "authapp.slow") le SQL des requêtes plus lentes que ce
+# seuil en ms ; désactivé si vide
+SLOW_REQUEST_MS = float(os.environ["SLOW_REQUEST_MS"]) if os.getenv("SLOW_REQUEST_MS") else None
+
 # Fichiers de configuration du projet
 ROOT_URLCONF = "urls"
 WSGI_APPLICATION = "wsgi.application"
@@ -69,19 +79,73 @@ TEMPLATES = [
     }
 ]
 
-# Base de données SQLite par défaut
+# Base de données SQLite par défaut.
+# WAL : les lectures ne sont plus bloquées par les écritures (profile_update,
+# register...). BEGIN IMMEDIATE + timeout : un writer attend le verrou au lieu
+# d'échouer en "database is locked" au milieu d'une transaction.
+SQLITE_OPTIONS = {
+    "init_command": (
+        "PRAGMA journal_mode=WAL;"
+        "PRAGMA synchronous=NORMAL;"  # sûr en WAL, fsync au checkpoint seulement
+        "PRAGMA cache_size=-20000;"  # 20 Mo de cache de pages par connexion
+        "PRAGMA temp_store=MEMORY;"
+        "PRAGMA mmap_size=134217728;"
+    ),
+    "transaction_mode": "IMMEDIATE",
+    "timeout": 20,
+}
+# Connexions persistantes (secondes ; 0 = une connexion par requête)
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE", "60"))
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": SQLITE_OPTIONS,
+        "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
+        # base de test fichier : les tests concurrents (threads) voient les données commitées
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
+    }
+}
+# Réplica en lecture pour me / profile_get / public_profile (authapp.routers).
+# En local : DB_REPLICA_PATH=replica.sqlite3 (voir docs/SETUP.md).
+if os.getenv("DB_REPLICA_PATH"):
+    DATABASES["replica"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.environ["DB_REPLICA_PATH"],
+        "OPTIONS": SQLITE_OPTIONS,
+        "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
+        "TEST": {"MIRROR": "default"},
     }
+DATABASE_ROUTERS = ["authapp.routers.ReplicaRouter"]
+
+# Caches : "default" pour les compteurs (quotas...), "profiles" pour les
+# profils sérialisés (LRU borné). En prod, pointer les deux sur Redis.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "runnr-default",
+    },
+    "profiles": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "runnr-profiles",
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", "50000")),
+            "CULL_FREQUENCY": 10,  # évince les 10 % les moins récemment lus
+        },
+    },
 }
+PROFILE_CACHE_ALIAS = "profiles"
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", "300"))
 
 AUTHENTICATION_BACKENDS = (
     "social_core.backends.google.GoogleOAuth2",
     "social_core.backends.facebook.FacebookOAuth2",
     "social_core.backends.apple.AppleIdAuth",
-    "django.contrib.auth.backends.ModelBackend",
+    # ModelBackend + chargement du profil dans la même requête
+    "authapp.auth.ProfileModelBackend",
 )
 
 # URLs du provider Google (crée tes credentials OAuth 2.0 côté Google Cloud)
@@ -105,10 +169,12 @@ LOGIN_URL = "/auth/google/login"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
+        # JWT (cookie access_token ou header Bearer) validé sans requête DB :
+        # request.user est un RunnrTokenUser. Les vues qui écrivent en base
+        # repassent par CookieJWTAuthentication (vrai User).
+        "authapp.auth.StatelessJWTAuthentication",
         # Utilise la session créée par login(request, user)
         "rest_framework.authentication.SessionAuthentication",
-        # Optionnel: permet d'utiliser un header Authorization: Bearer
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.AllowAny",
@@ -120,6 +186,7 @@ SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
     "AUTH_HEADER_TYPES": ("Bearer",),
+    "TOKEN_USER_CLASS": "authapp.auth.RunnrTokenUser",
 }
 
 # Cookies pour renvoyer les JWT de manière sécurisée
@@ -139,8 +206,84 @@ USE_I18N = True
 USE_TZ = True
 
 STATIC_URL = "static/"
+MEDIA_URL = "/media/"
+MEDIA_ROOT = BASE_DIR / "media"
+
+# Photos de profil (cf. authapp.photos) : originaux et variantes sous MEDIA_ROOT/photos
+PHOTO_MAX_BYTES = 10 * 1024 * 1024
+PHOTO_MAX_PIXELS = 40_000_000
+PHOTO_SIZES = (160, 480, 1080)  # côté max des variantes, en px
+PHOTO_WORKERS = int(os.getenv("PHOTO_WORKERS", "2"))
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # Email (dev: console backend)
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 DEFAULT_FROM_EMAIL = "no-reply@runnr.local"
+# Les e-mails passent par la table OutboundEmail (manage.py drain_outbox) ;
+# en dev, un thread local draine la file après chaque commit.
+MAIL_OUTBOX_EAGER = DEBUG
+# Suppression de compte : purge par lots (manage.py purge_accounts --loop) ;
+# en dev, un thread local la lance après la demande.
+ACCOUNT_PURGE_EAGER = DEBUG
+# Dernière activité (Profile.last_active_at) : tampon en mémoire écrit par lots
+# toutes les ACTIVITY_FLUSH_INTERVAL s (0 = seulement à l'arrêt du process)
+ACTIVITY_FLUSH_INTERVAL = int(os.getenv("ACTIVITY_FLUSH_INTERVAL", "30"))
+ACTIVITY_RESOLUTION = 60
+# Warm-up des workers au chargement de wsgi.py / asgi.py (authapp.startup)
+WARMUP = os.getenv("WARMUP", "") == "1"
+# Taille du pool de hachage des vues async (api/async/*)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+
+# Canal push (asgi.py : /api/events en SSE, /ws/events en websocket).
+# Plusieurs nodes : remplacer LocalBroker par un broker partagé (voir authapp.push)
+PUSH_BROKER = "authapp.push.LocalBroker"
+PUSH_QUEUE_MAX = 64  # événements en attente par connexion, au-delà : "resync"
+PUSH_HEARTBEAT_S = 25
+PUSH_MAX_CONNECTIONS_PER_USER = 5
+
+# Limitation des tentatives (login, register, reset) : cf. authapp.ratelimit.
+# "local" = compteurs en mémoire du process ; un alias de CACHES (Redis)
+# pour les partager entre workers.
+RATE_LIMIT_STORE = "local"
+RATE_LIMIT_MAX_KEYS = 100_000
+RATE_LIMITS = {
+    # scope: ((clé, requêtes, fenêtre en s), ...) ; clé = "ip" ou "ident" (email...)
+    "login": (("ip", 30, 60), ("ident", 10, 900)),
+    "register": (("ip", 10, 3600),),
+    "password_reset": (("ip", 10, 3600), ("ident", 3, 3600)),
+    "password_reset_confirm": (("ip", 20, 3600),),
+}
+
+# Flux de swipe : durée max (s) avant reconstruction de l'index de candidats
+FEED_INDEX_TTL = int(os.getenv("FEED_INDEX_TTL", "300"))
+# Performances similaires : durée max (s) avant relecture du cache NumPy
+SIMILARITY_CACHE_TTL = int(os.getenv("SIMILARITY_CACHE_TTL", "300"))
+
+# Blocages : ensembles d'exclusion gardés en mémoire par worker (LRU), relus
+# au plus tard toutes les EXCLUSION_TTL secondes (blocages faits ailleurs)
+EXCLUSION_TTL = int(os.getenv("EXCLUSION_TTL", "60"))
+EXCLUSION_CACHE_MAX = int(os.getenv("EXCLUSION_CACHE_MAX", "10000"))
+# ids gardés au total par worker (8 octets chacun : 5M ~ 40 Mo)
+EXCLUSION_CACHE_IDS = int(os.getenv("EXCLUSION_CACHE_IDS", "5000000"))
+
+# Mise en avant Premium : durée et demi-vie du poids (s), profils boostés
+# insérés par page de flux ; poids recalculés par `manage.py refresh_boosts --loop`
+BOOST_DURATION = int(os.getenv("BOOST_DURATION", "1800"))
+BOOST_HALF_LIFE = int(os.getenv("BOOST_HALF_LIFE", "600"))
+BOOST_SLOTS = int(os.getenv("BOOST_SLOTS", "2"))
+BOOST_TABLE_TTL = int(os.getenv("BOOST_TABLE_TTL", "60"))
+BOOST_RESOLUTION = 60  # boosts démarrés la même minute : recalculés ensemble
+
+# Notifications (cf. authapp.notify) : file Notification drainée par
+# `manage.py drain_notifications --loop` ; en dev, un thread local la draine
+# après chaque commit. NOTIFICATION_DELAY (s) retient les lignes pour
+# regrouper les rafales ("5 nouveaux messages").
+NOTIFICATION_CHANNELS = os.getenv("NOTIFICATION_CHANNELS", "authapp.notify.ConsoleChannel").split(",")
+NOTIFICATION_FILE_PATH = os.getenv("NOTIFICATION_FILE_PATH", str(BASE_DIR / "notifications.jsonl"))
+NOTIFICATION_EAGER = DEBUG
+NOTIFICATION_DELAY = int(os.getenv("NOTIFICATION_DELAY", "0"))
+SESSION_REMINDER_BEFORE = 3600  # rappel une heure avant le départ
+
+# Offre Free : likes par jour (compteurs dans le cache Django ; en prod,
+# configurer CACHES sur Redis pour partager les compteurs entre workers)
+FREE_DAILY_LIKES = int(os.getenv("FREE_DAILY_LIKES", "20"))
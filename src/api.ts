@@ -83,6 +83,9 @@ export type Profile = {
   speed_kmh?: number | null;
   completion?: number;
   missing?: string[];
+  photo?: PhotoUrls | null;
+  paused?: boolean;
+  hidden?: ("location_city" | "goals" | "distances" | "speed_kmh" | "photo" | "distance_km")[];
 };
 
 export async function getProfile(): Promise<Profile> {
@@ -102,6 +105,71 @@ export async function updateProfile(patch: Partial<Profile>) {
   return res.json();
 }
 
+// Premium : 409 si une mise en avant est déjà en cours
+export async function boostProfile(): Promise<{ expires_at: string }> {
+  const res = await fetch(`${BASE}/api/profile/boost`, { method: "POST", credentials: "include" });
+  if (!res.ok) throw new Error(res.status === 409 ? "boost_active" : res.status === 403 ? "premium_required" : "boost_failed");
+  return res.json();
+}
+
+export type PhotoUrls = Record<"160" | "480" | "1080", { webp: string; jpg: string }>;
+
+// Multipart ; 202 tant que les variantes sont en cours (le profil reçoit la photo ensuite)
+export async function uploadProfilePhoto(file: File): Promise<{ status: "ready" | "processing"; photo: PhotoUrls }> {
+  const form = new FormData();
+  form.append("photo", file);
+  const res = await fetch(`${BASE}/api/profile/photo`, { method: "POST", credentials: "include", body: form });
+  if (!res.ok) throw new Error(res.status === 413 ? "photo_too_large" : "photo_upload_failed");
+  return res.json();
+}
+
+// Coureur bloqué : disparaît de mes résultats et moi des siens, plus de messages
+export async function blockUser(userId: number) {
+  const res = await fetch(`${BASE}/api/users/${userId}/block`, { method: "POST", credentials: "include" });
+  if (!res.ok) throw new Error("block_failed");
+  return res.json();
+}
+
+export async function unblockUser(userId: number) {
+  const res = await fetch(`${BASE}/api/users/${userId}/unblock`, { method: "POST", credentials: "include" });
+  if (!res.ok) throw new Error("unblock_failed");
+  return res.json();
+}
+
+export async function getBlockedIds(after?: number | null): Promise<{ results: number[]; next_cursor: number | null }> {
+  const qs = after ? `?after=${after}` : "";
+  const res = await fetch(`${BASE}/api/blocks${qs}`, { credentials: "include" });
+  if (!res.ok) throw new Error("blocks_failed");
+  return res.json();
+}
+
+export type NotificationPreferences = { match: boolean; message: boolean; session_reminder: boolean };
+
+export async function getNotificationPreferences(): Promise<NotificationPreferences> {
+  const res = await fetch(`${BASE}/api/notifications/preferences`, { credentials: "include" });
+  if (!res.ok) throw new Error("notification_preferences_failed");
+  return res.json();
+}
+
+// Champs partiels : seuls les types fournis changent
+export async function updateNotificationPreferences(prefs: Partial<NotificationPreferences>): Promise<NotificationPreferences> {
+  const res = await fetch(`${BASE}/api/notifications/preferences/update`, {
+    method: "POST",
+    credentials: "include",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(prefs),
+  });
+  if (!res.ok) throw new Error("notification_preferences_update_failed");
+  return res.json();
+}
+
+// Compte désactivé immédiatement, données purgées en arrière-plan
+export async function deleteAccount() {
+  const res = await fetch(`${BASE}/api/account/delete`, { method: "POST", credentials: "include" });
+  if (!res.ok) throw new Error("account_delete_failed");
+  return res.json();
+}
+
 export type PublicProfile = {
   id: number;
   name: string;
@@ -110,6 +178,8 @@ export type PublicProfile = {
   goals: string;
   distances: string;
   speed_kmh: number | null;
+  photo: PhotoUrls | null;
+  distance_km?: number | null;
 };
 
 export async function getPublicProfile(userId: number | string): Promise<PublicProfile> {
@@ -117,3 +187,146 @@ export async function getPublicProfile(userId: number | string): Promise<PublicP
   if (!res.ok) throw new Error("public_profile_fetch_failed");
   return res.json();
 }
+
+export type FeedPage = {
+  results: (PublicProfile & { boosted: boolean })[];
+  next_cursor: string | null;
+};
+
+export async function getFeed(params: { cursor?: string | null; limit?: number; level?: string; city?: string; active_within?: number } = {}): Promise<FeedPage> {
+  const q = new URLSearchParams();
+  for (const [k, v] of Object.entries(params)) {
+    if (v !== undefined && v !== null) q.set(k, String(v));
+  }
+  const res = await fetch(`${BASE}/api/feed?${q}`, { credentials: "include" });
+  if (!res.ok) throw new Error("feed_fetch_failed");
+  return res.json();
+}
+
+export async function getNearby(radiusKm: 5 | 10 | 20 | number, limit = 20): Promise<{ results: PublicProfile[] }> {
+  const res = await fetch(`${BASE}/api/nearby?radius_km=${radiusKm}&limit=${limit}`, { credentials: "include" });
+  if (!res.ok) throw new Error("nearby_fetch_failed");
+  return res.json();
+}
+
+export type SwipeResult = { target_id: number; status: "ok" | "already" | "quota" | "invalid"; match: boolean };
+
+export async function swipeBulk(swipes: { target_id: number; like: boolean }[]): Promise<{ results: SwipeResult[]; likes_left: number | null }> {
+  const res = await fetch(`${BASE}/api/swipes/bulk`, {
+    method: "POST",
+    credentials: "include",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ swipes }),
+  });
+  if (!res.ok) throw new Error("swipe_failed");
+  return res.json();
+}
+
+export type ChatMessage = { id: number; sender_id: number; body: string; created_at: string };
+
+export type PushEvent =
+  | { type: "match"; user_id: number }
+  | { type: "message"; conversation_id: number; message: ChatMessage }
+  | { type: "resync" };
+
+export type Conversation = {
+  id: number;
+  user: { id: number; name: string };
+  last_message_at: string;
+  last_message_preview: string;
+  last_sender_id: number | null;
+  unread: number;
+};
+
+export async function getConversations(cursor?: string | null): Promise<{ results: Conversation[]; next_cursor: string | null }> {
+  const qs = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+  const res = await fetch(`${BASE}/api/conversations${qs}`, { credentials: "include" });
+  if (!res.ok) throw new Error("conversations_failed");
+  return res.json();
+}
+
+export async function getMessages(conversationId: number, before?: number | null): Promise<{ results: ChatMessage[]; next_cursor: number | null }> {
+  const qs = before ? `?before=${before}` : "";
+  const res = await fetch(`${BASE}/api/conversations/${conversationId}/messages${qs}`, { credentials: "include" });
+  if (!res.ok) throw new Error("messages_failed");
+  return res.json();
+}
+
+export async function sendMessage(conversationId: number, body: string): Promise<ChatMessage> {
+  const res = await fetch(`${BASE}/api/conversations/${conversationId}/send`, {
+    method: "POST",
+    credentials: "include",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ body }),
+  });
+  if (!res.ok) throw new Error("send_failed");
+  return res.json();
+}
+
+export async function markConversationRead(conversationId: number) {
+  await fetch(`${BASE}/api/conversations/${conversationId}/read`, { method: "POST", credentials: "include" });
+}
+
+export type RunSession = {
+  id: number;
+  title: string;
+  organizer_id: number;
+  starts_at: string;
+  duration_min: number;
+  location_city: string;
+  meeting_point: string;
+  level: string;
+  capacity: number;
+  spots_left: number;
+  joined: boolean;
+};
+
+export async function getSessions(params: { city?: string; cursor?: string | null; limit?: number } = {}): Promise<{ results: RunSession[]; next_cursor: string | null }> {
+  const qs = new URLSearchParams();
+  if (params.city) qs.set("city", params.city);
+  if (params.cursor) qs.set("cursor", params.cursor);
+  if (params.limit) qs.set("limit", String(params.limit));
+  const res = await fetch(`${BASE}/api/sessions?${qs}`, { credentials: "include" });
+  if (!res.ok) throw new Error("sessions_failed");
+  return res.json();
+}
+
+export async function createSession(data: { title: string; starts_at: string; capacity: number; duration_min?: number; location_city?: string; meeting_point?: string; level?: string }): Promise<RunSession> {
+  const res = await fetch(`${BASE}/api/sessions/create`, {
+    method: "POST",
+    credentials: "include",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(data),
+  });
+  if (!res.ok) throw new Error("session_create_failed");
+  return res.json();
+}
+
+// 409 : sortie complète
+export async function joinSession(sessionId: number) {
+  const res = await fetch(`${BASE}/api/sessions/${sessionId}/join`, { method: "POST", credentials: "include" });
+  if (!res.ok) throw new Error(res.status === 409 ? "session_full" : "session_join_failed");
+  return res.json();
+}
+
+export async function leaveSession(sessionId: number) {
+  const res = await fetch(`${BASE}/api/sessions/${sessionId}/leave`, { method: "POST", credentials: "include" });
+  if (!res.ok) throw new Error("session_leave_failed");
+  return res.json();
+}
+
+// URL .ics à ajouter dans l'agenda (Google Agenda, Calendrier iOS...)
+export async function getCalendarUrl(): Promise<string> {
+  const res = await fetch(`${BASE}/api/calendar`, { credentials: "include" });
+  if (!res.ok) throw new Error("calendar_failed");
+  return (await res.json()).url;
+}
+
+// Flux temps réel (SSE, cookie access_token) ; "resync" = événements perdus, recharger via l'API
+export function subscribeEvents(onEvent: (e: PushEvent) => void): () => void {
+  const source = new EventSource(`${BASE}/api/events`, { withCredentials: true });
+  for (const type of ["match", "message", "resync"]) {
+    source.addEventListener(type, (e) => onEvent(JSON.parse((e as MessageEvent).data)));
+  }
+  return () => source.close();
+}
@@ -1,25 +1,34 @@
 from django.contrib import admin
 from django.urls import path
 from authapp.views import (
-    google_login, google_callback_dispatch,
-    facebook_login, facebook_callback_dispatch,
-    apple_login, apple_callback_dispatch,
     me, logout_view,
     register_email, login_email,
     request_password_reset, reset_password_confirm,
-    profile_get, profile_update,
-    public_profile,
+    profile_get, profile_update, profile_boost, profile_photo_upload, photo_file, account_delete,
+    block_user, unblock_user, blocks_list, notification_preferences, notification_preferences_update,
+    public_profile, public_profiles_batch, profile_cache_stats, incomplete_profiles,
+    feed_view, nearby_view,
+    similarity_rank,
+    swipe, swipe_bulk,
+    conversations_list, conversation_messages, message_send, conversation_read,
+    session_create, sessions_list, session_detail, session_join, session_leave, calendar_link, calendar_feed,
+)
+from authapp.metrics import metrics_view
+from authapp.startup import lazy_view
+from authapp.async_views import (
+    register_email_async, login_email_async, reset_password_confirm_async,
 )
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    # OAuth Google
-    path("auth/google/login", google_login, name="google_login"),
-    path("auth/google/callback", google_callback_dispatch, name="google_callback"),
-    path("auth/facebook/login", facebook_login, name="facebook_login"),
-    path("auth/facebook/callback", facebook_callback_dispatch, name="facebook_callback"),
-    path("auth/apple/login", apple_login, name="apple_login"),
-    path("auth/apple/callback", apple_callback_dispatch, name="apple_callback"),
+    path("metrics", metrics_view, name="metrics"),
+    # OAuth (pile social-auth importée au premier appel, cf. authapp.startup)
+    path("auth/google/login", lazy_view("authapp.oauth_views.google_login"), name="google_login"),
+    path("auth/google/callback", lazy_view("authapp.oauth_views.google_callback_dispatch"), name="google_callback"),
+    path("auth/facebook/login", lazy_view("authapp.oauth_views.facebook_login"), name="facebook_login"),
+    path("auth/facebook/callback", lazy_view("authapp.oauth_views.facebook_callback_dispatch"), name="facebook_callback"),
+    path("auth/apple/login", lazy_view("authapp.oauth_views.apple_login"), name="apple_login"),
+    path("auth/apple/callback", lazy_view("authapp.oauth_views.apple_callback_dispatch"), name="apple_callback"),
     # API simples
     path("api/register", register_email, name="register_email"),
     path("api/login", login_email, name="login_email"),
@@ -27,7 +36,39 @@ urlpatterns = [
     path("api/logout", logout_view, name="logout"),
     path("api/request-password-reset", request_password_reset, name="request_password_reset"),
     path("api/reset-password-confirm", reset_password_confirm, name="reset_password_confirm"),
+    # Variantes async (ASGI) : hachage dans un pool borné
+    path("api/async/register", register_email_async, name="register_email_async"),
+    path("api/async/login", login_email_async, name="login_email_async"),
+    path("api/async/reset-password-confirm", reset_password_confirm_async, name="reset_password_confirm_async"),
     path("api/profile", profile_get, name="profile_get"),
     path("api/profile/update", profile_update, name="profile_update"),
+    path("api/profile/boost", profile_boost, name="profile_boost"),
+    path("api/profile/photo", profile_photo_upload, name="profile_photo_upload"),
+    path("media/photos/<path:path>", photo_file, name="photo_file"),
+    path("api/account/delete", account_delete, name="account_delete"),
+    path("api/users/<int:user_id>/block", block_user, name="block_user"),
+    path("api/users/<int:user_id>/unblock", unblock_user, name="unblock_user"),
+    path("api/blocks", blocks_list, name="blocks_list"),
+    path("api/notifications/preferences", notification_preferences, name="notification_preferences"),
+    path("api/notifications/preferences/update", notification_preferences_update, name="notification_preferences_update"),
     path("api/users/<int:user_id>/profile", public_profile, name="public_profile"),
+    path("api/users/profiles", public_profiles_batch, name="public_profiles_batch"),
+    path("api/cache/stats", profile_cache_stats, name="profile_cache_stats"),
+    path("api/profiles/incomplete", incomplete_profiles, name="incomplete_profiles"),
+    path("api/feed", feed_view, name="feed"),
+    path("api/nearby", nearby_view, name="nearby"),
+    path("api/similarity", similarity_rank, name="similarity_rank"),
+    path("api/swipe", swipe, name="swipe"),
+    path("api/swipes/bulk", swipe_bulk, name="swipe_bulk"),
+    path("api/conversations", conversations_list, name="conversations_list"),
+    path("api/conversations/<int:conversation_id>/messages", conversation_messages, name="conversation_messages"),
+    path("api/conversations/<int:conversation_id>/send", message_send, name="message_send"),
+    path("api/conversations/<int:conversation_id>/read", conversation_read, name="conversation_read"),
+    path("api/sessions", sessions_list, name="sessions_list"),
+    path("api/sessions/create", session_create, name="session_create"),
+    path("api/sessions/<int:session_id>", session_detail, name="session_detail"),
+    path("api/sessions/<int:session_id>/join", session_join, name="session_join"),
+    path("api/sessions/<int:session_id>/leave", session_leave, name="session_leave"),
+    path("api/calendar", calendar_link, name="calendar_link"),
+    path("api/calendar/<str:token>.ics", calendar_feed, name="calendar_feed"),
 ]
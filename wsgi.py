@@ -5,3 +5,12 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings")
 
 application = get_wsgi_application()
 
+# WARMUP=1 : charge caches, connexion et vues différées avant la première
+# requête (dans le master avec gunicorn --preload, cf. authapp.startup)
+from django.conf import settings  # noqa: E402
+
+if settings.WARMUP:
+    from authapp.startup import warm_up
+
+    warm_up()
+